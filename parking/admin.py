@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ParkingLot, ParkingSlot
+from .models import ParkingLot, ParkingSlot, Reservation, SlotClass, Tariff
 
 
 @admin.register(ParkingLot)
@@ -10,6 +10,30 @@ class ParkingLotAdmin(admin.ModelAdmin):
 
 @admin.register(ParkingSlot)
 class ParkingSlotAdmin(admin.ModelAdmin):
-    list_display = ['parking_lot', 'slot_number', 'is_available']
+    list_display = ['parking_lot', 'slot_number', 'slot_class', 'is_available', 'is_active', 'gate_distances']
+    list_filter = ['slot_class']
     search_fields = ['name']
 
+
+@admin.register(SlotClass)
+class SlotClassAdmin(admin.ModelAdmin):
+    list_display = ['parking_lot', 'vehicle_type', 'capacity', 'occupied', 'available']
+    list_filter = ['vehicle_type']
+
+    def has_delete_permission(self, request, obj=None):
+        if obj is not None and obj.has_parked_vehicles():
+            return False
+        return super().has_delete_permission(request, obj)
+
+
+@admin.register(Tariff)
+class TariffAdmin(admin.ModelAdmin):
+    list_display = ['parking_lot', 'vehicle_type', 'charge_per_hour', 'grace_minutes', 'daily_cap']
+    list_filter = ['vehicle_type']
+
+
+@admin.register(Reservation)
+class ReservationAdmin(admin.ModelAdmin):
+    list_display = ['parking_lot', 'vehicle', 'slot_class', 'start_time', 'end_time', 'cancelled_at', 'ticket']
+    list_filter = ['slot_class']
+    raw_id_fields = ['vehicle', 'ticket']
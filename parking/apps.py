@@ -7,3 +7,9 @@ class ParkingConfig(AppConfig):
 
     def ready(self) -> None:
         import parking.signals
+        from parkinglot.instrumentation import request_metrics
+        from .lot_cache import lot_configs
+
+        request_metrics.register_gauges(
+            'parking_lot_config_cache', 'Lot config cache hits, misses and local entries', lot_configs.stats
+        )
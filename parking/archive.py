@@ -0,0 +1,100 @@
+"""
+Archival of closed tickets.
+
+``archive_closed_tickets`` moves tickets closed before a cutoff out of the
+live table, one chunk per transaction, either into ``TicketArchive`` or into
+gzip-compressed, column-oriented JSON files. The live table then only holds
+open and recent tickets. ``ticket_history`` and ``closed_ticket_rows`` read
+across both tables so history queries keep working after archival.
+"""
+import gzip
+import json
+from datetime import datetime
+from pathlib import Path
+
+from django.db import transaction
+
+from .models import Ticket, TicketArchive
+
+ARCHIVE_CHUNK_SIZE = 5000
+
+ARCHIVE_COLUMNS = (
+    'id', 'parking_lot_id', 'vehicle_id', 'slot_number', 'entry_gate',
+    'entry_time', 'exit_time', 'total_charge',
+)
+# The same columns read from the live table
+TICKET_COLUMNS = (
+    'id', 'parking_slot__parking_lot_id', 'vehicle_id', 'parking_slot__slot_number', 'entry_gate',
+    'entry_time', 'exit_time', 'total_charge',
+)
+
+
+def archive_closed_tickets(
+    closed_before: datetime, chunk_size: int = ARCHIVE_CHUNK_SIZE, export_dir: Path | None = None
+) -> int:
+    """
+    Move tickets closed before ``closed_before`` out of the live table.
+
+    Without ``export_dir`` the rows go to TicketArchive; with it each chunk
+    is written to its own ``tickets-<first id>-<last id>.json.gz`` file
+    before the rows are deleted. Memory stays bounded by ``chunk_size`` and
+    every chunk commits on its own, so an interrupted run resumes where it
+    stopped. Returns the number of tickets moved.
+    """
+    moved = 0
+    closed = Ticket.objects.filter(exit_time__lt=closed_before).order_by('id')
+    while True:
+        with transaction.atomic():
+            rows = list(closed.values_list(*TICKET_COLUMNS)[:chunk_size])
+            if not rows:
+                return moved
+
+            if export_dir is None:
+                TicketArchive.objects.bulk_create(
+                    (TicketArchive(**dict(zip(ARCHIVE_COLUMNS, row))) for row in rows),
+                    batch_size=chunk_size,
+                    ignore_conflicts=True,
+                )
+            else:
+                export_chunk(rows, Path(export_dir))
+            Ticket.objects.filter(id__in=[row[0] for row in rows]).delete()
+        moved += len(rows)
+
+
+def export_chunk(rows, export_dir: Path) -> Path:
+    """Write rows as one gzip JSON object of per-column arrays."""
+    export_dir.mkdir(parents=True, exist_ok=True)
+    path = export_dir / f'tickets-{rows[0][0]}-{rows[-1][0]}.json.gz'
+    columns = {name: list(values) for name, values in zip(ARCHIVE_COLUMNS, zip(*rows))}
+    for name in ('entry_time', 'exit_time'):
+        columns[name] = [value.isoformat() for value in columns[name]]
+    columns['total_charge'] = [str(value) for value in columns['total_charge']]
+
+    # Write then rename, so a crash never leaves a truncated file under the final name
+    partial = path.with_suffix('.partial')
+    with gzip.open(partial, 'wt', encoding='utf-8') as file:
+        json.dump({'columns': list(ARCHIVE_COLUMNS), 'rows': len(rows), 'data': columns}, file)
+    partial.replace(path)
+    return path
+
+
+def closed_ticket_rows(**filters):
+    """
+    ``ARCHIVE_COLUMNS`` rows of closed tickets from the live table and the archive.
+
+    ``filters`` use archive field names (``parking_lot_id``, ``vehicle_id``,
+    ``entry_time__lt``, ...) and are translated for the live table.
+    """
+    live_filters = {
+        key.replace('parking_lot_id', 'parking_slot__parking_lot_id', 1): value
+        for key, value in filters.items()
+    }
+    live = Ticket.objects.filter(exit_time__isnull=False, **live_filters).values_list(*TICKET_COLUMNS)
+    archived = TicketArchive.objects.filter(**filters).values_list(*ARCHIVE_COLUMNS)
+    return live.union(archived, all=True)
+
+
+def ticket_history(limit: int = 100, **filters) -> list[dict]:
+    """Most recently closed tickets matching ``filters``, live or archived."""
+    rows = closed_ticket_rows(**filters).order_by('-exit_time', '-id')[:limit]
+    return [dict(zip(ARCHIVE_COLUMNS, row)) for row in rows]
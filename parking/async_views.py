@@ -0,0 +1,225 @@
+"""
+Async variants of the park, remove and current-parkings endpoints, and the
+live occupancy feed.
+
+Served under ASGI these run on the event loop, so one worker can hold many
+concurrent gate connections. Reads go through Django's async ORM; only the
+transactional park/remove services, which the async ORM cannot run, hop to a
+thread with ``sync_to_async``. Responses render to the same JSON as the DRF
+views.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.db.models import Sum
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+
+from vehicle.models import Vehicle
+from .feed import feed_frames, get_backend, snapshot
+from .idempotency import idempotent
+from .journal import gate_writer
+from .lot_cache import lot_configs
+from .models import ParkingLot, Ticket
+from .plate_cache import plates
+from .serializers import (
+    CurrentParkingsParamsSerializer,
+    ParkEventSerializer,
+    RemoveEventSerializer,
+    acurrent_parking_rows,
+    slot_unavailable_message,
+    ticket_response_data,
+)
+from .services import (
+    SlotUnavailable,
+    TicketAlreadyClosed,
+    TicketNotFound,
+    VehicleAlreadyParked,
+    VehicleNotFound,
+    VehicleNotParked,
+)
+
+renderer = JSONRenderer()
+
+
+def json_response(data, status_code):
+    return HttpResponse(renderer.render(data), status=status_code, content_type='application/json')
+
+
+def parse_body(request):
+    try:
+        return json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+
+
+@csrf_exempt
+@require_POST
+@idempotent
+async def park_vehicle_view(request):
+    data = parse_body(request)
+    if data is None:
+        return json_response({'detail': 'JSON parse error'}, status.HTTP_400_BAD_REQUEST)
+
+    serializer = ParkEventSerializer(data=data)
+    if not serializer.is_valid():
+        return json_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+    params = serializer.validated_data
+
+    errors = {}
+    vehicle_field = 'serial_number' if 'serial_number' in params else 'vehicle_id'
+    if vehicle_field == 'serial_number':
+        plate = await plates.aget(params['serial_number'])
+        if plate is None:
+            errors['serial_number'] = ["Vehicle not found"]
+        else:
+            params['vehicle_id'], _, params['vehicle_type'] = plate
+    else:
+        params['vehicle_type'] = await Vehicle.objects.filter(
+            id=params['vehicle_id']
+        ).values_list('type', flat=True).afirst()
+        if params['vehicle_type'] is None:
+            errors['vehicle_id'] = ["Vehicle not found"]
+    lot_config = await lot_configs.aget(params['parking_lot_id'])
+    if lot_config is None:
+        errors['parking_lot_id'] = ["Parking lot not found"]
+    if errors:
+        return json_response(errors, status.HTTP_400_BAD_REQUEST)
+
+    if not (1 <= params['entry_gate'] <= lot_config.total_entry_gate):
+        return json_response({
+            'entry_gate': [f'Entry gate must be between 1 and {lot_config.total_entry_gate}']
+        }, status.HTTP_400_BAD_REQUEST)
+
+    def park():
+        return gate_writer().park_vehicle(
+            params['vehicle_id'], lot_config.to_model(), params['entry_gate'], params['vehicle_type']
+        )
+
+    try:
+        ticket = await sync_to_async(park)()
+    except SlotUnavailable as exc:
+        return json_response({
+            api_settings.NON_FIELD_ERRORS_KEY: [slot_unavailable_message(exc)]
+        }, status.HTTP_400_BAD_REQUEST)
+    except VehicleAlreadyParked:
+        return json_response({vehicle_field: ["Vehicle is already parked"]}, status.HTTP_400_BAD_REQUEST)
+
+    return json_response({
+        **ticket_response_data(ticket),
+        'message': 'Vehicle parked successfully'
+    }, status.HTTP_201_CREATED)
+
+
+@csrf_exempt
+@require_POST
+@idempotent
+async def remove_vehicle_view(request):
+    data = parse_body(request)
+    if data is None:
+        return json_response({'detail': 'JSON parse error'}, status.HTTP_400_BAD_REQUEST)
+
+    serializer = RemoveEventSerializer(data=data)
+    if not serializer.is_valid():
+        return json_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+    params = serializer.validated_data
+
+    def remove():
+        writer = gate_writer()
+        if 'serial_number' in params:
+            return writer.remove_vehicle_by_serial(params['serial_number'])
+        return writer.remove_vehicle(params['ticket_id'])
+
+    try:
+        ticket = await sync_to_async(remove)()
+    except TicketNotFound:
+        return json_response({'ticket_id': ["Ticket not found"]}, status.HTTP_400_BAD_REQUEST)
+    except VehicleNotFound:
+        return json_response({'serial_number': ["Vehicle not found"]}, status.HTTP_400_BAD_REQUEST)
+    except VehicleNotParked:
+        return json_response({'serial_number': ["Vehicle is not parked"]}, status.HTTP_400_BAD_REQUEST)
+    except TicketAlreadyClosed:
+        field = 'serial_number' if 'serial_number' in params else 'ticket_id'
+        return json_response({field: ["Vehicle has already been removed"]}, status.HTTP_400_BAD_REQUEST)
+
+    return json_response({
+        **ticket_response_data(ticket),
+        'message': 'Vehicle removed successfully'
+    }, status.HTTP_200_OK)
+
+
+@require_GET
+async def current_parkings_view(request):
+    query_serializer = CurrentParkingsParamsSerializer(data=request.GET)
+    if not query_serializer.is_valid():
+        return json_response(query_serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+    params = query_serializer.validated_data
+    parking_lot_id = params.get('parking_lot_id')
+    if parking_lot_id is not None and await lot_configs.aget(parking_lot_id) is None:
+        return json_response({'parking_lot_id': ["Parking lot not found"]}, status.HTTP_400_BAD_REQUEST)
+
+    current_tickets = Ticket.objects.filter(exit_time__isnull=True).order_by('id')
+    parking_lots = ParkingLot.objects.all()
+    if parking_lot_id:
+        current_tickets = current_tickets.filter(parking_slot__parking_lot_id=parking_lot_id)
+        parking_lots = parking_lots.filter(id=parking_lot_id)
+    if 'cursor' in params:
+        current_tickets = current_tickets.filter(id__gt=params['cursor'])
+    charge_at = timezone.now() if params['preview_charge'] else None
+
+    if params['stream']:
+        async def stream_ndjson():
+            async for row in acurrent_parking_rows(current_tickets, charge_at=charge_at):
+                yield renderer.render(row) + b'\n'
+
+        return StreamingHttpResponse(stream_ndjson(), content_type='application/x-ndjson')
+
+    # Fetch one extra row to know whether there is a next page
+    page = [
+        row async for row in acurrent_parking_rows(
+            current_tickets, limit=params['limit'] + 1, charge_at=charge_at
+        )
+    ]
+    next_cursor = page[params['limit'] - 1]['id'] if len(page) > params['limit'] else None
+    total_count = (await parking_lots.aaggregate(total=Sum('occupied')))['total'] or 0
+
+    return json_response({
+        'current_parkings': page[:params['limit']],
+        'total_count': total_count,
+        'next_cursor': next_cursor
+    }, status.HTTP_200_OK)
+
+
+@require_GET
+async def occupancy_feed_view(request, parking_lot_id):
+    """Server-Sent Events: a snapshot of the lot, then its park/remove deltas."""
+    backend = get_backend()
+    # Subscribe before reading the snapshot so no event falls in between
+    subscription = backend.subscribe(parking_lot_id)
+    try:
+        initial = await snapshot(parking_lot_id)
+    except BaseException:
+        backend.unsubscribe(subscription)
+        raise
+    if initial is None:
+        backend.unsubscribe(subscription)
+        return json_response({'detail': 'Parking lot not found'}, status.HTTP_404_NOT_FOUND)
+
+    async def stream():
+        try:
+            async for frame in feed_frames(subscription, initial):
+                yield frame
+        finally:
+            backend.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,23 @@
+"""Shared helpers for the benchmark management commands."""
+import math
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: list[float]) -> dict:
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    values = sorted(latencies)
+    return {
+        'count': len(values),
+        'mean_ms': round(1000 * sum(values) / len(values), 3) if values else 0.0,
+        'p50_ms': round(1000 * percentile(values, 0.50), 3),
+        'p90_ms': round(1000 * percentile(values, 0.90), 3),
+        'p99_ms': round(1000 * percentile(values, 0.99), 3),
+        'max_ms': round(1000 * values[-1], 3) if values else 0.0,
+    }
@@ -0,0 +1,223 @@
+"""
+Live occupancy feed.
+
+The park and remove services publish a small event per lot after every
+commit; ``/parking/feed/<lot>/`` streams them to display boards as
+Server-Sent Events, after a snapshot of the lot taken on connect. Clients
+key their state by ticket id: a ``park`` event adds its tickets and a
+``remove`` event drops them, so an event that the snapshot already reflects
+is harmless to apply again.
+
+Events go through the backend named by ``PARKING_FEED_BACKEND``. The
+default ``InProcessBackend`` only reaches subscribers of the publishing
+process; a multi-process deployment plugs in a backend that relays through
+a shared broker and hands received events to ``InProcessBackend.deliver``.
+"""
+import asyncio
+import itertools
+import json
+import threading
+from collections import defaultdict
+from functools import cache
+from typing import Iterable
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .models import ParkingLot, SlotClass, Ticket
+
+
+class Subscription:
+    """One subscriber's bounded queue of encoded SSE frames, bound to its event loop."""
+
+    def __init__(self, parking_lot_id: int, loop: asyncio.AbstractEventLoop, max_queue: int):
+        self.parking_lot_id = parking_lot_id
+        self.loop = loop
+        self.queue: asyncio.Queue[bytes] = asyncio.Queue(maxsize=max_queue)
+        # Set when the queue overflowed; the stream then resends a snapshot
+        self.lagged = False
+
+    def put(self, frame: bytes) -> None:
+        """Called on the subscription's loop."""
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self.lagged = True
+
+    def drain(self) -> None:
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.lagged = False
+
+
+class InProcessBackend:
+    """
+    Fans events out to this process's subscribers.
+
+    An event is encoded once, however many subscribers it has. Publishing
+    from a worker thread costs one ``call_soon_threadsafe`` per event loop
+    with subscribers, not one per subscriber. Keepalives come from one timer
+    per event loop rather than a timeout per subscriber.
+    """
+
+    def __init__(self):
+        self._subscribers: dict[int, dict[asyncio.AbstractEventLoop, set[Subscription]]] = (
+            defaultdict(lambda: defaultdict(set))
+        )
+        self._sequences: dict[int, itertools.count] = defaultdict(lambda: itertools.count(1))
+        self._keepalive_loops: set[asyncio.AbstractEventLoop] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def _max_queue(self) -> int:
+        return getattr(settings, 'PARKING_FEED_QUEUE_SIZE', 1000)
+
+    def subscribe(self, parking_lot_id: int) -> Subscription:
+        """Subscribe the running event loop to a lot's events."""
+        subscription = Subscription(parking_lot_id, asyncio.get_running_loop(), self._max_queue)
+        with self._lock:
+            self._subscribers[parking_lot_id][subscription.loop].add(subscription)
+            start_keepalive = subscription.loop not in self._keepalive_loops
+            self._keepalive_loops.add(subscription.loop)
+        if start_keepalive:
+            subscription.loop.call_later(self._keepalive_interval, self._keepalive, subscription.loop)
+        return subscription
+
+    @property
+    def _keepalive_interval(self) -> float:
+        return getattr(settings, 'PARKING_FEED_KEEPALIVE', 15)
+
+    def _keepalive(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Runs on ``loop``: nudge its idle subscribers, then re-arm while any remain."""
+        with self._lock:
+            idle = [
+                subscription
+                for loops in self._subscribers.values()
+                for subscription in loops.get(loop, ())
+                if subscription.queue.empty()
+            ]
+            active = any(loop in loops for loops in self._subscribers.values())
+            if not active:
+                self._keepalive_loops.discard(loop)
+        _put_all(idle, KEEPALIVE_FRAME)
+        if active:
+            loop.call_later(self._keepalive_interval, self._keepalive, loop)
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            loops = self._subscribers.get(subscription.parking_lot_id)
+            if loops is None:
+                return
+            subscriptions = loops.get(subscription.loop)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del loops[subscription.loop]
+            if not loops:
+                del self._subscribers[subscription.parking_lot_id]
+
+    def publish(self, parking_lot_id: int, event_type: str, data: dict) -> None:
+        with self._lock:
+            # Nobody is watching this lot; skip encoding
+            if parking_lot_id not in self._subscribers:
+                return
+            sequence = next(self._sequences[parking_lot_id])
+        self.deliver(parking_lot_id, sse_frame(event_type, data, sequence))
+
+    def deliver(self, parking_lot_id: int, frame: bytes) -> None:
+        """Queue an encoded frame for every local subscriber of the lot."""
+        with self._lock:
+            loops = self._subscribers.get(parking_lot_id)
+            targets = [(loop, list(subscriptions)) for loop, subscriptions in loops.items()] if loops else []
+        for loop, subscriptions in targets:
+            try:
+                loop.call_soon_threadsafe(_put_all, subscriptions, frame)
+            except RuntimeError:
+                # The loop has been closed; its subscribers are gone with it
+                pass
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(
+                len(subscriptions) for loops in self._subscribers.values() for subscriptions in loops.values()
+            )
+
+
+KEEPALIVE_FRAME = b': keepalive\n\n'
+
+
+def _put_all(subscriptions: Iterable[Subscription], frame: bytes) -> None:
+    for subscription in subscriptions:
+        subscription.put(frame)
+
+
+def sse_frame(event_type: str, data: dict, sequence: int | None = None) -> bytes:
+    lines = [] if sequence is None else [f'id: {sequence}']
+    lines += [f'event: {event_type}', f"data: {json.dumps(data, separators=(',', ':'))}", '', '']
+    return '\n'.join(lines).encode()
+
+
+@cache
+def get_backend():
+    return import_string(getattr(settings, 'PARKING_FEED_BACKEND', 'parking.feed.InProcessBackend'))()
+
+
+def publish_tickets(event_type: str, tickets: Iterable[Ticket]) -> None:
+    """Publish one ``park`` or ``remove`` event per lot for tickets that were just committed."""
+    by_lot = defaultdict(list)
+    for ticket in tickets:
+        slot = ticket.parking_slot
+        entry = {
+            'ticket_id': ticket.id,
+            'slot_number': slot.slot_number,
+            'slot_class': slot.slot_class,
+            'entry_gate': ticket.entry_gate,
+        }
+        if event_type == 'remove':
+            entry['total_charge'] = str(ticket.total_charge)
+        by_lot[slot.parking_lot_id].append(entry)
+
+    backend = get_backend()
+    for parking_lot_id, entries in by_lot.items():
+        backend.publish(parking_lot_id, event_type, {'parking_lot_id': parking_lot_id, 'tickets': entries})
+
+
+async def snapshot(parking_lot_id: int) -> dict | None:
+    """The lot's capacity per class and its open tickets, or None when the lot does not exist."""
+    lot = await ParkingLot.objects.filter(id=parking_lot_id).values('id', 'name', 'capacity').afirst()
+    if lot is None:
+        return None
+    lot['slot_classes'] = [
+        slot_class async for slot_class in SlotClass.objects.filter(
+            parking_lot_id=parking_lot_id
+        ).order_by('vehicle_type').values('vehicle_type', 'capacity')
+    ]
+    lot['tickets'] = [
+        dict(zip(('ticket_id', 'slot_number', 'slot_class', 'entry_gate'), row))
+        async for row in Ticket.objects.filter(
+            parking_slot__parking_lot_id=parking_lot_id, exit_time__isnull=True
+        ).order_by('id').values_list(
+            'id', 'parking_slot__slot_number', 'parking_slot__slot_class', 'entry_gate'
+        )
+    ]
+    return lot
+
+
+async def feed_frames(subscription: Subscription, initial: dict):
+    """
+    SSE frames for a subscription: the snapshot, then the deltas.
+
+    A subscriber that fell so far behind that its queue overflowed gets a
+    fresh snapshot instead of the events it missed.
+    """
+    yield sse_frame('snapshot', initial)
+    while True:
+        frame = await subscription.queue.get()
+        if subscription.lagged:
+            subscription.drain()
+            current = await snapshot(subscription.parking_lot_id)
+            if current is None:
+                return
+            yield sse_frame('snapshot', current)
+            continue
+        yield frame
@@ -0,0 +1,286 @@
+"""
+``Idempotency-Key`` support for the park and remove endpoints.
+
+Gate controllers retry on timeouts. When a request carries an
+``Idempotency-Key`` header, its response is stored and any retry with the
+same key gets the stored response back, marked ``Idempotent-Replayed``,
+without running the view again. Completed responses live in a bounded,
+TTL-evicted in-process LRU over the Django cache named by
+``PARKING_IDEMPOTENCY_CACHE_ALIAS`` (a Redis, Memcached or database cache
+shares them across processes). Server errors are not stored, so those
+retries run again.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+# How long a duplicate waits for the first request with its key to finish
+IN_FLIGHT_WAIT = 10
+
+renderer = JSONRenderer()
+
+
+@dataclass(frozen=True)
+class StoredResponse:
+    status_code: int
+    content: bytes
+    content_type: str
+    # Digest of the request body the response belongs to
+    fingerprint: str
+
+    def replay(self) -> HttpResponse:
+        response = HttpResponse(self.content, status=self.status_code, content_type=self.content_type)
+        response['Idempotent-Replayed'] = 'true'
+        return response
+
+
+class IdempotencyStore:
+    """
+    Process-local LRU of completed responses over an optional shared cache.
+
+    Local entries expire after ``PARKING_IDEMPOTENCY_TTL`` seconds and at
+    most ``PARKING_IDEMPOTENCY_LOCAL_SIZE`` are kept. A key is reserved
+    while its first request runs: an in-process duplicate waits for the
+    result, while one from another process finds the shared reservation
+    and is told to retry.
+    """
+
+    def __init__(self):
+        self._local: OrderedDict[str, tuple[StoredResponse, float]] = OrderedDict()
+        self._in_flight: dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def _shared(self):
+        alias = getattr(settings, 'PARKING_IDEMPOTENCY_CACHE_ALIAS', None)
+        return caches[alias] if alias else None
+
+    @property
+    def _ttl(self) -> int:
+        return getattr(settings, 'PARKING_IDEMPOTENCY_TTL', 24 * 3600)
+
+    @property
+    def _max_size(self) -> int:
+        return getattr(settings, 'PARKING_IDEMPOTENCY_LOCAL_SIZE', 10_000)
+
+    @staticmethod
+    def _key(scope: str) -> str:
+        return f'parking:idempotency:{hashlib.sha256(scope.encode()).hexdigest()}'
+
+    def get(self, scope: str) -> StoredResponse | None:
+        with self._lock:
+            stored = self._get_local(scope)
+        if stored is None and self._shared is not None:
+            stored = self._shared.get(self._key(scope))
+            if stored is not None:
+                with self._lock:
+                    self._store_local(scope, stored)
+        with self._lock:
+            if stored is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return stored
+
+    async def aget(self, scope: str) -> StoredResponse | None:
+        """Async get: answered in the event loop on a local hit, in a thread otherwise."""
+        with self._lock:
+            stored = self._get_local(scope)
+            if stored is not None:
+                self.hits += 1
+                return stored
+        return await sync_to_async(self.get)(scope)
+
+    def _get_local(self, scope: str) -> StoredResponse | None:
+        entry = self._local.get(scope)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del self._local[scope]
+            return None
+        self._local.move_to_end(scope)
+        return entry[0]
+
+    def _store_local(self, scope: str, stored: StoredResponse) -> None:
+        self._local[scope] = (stored, time.monotonic() + self._ttl)
+        self._local.move_to_end(scope)
+        while len(self._local) > self._max_size:
+            self._local.popitem(last=False)
+
+    def begin(self, scope: str) -> bool:
+        """Reserve the key for a first request; False when another one holds it."""
+        with self._lock:
+            if scope in self._in_flight:
+                return False
+            self._in_flight[scope] = threading.Event()
+        if self._shared is not None and not self._shared.add(
+            f'{self._key(scope)}:lock', 1, timeout=IN_FLIGHT_WAIT
+        ):
+            self._release(scope)
+            return False
+        return True
+
+    def finish(self, scope: str, stored: StoredResponse | None) -> None:
+        """Store the first request's response (None when it must not be replayed) and release the key."""
+        if stored is not None:
+            with self._lock:
+                self._store_local(scope, stored)
+            if self._shared is not None:
+                self._shared.set(self._key(scope), stored, timeout=self._ttl)
+        if self._shared is not None:
+            self._shared.delete(f'{self._key(scope)}:lock')
+        self._release(scope)
+
+    def _release(self, scope: str) -> None:
+        with self._lock:
+            event = self._in_flight.pop(scope, None)
+        if event is not None:
+            event.set()
+
+    def wait(self, scope: str, timeout: float = IN_FLIGHT_WAIT) -> StoredResponse | None:
+        """The response of an in-flight request with this key, once it finishes."""
+        with self._lock:
+            event = self._in_flight.get(scope)
+        if event is not None:
+            event.wait(timeout)
+        return self.get(scope)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._local.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._local)}
+
+
+responses = IdempotencyStore()
+
+
+def _scope(request) -> str | None:
+    key = request.headers.get(HEADER)
+    return None if key is None else f'{request.method}:{request.path}:{key}'
+
+
+def _error(detail: str, status_code: int) -> HttpResponse:
+    return HttpResponse(renderer.render({'detail': detail}), status=status_code, content_type='application/json')
+
+
+def _check_key(request) -> HttpResponse | None:
+    key = request.headers.get(HEADER)
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return _error(f'{HEADER} must be 1 to {MAX_KEY_LENGTH} characters', status.HTTP_400_BAD_REQUEST)
+    return None
+
+
+def _replay_or_conflict(stored: StoredResponse | None, fingerprint: str) -> HttpResponse:
+    if stored is None:
+        return _error(
+            f'A request with this {HEADER} is still in progress; retry later', status.HTTP_409_CONFLICT
+        )
+    if stored.fingerprint != fingerprint:
+        return _error(
+            f'{HEADER} was already used with a different request body',
+            status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    return stored.replay()
+
+
+def _to_store(response, fingerprint: str) -> StoredResponse | None:
+    if response.status_code >= 500 or response.streaming:
+        return None
+    if isinstance(response, Response):
+        # DRF renders after the view returns; store the JSON form
+        content, content_type = renderer.render(response.data), 'application/json'
+    else:
+        content, content_type = response.content, response['Content-Type']
+    return StoredResponse(response.status_code, content, content_type, fingerprint)
+
+
+def _exception_response(exc: APIException) -> Response:
+    """What DRF's exception handler answers for ``exc``, stored before it propagates"""
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    return Response(data, status=exc.status_code)
+
+
+def idempotent(view_func):
+    """
+    Replay the stored response of requests that repeat an ``Idempotency-Key``.
+
+    Works on sync and async function views; wrap DRF handlers with
+    ``method_decorator``. Requests without the header are not affected.
+    """
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_view(request, *args, **kwargs):
+            scope = _scope(request)
+            if scope is None:
+                return await view_func(request, *args, **kwargs)
+            if (error := _check_key(request)) is not None:
+                return error
+            fingerprint = hashlib.sha256(request.body).hexdigest()
+
+            stored = await responses.aget(scope)
+            if stored is None and not await sync_to_async(responses.begin)(scope):
+                stored = await sync_to_async(responses.wait, thread_sensitive=False)(scope)
+                return _replay_or_conflict(stored, fingerprint)
+            if stored is not None:
+                return _replay_or_conflict(stored, fingerprint)
+
+            response = None
+            try:
+                response = await view_func(request, *args, **kwargs)
+            except APIException as exc:
+                response = _exception_response(exc)
+                raise
+            finally:
+                await sync_to_async(responses.finish)(
+                    scope, _to_store(response, fingerprint) if response is not None else None
+                )
+            return response
+
+        return async_view
+
+    @wraps(view_func)
+    def view(request, *args, **kwargs):
+        scope = _scope(request)
+        if scope is None:
+            return view_func(request, *args, **kwargs)
+        if (error := _check_key(request)) is not None:
+            return error
+        fingerprint = hashlib.sha256(request.body).hexdigest()
+
+        stored = responses.get(scope)
+        if stored is None and not responses.begin(scope):
+            return _replay_or_conflict(responses.wait(scope), fingerprint)
+        if stored is not None:
+            return _replay_or_conflict(stored, fingerprint)
+
+        response = None
+        try:
+            response = view_func(request, *args, **kwargs)
+        except APIException as exc:
+            response = _exception_response(exc)
+            raise
+        finally:
+            responses.finish(scope, _to_store(response, fingerprint) if response is not None else None)
+        return response
+
+    return view
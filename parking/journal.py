@@ -0,0 +1,602 @@
+"""
+Write-behind journal for the gate APIs.
+
+With ``PARKING_WRITE_BEHIND`` on, park and remove requests do not write to
+the database. The slot is claimed from the in-memory free-slot pool, the
+event is appended to a segment file under ``PARKING_JOURNAL_DIR`` and the
+request is acknowledged once the segment is fsynced; requests that arrive
+together share one fsync. A flusher thread applies the journaled events to
+``Ticket``, ``ParkingSlot``, the occupancy counters and the rollups every
+``PARKING_JOURNAL_FLUSH_INTERVAL`` seconds, ``PARKING_JOURNAL_FLUSH_BATCH``
+events per transaction, and deletes the segments it has applied.
+
+Segments left behind by a crash are replayed when the journal is opened,
+before it serves a request. Applying is idempotent: a park is skipped when
+its ticket row exists and a remove when its ticket is already closed.
+
+Ticket ids are handed out by the journal, so while it is on it must be the
+only writer of tickets: a lock file keeps a second process from opening it,
+and the synchronous services refuse to run while ``PARKING_WRITE_BEHIND``
+is on. Database reads such
+as current parkings and occupancy see an event once it is flushed. On a
+database with sequences, run ``sqlsequencereset parking`` before going
+back to synchronous mode.
+"""
+import atexit
+import fcntl
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from . import services
+from .feed import publish_tickets
+from .lot_cache import lot_configs
+from .models import ParkingLot, ParkingSlot, Reservation, Ticket, TicketArchive
+from .plate_cache import plates
+from .reservations import reservation_index
+from .rollups import bucket_hour, record_activity, rollups_enabled
+from .services import (
+    SLOT_BATCH_SIZE,
+    SlotUnavailable,
+    TicketAlreadyClosed,
+    TicketNotFound,
+    VehicleAlreadyParked,
+    VehicleNotFound,
+    VehicleNotParked,
+    _shift_occupancy,
+    write_behind_enabled,
+)
+from .slot_pool import slot_pool
+from vehicle.models import Vehicle
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = '.log'
+
+
+def park_event(ticket: Ticket, reservation_id: int | None = None) -> dict:
+    slot = ticket.parking_slot
+    return {
+        'op': 'park', 'ticket': ticket.id, 'vehicle': ticket.vehicle_id,
+        'lot': slot.parking_lot_id, 'slot': slot.id, 'slot_class': slot.slot_class,
+        'gate': ticket.entry_gate, 'at': ticket.entry_time.isoformat(), 'reservation': reservation_id,
+    }
+
+
+def remove_event(ticket: Ticket) -> dict:
+    slot = ticket.parking_slot
+    return {
+        'op': 'remove', 'ticket': ticket.id, 'vehicle': ticket.vehicle_id,
+        'lot': slot.parking_lot_id, 'slot': slot.id, 'slot_class': slot.slot_class,
+        'gate': ticket.entry_gate, 'at': ticket.exit_time.isoformat(), 'charge': str(ticket.total_charge),
+    }
+
+
+def apply_events(events: list[dict]) -> int:
+    """
+    Apply journaled events in one transaction, skipping the ones already
+    applied. Returns how many were applied.
+
+    Existing tickets are closed before new ones are inserted, so a slot or
+    vehicle handed over within the batch never trips the one-open-ticket
+    constraints. A ticket parked and removed within the batch is inserted
+    closed.
+    """
+    parks = {event['ticket']: event for event in events if event['op'] == 'park'}
+    removes = {event['ticket']: event for event in events if event['op'] == 'remove'}
+
+    with transaction.atomic():
+        exit_times = dict(Ticket.objects.filter(
+            id__in=parks.keys() | removes.keys()
+        ).values_list('id', 'exit_time'))
+
+        new, closing, applied_removes = [], [], []
+        for ticket_id, park in parks.items():
+            if ticket_id in exit_times:
+                continue
+            remove = removes.get(ticket_id)
+            new.append(Ticket(
+                id=ticket_id, parking_slot_id=park['slot'], vehicle_id=park['vehicle'],
+                entry_gate=park['gate'], entry_time=datetime.fromisoformat(park['at']),
+                exit_time=datetime.fromisoformat(remove['at']) if remove else None,
+                total_charge=Decimal(remove['charge']) if remove else Decimal('0.00'),
+            ))
+            if remove:
+                applied_removes.append(remove)
+        for ticket_id, remove in removes.items():
+            if ticket_id in exit_times and exit_times[ticket_id] is None:
+                closing.append(Ticket(
+                    id=ticket_id, exit_time=datetime.fromisoformat(remove['at']),
+                    total_charge=Decimal(remove['charge']),
+                ))
+                applied_removes.append(remove)
+            elif ticket_id not in exit_times and ticket_id not in parks:
+                logger.warning("Journaled removal of unknown ticket %s skipped", ticket_id)
+
+        deltas, taken, freed = defaultdict(int), {}, set()
+        for ticket in new:
+            park = parks[ticket.id]
+            deltas[park['lot'], park['slot_class']] += 1
+            if ticket.exit_time is None:
+                taken[park['slot']] = ticket
+        for remove in applied_removes:
+            deltas[remove['lot'], remove['slot_class']] -= 1
+            freed.add(remove['slot'])
+        freed -= taken.keys()
+
+        Ticket.objects.bulk_update(closing, ['exit_time', 'total_charge'], batch_size=SLOT_BATCH_SIZE)
+        entry_times = [ticket.entry_time for ticket in new]
+        Ticket.objects.bulk_create(new, batch_size=SLOT_BATCH_SIZE)
+        # auto_now_add stamped the insert time; keep the time the car entered
+        for ticket, entry_time in zip(new, entry_times):
+            ticket.entry_time = entry_time
+        Ticket.objects.bulk_update(new, ['entry_time'], batch_size=SLOT_BATCH_SIZE)
+        ParkingSlot.objects.filter(id__in=freed).update(is_available=True)
+        ParkingSlot.objects.filter(id__in=taken).update(is_available=False)
+        _shift_occupancy(deltas)
+        for ticket in new:
+            reservation_id = parks[ticket.id].get('reservation')
+            if reservation_id is not None:
+                Reservation.objects.filter(id=reservation_id, ticket__isnull=True).update(ticket=ticket)
+
+        if rollups_enabled():
+            entries = defaultdict(int)
+            for ticket in new:
+                entries[parks[ticket.id]['lot'], ticket.entry_gate, bucket_hour(ticket.entry_time)] += 1
+            for (lot_id, entry_gate, hour), count in entries.items():
+                record_activity(lot_id, entry_gate, hour, entries=count)
+            exits = defaultdict(lambda: [0, Decimal('0.00')])
+            closed_per_lot = defaultdict(int)
+            for remove in applied_removes:
+                bucket = exits[remove['lot'], remove['gate'], bucket_hour(datetime.fromisoformat(remove['at']))]
+                bucket[0] += 1
+                bucket[1] += Decimal(remove['charge'])
+                closed_per_lot[remove['lot']] += 1
+            for (lot_id, entry_gate, hour), (count, revenue) in exits.items():
+                record_activity(
+                    lot_id, entry_gate, hour,
+                    exits=count, revenue=revenue, occupancy_offset=closed_per_lot[lot_id],
+                )
+    return len(new) + len(applied_removes)
+
+
+def read_segment(path: Path) -> list[dict]:
+    events = []
+    with open(path, 'rb') as file:
+        for line in file:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                # A write torn by the crash; it was never fsynced, so never acknowledged
+                logger.warning("Ignoring a torn record at the end of %s", path)
+                break
+    return events
+
+
+def next_ticket_id() -> int:
+    """One past the highest ticket id ever issued, archived tickets included."""
+    return max(
+        Ticket.objects.aggregate(last=Max('id'))['last'] or 0,
+        TicketArchive.objects.aggregate(last=Max('id'))['last'] or 0,
+    ) + 1
+
+
+class GateJournal:
+    """
+    Park and remove against in-memory lot state, made durable by the journal.
+
+    Exposes the same park/remove functions as ``parking.services`` and
+    raises the same exceptions. Tickets journaled since the last flush are
+    kept in memory; everything older is read from the database, with a
+    flush counter to notice a flush that committed in between.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock_file = open(self.directory / 'lock', 'w')
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock_file.close()
+            raise ImproperlyConfigured(f"Another process has the parking journal in {self.directory} open")
+
+        # _lock guards the state and the segment; _sync_lock serializes fsyncs
+        # and is taken before _lock when both are needed
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._tickets: dict[int, Ticket] = {}
+        self._open_by_vehicle: dict[int, int] = {}
+        self._held_slots: dict[int, int] = {}
+        self._pending: list[dict] = []
+        self._applied_segments: list[Path] = []
+        self._written = self._synced = 0
+        # The segment whose directory entry was last made durable
+        self._durable_segment = None
+        self._flushes = 0
+        self._stopped = threading.Event()
+        self._flusher = None
+
+        self.replayed = self._replay()
+        self._next_id = next_ticket_id()
+        self._file = self._open_segment()
+
+    @property
+    def _fsync(self) -> bool:
+        return getattr(settings, 'PARKING_JOURNAL_FSYNC', True)
+
+    @property
+    def _flush_interval(self) -> float:
+        return getattr(settings, 'PARKING_JOURNAL_FLUSH_INTERVAL', 0.2)
+
+    @property
+    def _batch_size(self) -> int:
+        return getattr(settings, 'PARKING_JOURNAL_FLUSH_BATCH', 2000)
+
+    def _segments(self) -> list[Path]:
+        return sorted(self.directory.glob(f'*{SEGMENT_SUFFIX}'))
+
+    def _replay(self) -> int:
+        segments = self._segments()
+        self._segment_number = int(segments[-1].stem) if segments else 0
+        events = [event for segment in segments for event in read_segment(segment)]
+        applied = sum(
+            apply_events(events[start:start + self._batch_size])
+            for start in range(0, len(events), self._batch_size)
+        )
+        for segment in segments:
+            segment.unlink()
+        if segments:
+            logger.info("Replayed %s parking journal event(s) from %s segment(s)", applied, len(segments))
+        return applied
+
+    def _open_segment(self):
+        self._segment_number += 1
+        path = self.directory / f'{self._segment_number:012d}{SEGMENT_SUFFIX}'
+        return open(path, 'ab', buffering=0)
+
+    def start(self) -> None:
+        self._flusher = threading.Thread(target=self._run, name='parking-journal-flusher', daemon=True)
+        self._flusher.start()
+
+    def _run(self) -> None:
+        try:
+            while not self._stopped.wait(self._flush_interval):
+                try:
+                    self.flush()
+                except Exception:
+                    logger.exception("Flushing the parking journal failed; retrying")
+        finally:
+            connection.close()
+
+    def close(self) -> None:
+        """Stop the flusher, apply what is left and release the journal."""
+        self._stopped.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        try:
+            self.flush()
+        finally:
+            with self._sync_lock, self._lock:
+                self._file.close()
+                # Anything journaled after the last flush is replayed on next open
+                if not self._pending:
+                    for segment in self._segments():
+                        segment.unlink()
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+
+    def _append(self, events: list[dict]) -> int:
+        """Called with ``_lock`` held; returns the write to sync up to."""
+        self._file.write(b''.join(
+            json.dumps(event, separators=(',', ':')).encode() + b'\n' for event in events
+        ))
+        self._pending.extend(events)
+        self._written += 1
+        return self._written
+
+    def _fsync_segment(self, file) -> None:
+        """
+        fsync a segment and, the first time, the directory entry that replay
+        finds it by. Called with ``_sync_lock`` held.
+        """
+        os.fsync(file.fileno())
+        if file is not self._durable_segment:
+            directory = os.open(self.directory, os.O_RDONLY)
+            try:
+                os.fsync(directory)
+            finally:
+                os.close(directory)
+            self._durable_segment = file
+
+    def _sync(self, written: int) -> None:
+        """Make the journal durable up to a write; one fsync covers every write queued behind it."""
+        with self._sync_lock:
+            if self._synced >= written:
+                return
+            with self._lock:
+                target, file = self._written, self._file
+            if self._fsync:
+                self._fsync_segment(file)
+            self._synced = target
+
+    def _locked_after(self, read):
+        """Run the database ``read``, then take ``_lock``, re-reading if a flush committed in between."""
+        while True:
+            flushes = self._flushes
+            result = read()
+            self._lock.acquire()
+            if flushes == self._flushes:
+                return result
+            self._lock.release()
+
+    def _is_open(self, ticket_id: int | None) -> bool:
+        """Whether a ticket the database has open is still open here; called with ``_lock`` held."""
+        if ticket_id is None:
+            return False
+        ticket = self._tickets.get(ticket_id)
+        return ticket is None or ticket.exit_time is None
+
+    def _claim(self, parking_lot_id: int, slot_class: str, entry_gate: int) -> tuple[int, int] | None:
+        while True:
+            candidate = slot_pool.claim(parking_lot_id, slot_class, entry_gate)
+            # A re-warmed pool offers slots whose park is not flushed yet; drop them
+            if candidate is None or candidate[0] not in self._held_slots:
+                return candidate
+
+    def park_vehicles(
+        self, requests: list[tuple[int, ParkingLot, int, str]]
+    ) -> list[Ticket | SlotUnavailable | VehicleAlreadyParked]:
+        vehicle_ids = {vehicle_id for vehicle_id, _, _, _ in requests}
+        # Warmed outside the lock, so claiming and admission below do not query
+        parking_lot_ids = {parking_lot.id for _, parking_lot, _, _ in requests}
+        slot_pool.warm_missing(parking_lot_ids)
+        reservation_index.get_many(parking_lot_ids)
+        vehicle_types = dict(Vehicle.objects.filter(
+            id__in={vehicle_id for vehicle_id, _, _, vehicle_type in requests if vehicle_type is None}
+        ).values_list('id', 'type'))
+        in_db = self._locked_after(lambda: dict(Ticket.objects.filter(
+            vehicle_id__in=vehicle_ids, exit_time__isnull=True
+        ).values_list('vehicle_id', 'id')))
+        try:
+            entry_time = timezone.now()
+            outcomes, opened, fulfilled = [], [], {}
+            for vehicle_id, parking_lot, entry_gate, vehicle_type in requests:
+                vehicle_type = vehicle_type or vehicle_types.get(vehicle_id)
+                if vehicle_id in self._open_by_vehicle or self._is_open(in_db.get(vehicle_id)):
+                    outcomes.append(VehicleAlreadyParked())
+                    continue
+                candidate = self._claim(parking_lot.id, vehicle_type, entry_gate)
+                if candidate is None:
+                    outcomes.append(SlotUnavailable(vehicle_type))
+                    continue
+                slot_id, slot_number = candidate
+                [booking] = reservation_index.admit(
+                    parking_lot.id, vehicle_type, [vehicle_id],
+                    slot_pool.free_count(parking_lot.id, vehicle_type) + 1,
+                )
+                if booking is False:
+                    slot_pool.release(parking_lot.id, vehicle_type, slot_id, slot_number)
+                    outcomes.append(SlotUnavailable(vehicle_type))
+                    continue
+
+                ticket = Ticket(
+                    id=self._next_id, vehicle_id=vehicle_id, entry_gate=entry_gate,
+                    entry_time=entry_time, total_charge=Decimal('0.00'),
+                    parking_slot=ParkingSlot(
+                        id=slot_id, parking_lot=parking_lot, slot_number=slot_number,
+                        slot_class=vehicle_type, is_available=False,
+                    ),
+                )
+                ticket.vehicle_type = vehicle_type
+                self._next_id += 1
+                self._tickets[ticket.id] = ticket
+                self._open_by_vehicle[vehicle_id] = ticket.id
+                self._held_slots[slot_id] = ticket.id
+                outcomes.append(ticket)
+                opened.append(ticket)
+                if booking is not None:
+                    fulfilled[ticket.id] = booking
+            written = self._append([
+                park_event(ticket, fulfilled[ticket.id].id if ticket.id in fulfilled else None)
+                for ticket in opened
+            ]) if opened else 0
+        finally:
+            self._lock.release()
+
+        self._sync(written)
+        for ticket in opened:
+            plates.ticket_opened(ticket.vehicle_id, ticket.id)
+        if opened:
+            publish_tickets('park', opened)
+        for ticket in opened:
+            if ticket.id in fulfilled:
+                reservation_index.fulfil(ticket.parking_slot.parking_lot_id, fulfilled[ticket.id])
+        return outcomes
+
+    def park_vehicle(
+        self, vehicle_id: int, parking_lot: ParkingLot, entry_gate: int, vehicle_type: str | None = None
+    ) -> Ticket:
+        return _raise(self.park_vehicles([(vehicle_id, parking_lot, entry_gate, vehicle_type)])[0])
+
+    def remove_vehicles(self, ticket_ids: list[int]) -> list[Ticket | TicketNotFound | TicketAlreadyClosed]:
+        def read():
+            # Journaled tickets are read too but the in-memory copy wins
+            loaded = Ticket.objects.select_related('parking_slot').annotate(
+                vehicle_type=F('vehicle__type')
+            ).in_bulk(set(ticket_ids))
+            # Lot configs too, so billing under the lock does not query
+            journaled = filter(None, map(self._tickets.get, ticket_ids))
+            return loaded, lot_configs.get_many({
+                ticket.parking_slot.parking_lot_id for ticket in (*loaded.values(), *journaled)
+            })
+
+        loaded, configs = self._locked_after(read)
+        try:
+            exit_time = timezone.now()
+            outcomes, closed = [], []
+            for ticket_id in ticket_ids:
+                ticket = self._tickets.get(ticket_id) or loaded.get(ticket_id)
+                if ticket is None:
+                    outcomes.append(TicketNotFound())
+                    continue
+                if ticket.exit_time:
+                    outcomes.append(TicketAlreadyClosed())
+                    continue
+
+                slot = ticket.parking_slot
+                lot_config = configs.get(slot.parking_lot_id) or lot_configs.get(slot.parking_lot_id)
+                slot.parking_lot = lot_config.to_model()
+                slot.is_available = True
+                ticket.exit_time = exit_time
+                ticket.total_charge = lot_config.tariff(ticket.vehicle_type).charge(ticket.entry_time, exit_time)
+                self._tickets[ticket_id] = ticket
+                if self._open_by_vehicle.get(ticket.vehicle_id) == ticket_id:
+                    del self._open_by_vehicle[ticket.vehicle_id]
+                if self._held_slots.get(slot.id) == ticket_id:
+                    del self._held_slots[slot.id]
+                outcomes.append(ticket)
+                closed.append(ticket)
+            written = self._append([remove_event(ticket) for ticket in closed]) if closed else 0
+        finally:
+            self._lock.release()
+
+        self._sync(written)
+        for ticket in closed:
+            slot = ticket.parking_slot
+            slot_pool.release(slot.parking_lot_id, slot.slot_class, slot.id, slot.slot_number)
+            plates.ticket_closed(ticket.vehicle_id, ticket.id)
+        if closed:
+            publish_tickets('remove', closed)
+        return outcomes
+
+    def remove_vehicle(self, ticket_id: int) -> Ticket:
+        return _raise(self.remove_vehicles([ticket_id])[0])
+
+    def open_tickets_by_serial(self, serial_numbers) -> dict[str, tuple[int, int | None, str]]:
+        """Plate cache entries with the open ticket ids as this journal sees them."""
+        entries = plates.get_many(serial_numbers)
+        vehicle_ids = {vehicle_id for vehicle_id, _, _ in entries.values()}
+        in_db = self._locked_after(lambda: dict(Ticket.objects.filter(
+            vehicle_id__in=vehicle_ids, exit_time__isnull=True
+        ).values_list('vehicle_id', 'id')))
+        try:
+            for serial_number, (vehicle_id, _, vehicle_type) in entries.items():
+                ticket_id = self._open_by_vehicle.get(vehicle_id)
+                if ticket_id is None and self._is_open(in_db.get(vehicle_id)):
+                    ticket_id = in_db[vehicle_id]
+                entries[serial_number] = (vehicle_id, ticket_id, vehicle_type)
+        finally:
+            self._lock.release()
+        return entries
+
+    def remove_vehicle_by_serial(self, serial_number: str) -> Ticket:
+        entry = self.open_tickets_by_serial([serial_number]).get(serial_number)
+        if entry is None:
+            raise VehicleNotFound
+        if entry[1] is None:
+            raise VehicleNotParked
+        return self.remove_vehicle(entry[1])
+
+    def flush(self) -> int:
+        """Apply everything journaled so far; returns how many events were applied."""
+        with self._flush_lock:
+            with self._sync_lock, self._lock:
+                events, self._pending = self._pending, []
+                if events:
+                    # Later writes go to a new segment, so the applied ones can be deleted whole
+                    if self._fsync:
+                        self._fsync_segment(self._file)
+                    self._synced = self._written
+                    self._file.close()
+                    self._applied_segments.append(Path(self._file.name))
+                    self._file = self._open_segment()
+            if not events:
+                return 0
+
+            try:
+                applied = sum(
+                    apply_events(events[start:start + self._batch_size])
+                    for start in range(0, len(events), self._batch_size)
+                )
+            except Exception:
+                # Applying is idempotent, so the whole lot is retried next time
+                with self._lock:
+                    self._pending[:0] = events
+                raise
+
+            with self._lock:
+                still_pending = {event['ticket'] for event in self._pending}
+                for ticket_id in {event['ticket'] for event in events} - still_pending:
+                    ticket = self._tickets.pop(ticket_id, None)
+                    if ticket is None:
+                        continue
+                    if self._open_by_vehicle.get(ticket.vehicle_id) == ticket_id:
+                        del self._open_by_vehicle[ticket.vehicle_id]
+                    if self._held_slots.get(ticket.parking_slot_id) == ticket_id:
+                        del self._held_slots[ticket.parking_slot_id]
+                self._flushes += 1
+                segments, self._applied_segments = self._applied_segments, []
+            for segment in segments:
+                segment.unlink()
+            return applied
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'pending_events': len(self._pending),
+                'tickets_in_memory': len(self._tickets),
+                'flushes': self._flushes,
+                'next_ticket_id': self._next_id,
+            }
+
+
+def _raise(outcome):
+    if isinstance(outcome, Exception):
+        raise outcome
+    return outcome
+
+
+_journal: GateJournal | None = None
+_journal_lock = threading.Lock()
+
+
+def get_journal() -> GateJournal:
+    """The process's journal, replaying leftover segments and starting the flusher on first use."""
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = GateJournal(settings.PARKING_JOURNAL_DIR)
+            _journal.start()
+        return _journal
+
+
+def close_journal() -> None:
+    global _journal
+    with _journal_lock:
+        journal, _journal = _journal, None
+    if journal is not None:
+        journal.close()
+
+
+atexit.register(close_journal)
+
+
+def gate_writer():
+    """
+    What the gate APIs park and remove through: the journal in write-behind
+    mode, the synchronous ``parking.services`` otherwise.
+    """
+    return get_journal() if write_behind_enabled() else services
@@ -0,0 +1,144 @@
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+from .billing import TariffRule
+from .models import ParkingLot, Tariff
+
+# In model field order, as ParkingLot.from_db expects
+CONFIG_FIELDS = ('id', 'name', 'capacity', 'charge_per_hour', 'total_entry_gate')
+
+
+@dataclass(frozen=True)
+class LotConfig:
+    """The rarely-changing part of a ParkingLot row, with its tariffs."""
+    id: int
+    name: str
+    capacity: int
+    total_entry_gate: int
+    charge_per_hour: Decimal
+    # Vehicle type -> rule, for the types with their own Tariff row
+    tariffs: dict[str, TariffRule] = field(default_factory=dict, compare=False)
+
+    def tariff(self, vehicle_type: str) -> TariffRule:
+        rule = self.tariffs.get(vehicle_type)
+        return rule if rule is not None else TariffRule.from_amounts(self.charge_per_hour)
+
+    def to_model(self) -> ParkingLot:
+        """A ParkingLot with only the config fields loaded, usable as a FK target."""
+        return ParkingLot.from_db(
+            None, CONFIG_FIELDS, [getattr(self, field) for field in CONFIG_FIELDS]
+        )
+
+
+class LotConfigCache:
+    """
+    Process-local cache of LotConfig per lot id.
+
+    Local entries expire after ``PARKING_LOT_CACHE_TTL`` seconds, since the
+    ParkingLot save/delete signals only invalidate the process that made
+    the change. When ``PARKING_LOT_CACHE_ALIAS`` names a Django cache, it is
+    used as a shared second tier that the signals invalidate as well.
+    """
+
+    def __init__(self):
+        self._local: dict[int, tuple[LotConfig, float]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def _shared(self):
+        alias = getattr(settings, 'PARKING_LOT_CACHE_ALIAS', None)
+        return caches[alias] if alias else None
+
+    @property
+    def _ttl(self) -> float:
+        return getattr(settings, 'PARKING_LOT_CACHE_TTL', 60)
+
+    @staticmethod
+    def _key(parking_lot_id: int) -> str:
+        return f'parking:lot-config:{parking_lot_id}'
+
+    def get(self, parking_lot_id: int) -> LotConfig | None:
+        return self.get_many([parking_lot_id]).get(parking_lot_id)
+
+    async def aget(self, parking_lot_id: int) -> LotConfig | None:
+        """Async get: answered in the event loop on a local hit, in a thread otherwise."""
+        with self._lock:
+            entry = self._local.get(parking_lot_id)
+            if entry is not None and entry[1] > time.monotonic():
+                self.hits += 1
+                return entry[0]
+        return await sync_to_async(self.get)(parking_lot_id)
+
+    def get_many(self, parking_lot_ids) -> dict[int, LotConfig]:
+        """Configs for the lots that exist, reading through both tiers."""
+        now = time.monotonic()
+        found, missing = {}, []
+        with self._lock:
+            for parking_lot_id in set(parking_lot_ids):
+                entry = self._local.get(parking_lot_id)
+                if entry is not None and entry[1] > now:
+                    found[parking_lot_id] = entry[0]
+                else:
+                    missing.append(parking_lot_id)
+            self.hits += len(found)
+            self.misses += len(missing)
+
+        fetched = {}
+        if missing and self._shared is not None:
+            shared = self._shared.get_many([self._key(lot_id) for lot_id in missing])
+            for config in shared.values():
+                fetched[config.id] = config
+                missing.remove(config.id)
+
+        if missing:
+            tariffs = defaultdict(dict)
+            for parking_lot_id, vehicle_type, charge_per_hour, grace_minutes, daily_cap in (
+                Tariff.objects.filter(parking_lot_id__in=missing).values_list(
+                    'parking_lot_id', 'vehicle_type', 'charge_per_hour', 'grace_minutes', 'daily_cap'
+                )
+            ):
+                tariffs[parking_lot_id][vehicle_type] = TariffRule.from_amounts(
+                    charge_per_hour, grace_minutes, daily_cap
+                )
+            loaded = {
+                values['id']: LotConfig(**values, tariffs=tariffs[values['id']])
+                for values in ParkingLot.objects.filter(id__in=missing).values(*CONFIG_FIELDS)
+            }
+            if loaded and self._shared is not None:
+                self._shared.set_many({self._key(lot_id): config for lot_id, config in loaded.items()})
+            fetched.update(loaded)
+
+        # Local hits keep their expiry, so a busy lot is still re-read
+        with self._lock:
+            expires_at = now + self._ttl
+            for parking_lot_id, config in fetched.items():
+                self._local[parking_lot_id] = (config, expires_at)
+        found.update(fetched)
+        return found
+
+    def invalidate(self, parking_lot_id: int) -> None:
+        with self._lock:
+            self._local.pop(parking_lot_id, None)
+        if self._shared is not None:
+            self._shared.delete(self._key(parking_lot_id))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._local.clear()
+
+    def stats(self) -> dict:
+        """Hits and misses since start-up and the number of local entries, for /metrics."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._local)}
+
+
+lot_configs = LotConfigCache()
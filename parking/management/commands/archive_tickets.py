@@ -0,0 +1,41 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from parking.archive import ARCHIVE_CHUNK_SIZE, archive_closed_tickets
+
+
+class Command(BaseCommand):
+    help = (
+        "Move tickets closed more than --days ago out of the live Ticket table, "
+        "into TicketArchive or, with --export-dir, into gzip columnar JSON files. "
+        "With --every the command keeps running and archives on that interval."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help="Keep tickets closed within this many days")
+        parser.add_argument('--chunk-size', type=int, default=ARCHIVE_CHUNK_SIZE)
+        parser.add_argument('--export-dir', help="Write chunks to files here instead of TicketArchive")
+        parser.add_argument('--every', type=int, help="Run forever, archiving every this many seconds")
+
+    def handle(self, *args, **options):
+        if options['days'] < 0 or options['chunk_size'] < 1:
+            raise CommandError("--days must be >= 0 and --chunk-size >= 1")
+
+        while True:
+            closed_before = timezone.now() - timedelta(days=options['days'])
+            moved = archive_closed_tickets(
+                closed_before, chunk_size=options['chunk_size'], export_dir=options['export_dir']
+            )
+            target = options['export_dir'] or 'TicketArchive'
+            self.stdout.write(self.style.SUCCESS(
+                f"Archived {moved} ticket(s) closed before {closed_before.isoformat()} to {target}"
+            ))
+            if not options['every']:
+                return
+            # Do not hold a connection while sleeping
+            connection.close()
+            time.sleep(options['every'])
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+
+from parking.benchmarks import summarize
+from parking.feed import InProcessBackend, feed_frames, sse_frame
+
+
+class Command(BaseCommand):
+    help = (
+        "Fan-out benchmark for the live occupancy feed: hold --subscribers idle "
+        "SSE streams spread over --lots, publish --events park events from a "
+        "worker thread as the services do, and report how long each event takes "
+        "to reach every subscriber of its lot, plus memory per subscriber."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, default=10_000)
+        parser.add_argument('--lots', type=int, default=10)
+        parser.add_argument('--events', type=int, default=200)
+        parser.add_argument('--interval-ms', type=float, default=5.0, help="Pause between published events")
+        parser.add_argument('--output', help="Also write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        if options['subscribers'] < 1 or options['lots'] < 1 or options['events'] < 1:
+            raise CommandError("--subscribers, --lots and --events must be positive")
+
+        report = asyncio.run(self.run(options))
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output)
+        self.stdout.write(output)
+
+    async def run(self, options):
+        backend = InProcessBackend()
+        lots = options['lots']
+        per_lot = [0] * lots
+        # frame -> [subscribers still to receive it, publish time]; frames are
+        # encoded once and shared, so the bytes object identifies the event
+        pending, latencies = {}, []
+
+        async def subscriber(subscription, ready):
+            initial = {'id': subscription.parking_lot_id, 'tickets': []}
+            frames = feed_frames(subscription, initial)
+            try:
+                await frames.__anext__()
+                ready()
+                async for frame in frames:
+                    # Only this loop consumes; the publisher adds entries before delivering
+                    entry = pending.get(frame)
+                    if entry is None:
+                        continue
+                    entry[0] -= 1
+                    if entry[0] == 0:
+                        latencies.append(time.perf_counter() - entry[1])
+                        del pending[frame]
+            finally:
+                backend.unsubscribe(subscription)
+
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        subscribed = asyncio.Event()
+        remaining = [options['subscribers']]
+
+        def ready():
+            remaining[0] -= 1
+            if not remaining[0]:
+                subscribed.set()
+
+        tasks = []
+        for index in range(options['subscribers']):
+            lot = index % lots
+            per_lot[lot] += 1
+            tasks.append(asyncio.create_task(subscriber(backend.subscribe(lot), ready)))
+        await subscribed.wait()
+        subscribe_s = time.perf_counter() - start
+        memory = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+
+        def publish():
+            for sequence in range(1, options['events'] + 1):
+                lot = sequence % lots
+                frame = sse_frame('park', {
+                    'parking_lot_id': lot,
+                    'tickets': [{'ticket_id': sequence, 'slot_number': sequence, 'slot_class': 'car', 'entry_gate': 1}],
+                }, sequence)
+                pending[frame] = [per_lot[lot], time.perf_counter()]
+                backend.deliver(lot, frame)
+                time.sleep(options['interval_ms'] / 1000)
+
+        start = time.perf_counter()
+        await asyncio.get_running_loop().run_in_executor(None, publish)
+        while pending and time.perf_counter() - start < 60:
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - start
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        deliveries = sum(per_lot[sequence % lots] for sequence in range(1, options['events'] + 1))
+        return {
+            'subscribers': options['subscribers'],
+            'lots': lots,
+            'events': options['events'],
+            'undelivered_events': len(pending),
+            'subscribe_s': round(subscribe_s, 3),
+            'memory_per_subscriber_kb': round(memory / options['subscribers'] / 1024, 2),
+            'deliveries_per_second': round(deliveries / elapsed, 1),
+            'fan_out_latency': summarize(latencies),
+            'subscribers_left': backend.subscriber_count(),
+        }
@@ -0,0 +1,90 @@
+import http.client
+import json
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand
+
+from parking.benchmarks import summarize
+from parking.services import create_parking_lots
+from vehicle.constants import VehicleType
+from vehicle.models import Vehicle
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive park/current/remove traffic against a running server and report "
+        "requests per second and latency percentiles as JSON. Start the server "
+        "on the same database, e.g. `gunicorn parkinglot.wsgi` for WSGI or "
+        "`uvicorn parkinglot.asgi:application` for ASGI (use --async-views to "
+        "target the async endpoints), and compare the reports."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--async-views', action='store_true', help="Use the /parking/async/ endpoints")
+        parser.add_argument('--label', default='', help="Deployment name recorded in the report")
+        parser.add_argument('--vehicles', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=32)
+
+    def handle(self, *args, **options):
+        [parking_lot] = create_parking_lots([("bench-http-lot", options['vehicles'], Decimal(20))])
+        vehicles = Vehicle.objects.bulk_create(
+            Vehicle(serial_number=f"BENCH-HTTP-{i}", type=VehicleType.CAR)
+            for i in range(options['vehicles'])
+        )
+
+        url = urlsplit(options['base_url'])
+        prefix = '/parking/async/' if options['async_views'] else '/parking/'
+        latencies = defaultdict(list)
+        errors = defaultdict(int)
+
+        def call(connection, name, method, path, body=None):
+            payload = json.dumps(body).encode() if body is not None else None
+            start = time.perf_counter()
+            connection.request(method, prefix + path, body=payload, headers={
+                'Content-Type': 'application/json', 'Host': url.hostname,
+            })
+            response = connection.getresponse()
+            data = response.read()
+            latencies[name].append(time.perf_counter() - start)
+            if response.status >= 400:
+                errors[name] += 1
+                return None
+            return json.loads(data)
+
+        def drive(vehicle):
+            connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=60)
+            try:
+                ticket = call(connection, 'park', 'POST', 'park/', {
+                    'vehicle_id': vehicle.id, 'parking_lot_id': parking_lot.id,
+                })
+                call(connection, 'current', 'GET', f'current/?parking_lot_id={parking_lot.id}&limit=20')
+                if ticket:
+                    call(connection, 'remove', 'POST', 'remove/', {'ticket_id': ticket['id']})
+            finally:
+                connection.close()
+
+        try:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+                list(executor.map(drive, vehicles))
+            elapsed = time.perf_counter() - start
+        finally:
+            parking_lot.delete()
+            Vehicle.objects.filter(id__in=[vehicle.id for vehicle in vehicles]).delete()
+
+        total = sum(len(samples) for samples in latencies.values())
+        self.stdout.write(json.dumps({
+            'label': options['label'],
+            'endpoints_prefix': prefix,
+            'concurrency': options['concurrency'],
+            'requests': total,
+            'duration_s': round(elapsed, 3),
+            'requests_per_second': round(total / elapsed, 1),
+            'errors': dict(errors),
+            'latency': {name: summarize(samples) for name, samples in latencies.items()},
+        }, indent=2))
@@ -0,0 +1,169 @@
+import json
+import random
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment,
+)
+
+from parking.benchmarks import summarize
+from parking.journal import close_journal, get_journal, write_behind_enabled
+from parking.lot_cache import lot_configs
+from parking.services import create_parking_lots
+from parking.slot_pool import slot_pool
+from vehicle.constants import VehicleType
+from vehicle.services import register_vehicle
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed lots and vehicles in a throwaway test database, drive mixed "
+        "park/current/remove traffic through the Django test client and report "
+        "throughput, latency percentiles and queries per request as JSON. "
+        "--mode both runs the same traffic synchronously and in write-behind "
+        "mode and compares their requests per second."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lots', type=int, default=5)
+        parser.add_argument('--capacity', type=int, default=200)
+        parser.add_argument('--vehicles', type=int, default=500)
+        parser.add_argument('--rounds', type=int, default=2, help="Park/remove cycles per vehicle")
+        parser.add_argument('--current-ratio', type=float, default=0.2,
+                            help="Chance of a current-parkings read after each park")
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--mode', choices=['sync', 'write-behind', 'both'], default='sync')
+        parser.add_argument('--output', help="Also write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        creation = connection.creation
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        with tempfile.TemporaryDirectory() as tmp:
+            # Worker threads need their own connections, so an in-memory SQLite
+            # test database would not be shared between them.
+            if connection.vendor == 'sqlite' and not test_settings.get('NAME'):
+                test_settings['NAME'] = str(Path(tmp) / 'bench_parking.sqlite3')
+
+            setup_test_environment()
+            old_name = connection.settings_dict['NAME']
+            creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            lot_configs.clear()
+            slot_pool.invalidate()
+            try:
+                report = self.run(options, Path(tmp))
+            finally:
+                creation.destroy_test_db(old_name, verbosity=0)
+                teardown_test_environment()
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            Path(options['output']).write_text(output + '\n')
+        self.stdout.write(output)
+
+    def run(self, options, tmp):
+        parking_lots = create_parking_lots([
+            (f"bench-lot-{i}", options['capacity'], Decimal(20)) for i in range(options['lots'])
+        ])
+        vehicle_ids = [
+            register_vehicle(f"BENCH-{i}", VehicleType.CAR).id for i in range(options['vehicles'])
+        ]
+        lot_ids = [parking_lot.id for parking_lot in parking_lots]
+
+        if options['mode'] == 'sync':
+            return self.drive(options, lot_ids, vehicle_ids)
+        if options['mode'] == 'write-behind':
+            return self.drive_write_behind(options, lot_ids, vehicle_ids, tmp)
+
+        sync = self.drive(options, lot_ids, vehicle_ids)
+        write_behind = self.drive_write_behind(options, lot_ids, vehicle_ids, tmp)
+        return {
+            'sync': sync,
+            'write_behind': write_behind,
+            'requests_per_second_ratio': round(
+                write_behind['requests_per_second'] / sync['requests_per_second'], 2
+            ),
+        }
+
+    def drive_write_behind(self, options, lot_ids, vehicle_ids, tmp):
+        with override_settings(PARKING_WRITE_BEHIND=True, PARKING_JOURNAL_DIR=tmp / 'journal'):
+            get_journal()
+            report = self.drive(options, lot_ids, vehicle_ids)
+            # Time for the flusher to catch up with what was acknowledged
+            start = time.perf_counter()
+            close_journal()
+            report['drain_s'] = round(time.perf_counter() - start, 3)
+        return report
+
+    def drive(self, options, lot_ids, vehicle_ids):
+        latencies = defaultdict(list)
+        queries = defaultdict(list)
+        statuses = defaultdict(lambda: defaultdict(int))
+
+        def call(client, name, method, path, data=None):
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                if method == 'post':
+                    response = client.post(path, data, content_type='application/json')
+                else:
+                    response = client.get(path, data)
+                latencies[name].append(time.perf_counter() - start)
+            queries[name].append(len(captured))
+            statuses[name][response.status_code] += 1
+            return response
+
+        def drive(worker):
+            client = Client()
+            rng = random.Random(options['seed'] + worker)
+            mine = vehicle_ids[worker::options['concurrency']]
+            try:
+                for _ in range(options['rounds']):
+                    for vehicle_id in mine:
+                        lot_id = rng.choice(lot_ids)
+                        response = call(client, 'park', 'post', '/parking/park/', {
+                            'vehicle_id': vehicle_id, 'parking_lot_id': lot_id,
+                        })
+                        if rng.random() < options['current_ratio']:
+                            call(client, 'current', 'get', '/parking/current/', {'parking_lot_id': lot_id})
+                        if response.status_code == 201:
+                            call(client, 'remove', 'post', '/parking/remove/', {
+                                'ticket_id': response.json()['id'],
+                            })
+            finally:
+                connection.close()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            list(executor.map(drive, range(options['concurrency'])))
+        elapsed = time.perf_counter() - start
+
+        total = sum(len(samples) for samples in latencies.values())
+        return {
+            'database': connection.vendor,
+            'mode': 'write-behind' if write_behind_enabled() else 'sync',
+            'lots': options['lots'],
+            'vehicles': options['vehicles'],
+            'concurrency': options['concurrency'],
+            'requests': total,
+            'duration_s': round(elapsed, 3),
+            'requests_per_second': round(total / elapsed, 1),
+            'endpoints': {
+                name: {
+                    'statuses': dict(statuses[name]),
+                    'latency': summarize(samples),
+                    'queries_per_request': {
+                        'mean': round(sum(queries[name]) / len(queries[name]), 2),
+                        'max': max(queries[name]),
+                    },
+                }
+                for name, samples in latencies.items()
+            },
+        }
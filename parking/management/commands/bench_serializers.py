@@ -0,0 +1,96 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from parking.models import ParkingSlot, Ticket
+from parking.serializers import (
+    CurrentParkingSerializer,
+    TicketResponseSerializer,
+    current_parking_rows,
+    datetime_formatter,
+    ticket_response_data,
+)
+from parking.services import create_parking_lots
+from vehicle.constants import VehicleType
+from vehicle.models import Vehicle
+
+
+class Command(BaseCommand):
+    help = "Compare the DRF ticket serializers with the fast values() path (rolled back afterwards)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.seed(options['rows'])
+            self.compare(options['repeat'])
+            transaction.set_rollback(True)
+
+    def seed(self, rows):
+        """Seed ``rows`` open tickets plus as many closed ones"""
+        [parking_lot] = create_parking_lots([("bench-lot", 2 * rows, Decimal(20))])
+        vehicles = Vehicle.objects.bulk_create(
+            Vehicle(serial_number=f"BENCH-{i}", type=VehicleType.CAR) for i in range(2 * rows)
+        )
+        slots = ParkingSlot.objects.filter(parking_lot=parking_lot).order_by('slot_number')
+        tickets = Ticket.objects.bulk_create(
+            Ticket(parking_slot=slot, vehicle=vehicle, entry_gate=1)
+            for slot, vehicle in zip(slots, vehicles)
+        )
+        # Closed tickets cover exit times, charges and durations
+        Ticket.objects.filter(id__in=[ticket.id for ticket in tickets[rows:]]).update(
+            exit_time=timezone.now() + timedelta(minutes=95), total_charge=Decimal(40)
+        )
+
+    def compare(self, repeat):
+        renderer = JSONRenderer()
+        current_tickets = Ticket.objects.filter(exit_time__isnull=True).order_by('id')
+
+        def drf_current():
+            tickets = current_tickets.select_related('vehicle', 'parking_slot__parking_lot')
+            return CurrentParkingSerializer(tickets, many=True).data
+
+        def fast_current():
+            return list(current_parking_rows(current_tickets))
+
+        tickets = list(Ticket.objects.filter(
+            parking_slot__parking_lot__name="bench-lot"
+        ).select_related('parking_slot__parking_lot').order_by('id'))
+
+        def drf_ticket():
+            return [TicketResponseSerializer(ticket).data for ticket in tickets]
+
+        def fast_ticket():
+            to_datetime = datetime_formatter()
+            return [ticket_response_data(ticket, to_datetime) for ticket in tickets]
+
+        for name, reference, fast in (
+            ('current_parkings', drf_current, fast_current),
+            ('ticket_response', drf_ticket, fast_ticket),
+        ):
+            expected = reference()
+            if renderer.render(expected) != renderer.render(fast()):
+                raise CommandError(f"{name}: fast serializer output differs from DRF")
+
+            reference_time = self.best_of(reference, repeat)
+            fast_time = self.best_of(fast, repeat)
+            self.stdout.write(
+                f"{name}: rows={len(expected)} drf={reference_time * 1000:.1f}ms "
+                f"fast={fast_time * 1000:.1f}ms speedup={reference_time / fast_time:.1f}x"
+            )
+
+    @staticmethod
+    def best_of(func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
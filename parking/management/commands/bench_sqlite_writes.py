@@ -0,0 +1,132 @@
+import json
+import multiprocessing
+import tempfile
+import time
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connection, connections
+
+from parking.benchmarks import summarize
+from parking.lot_cache import lot_configs
+from parking.services import (
+    SlotUnavailable, VehicleAlreadyParked, create_parking_lots, park_vehicle, remove_vehicle,
+)
+from parking.slot_pool import slot_pool
+from vehicle.constants import VehicleType
+from vehicle.models import Vehicle
+
+
+def use_database(profile: str, name: Path) -> None:
+    """Point the default alias at a scratch database using a DATABASE_PROFILES entry."""
+    connections.close_all()
+    connections.settings = connections.configure_settings({
+        DEFAULT_DB_ALIAS: {**settings.DATABASE_PROFILES[profile], 'NAME': name},
+    })
+    connections[DEFAULT_DB_ALIAS] = connections.create_connection(DEFAULT_DB_ALIAS)
+    lot_configs.clear()
+    slot_pool.invalidate()
+
+
+def cycle_vehicles(parking_lot_ids, vehicle_ids, cycles):
+    """Worker process: park and remove each vehicle `cycles` times."""
+    latencies, locked, skipped = [], 0, 0
+    parking_lots = {
+        parking_lot_id: lot_configs.get(parking_lot_id).to_model() for parking_lot_id in parking_lot_ids
+    }
+    for cycle in range(cycles):
+        for index, vehicle_id in enumerate(vehicle_ids):
+            parking_lot = parking_lots[parking_lot_ids[(index + cycle) % len(parking_lot_ids)]]
+            try:
+                start = time.perf_counter()
+                ticket = park_vehicle(vehicle_id, parking_lot, entry_gate=1)
+                latencies.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                remove_vehicle(ticket.id)
+                latencies.append(time.perf_counter() - start)
+            except (SlotUnavailable, VehicleAlreadyParked):
+                # Follow-on of a locked removal that left the vehicle parked
+                skipped += 1
+            except OperationalError:
+                locked += 1
+    connection.close()
+    return latencies, locked, skipped
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare SQLite write throughput of the DATABASE_PROFILES entries with "
+        "several worker processes parking and removing vehicles on a scratch "
+        "database, and report the results as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='+', default=['development', 'production'])
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--vehicles', type=int, default=50, help="Vehicles per process")
+        parser.add_argument('--cycles', type=int, default=5)
+        parser.add_argument('--lots', type=int, default=2)
+
+    def handle(self, *args, **options):
+        unknown = set(options['profiles']) - set(settings.DATABASE_PROFILES)
+        if unknown:
+            raise CommandError(f"Unknown database profiles: {', '.join(sorted(unknown))}")
+
+        original = connections.settings
+        report = {}
+        try:
+            for profile in options['profiles']:
+                with tempfile.TemporaryDirectory() as tmp:
+                    use_database(profile, Path(tmp) / 'bench.sqlite3')
+                    report[profile] = self.run(options)
+        finally:
+            connections.close_all()
+            connections.settings = original
+            connections[DEFAULT_DB_ALIAS] = connections.create_connection(DEFAULT_DB_ALIAS)
+
+        baseline = report.get('development', {}).get('writes_per_second')
+        if baseline:
+            for result in report.values():
+                result['speedup'] = round(result['writes_per_second'] / baseline, 2)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def run(self, options):
+        call_command('migrate', verbosity=0)
+        processes = options['processes']
+        per_lot = -(-processes * options['vehicles'] // options['lots'])
+        parking_lot_ids = [
+            parking_lot.id for parking_lot in create_parking_lots([
+                (f"bench-sqlite-{i}", per_lot, Decimal(20)) for i in range(options['lots'])
+            ])
+        ]
+        vehicle_ids = [
+            vehicle.id for vehicle in Vehicle.objects.bulk_create(
+                Vehicle(serial_number=f"BENCH-SQLITE-{i}", type=VehicleType.CAR)
+                for i in range(processes * options['vehicles'])
+            )
+        ]
+        # Forked children must open their own connections
+        connections.close_all()
+
+        context = multiprocessing.get_context('fork')
+        start = time.perf_counter()
+        with context.Pool(processes) as pool:
+            results = pool.starmap(cycle_vehicles, [
+                (parking_lot_ids, vehicle_ids[worker::processes], options['cycles'])
+                for worker in range(processes)
+            ])
+        elapsed = time.perf_counter() - start
+
+        latencies = [latency for result in results for latency in result[0]]
+        return {
+            'processes': processes,
+            'writes': len(latencies),
+            'locked_errors': sum(result[1] for result in results),
+            'skipped': sum(result[2] for result in results),
+            'duration_s': round(elapsed, 3),
+            'writes_per_second': round(len(latencies) / elapsed, 1),
+            'latency': summarize(latencies),
+        }
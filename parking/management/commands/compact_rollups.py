@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from parking.rollups import bucket_hour, rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the hourly rollups of a time window from the raw tickets. "
+        "By default the last 24 complete hours; run it on closed hours, since "
+        "the current hour is still being written by the park and remove paths."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help="Complete hours to rebuild, ending now")
+        parser.add_argument('--since', help="Window start as an ISO 8601 datetime (overrides --hours)")
+        parser.add_argument('--until', help="Window end as an ISO 8601 datetime (default: start of this hour)")
+        parser.add_argument('--lot', type=int, help="Only rebuild this parking lot id")
+
+    def handle(self, *args, **options):
+        end = self.parse(options['until']) if options['until'] else bucket_hour(timezone.now())
+        start = self.parse(options['since']) if options['since'] else end - timedelta(hours=options['hours'])
+        if start >= end:
+            raise CommandError("The window start must be before its end")
+
+        written = rebuild(start, end, options['lot'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {written} rollup bucket(s) between {start.isoformat()} and {end.isoformat()}"
+        ))
+
+    def parse(self, value):
+        try:
+            moment = datetime.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f"Invalid ISO 8601 datetime: {value}")
+        return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
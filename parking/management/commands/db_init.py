@@ -4,17 +4,32 @@ from django.core.management.base import BaseCommand
 from django.db import transaction
 
 from parking.models import ParkingLot
-from parking.services import create_parking_lot
+from parking.services import create_parking_lot, create_parking_lots
 
 
 class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--lots', type=int, default=5)
+        parser.add_argument('--capacity', type=int, default=10)
+        parser.add_argument(
+            '--bulk', action='store_true',
+            help="Seed all lots and slots with batched inserts instead of one save per lot",
+        )
+
     def handle(self, *args, **kwargs):
+        lots = [
+            (f"lot{i}", kwargs['capacity'], Decimal(20)) for i in range(kwargs['lots'])
+        ]
+
         with transaction.atomic():
             ParkingLot.objects.all().delete()
 
-            for i in range(5):
-                create_parking_lot(
-                    name=f"lot{i}", capacity=10, charge_per_hour=Decimal(20)
-                )
+            if kwargs['bulk']:
+                create_parking_lots(lots)
+            else:
+                for name, capacity, charge_per_hour in lots:
+                    create_parking_lot(
+                        name=name, capacity=capacity, charge_per_hour=charge_per_hour
+                    )
 
             self.stdout.write(self.style.SUCCESS("Database initialized successfully"))
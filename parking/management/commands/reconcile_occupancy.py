@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from parking.services import reconcile_occupancy
+
+
+class Command(BaseCommand):
+    help = "Rebuild the ParkingLot and SlotClass occupied/available counters from the slot table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lot', type=int, help="Only reconcile this parking lot id")
+
+    def handle(self, *args, **options):
+        drifted = reconcile_occupancy(options['lot'])
+
+        if drifted:
+            self.stdout.write(self.style.WARNING(
+                f"Corrected counters for {len(drifted)} lot(s): {', '.join(map(str, drifted))}"
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS("Occupancy counters are consistent"))
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from parking.journal import GateJournal
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply what a stopped or crashed write-behind server left in the parking "
+        "journal to the database, e.g. before switching back to synchronous mode. "
+        "Refuses while a running server has the journal open."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help="Journal directory (default: PARKING_JOURNAL_DIR)")
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or settings.PARKING_JOURNAL_DIR
+        try:
+            journal = GateJournal(directory)
+        except ImproperlyConfigured as exc:
+            raise CommandError(exc)
+        journal.close()
+        self.stdout.write(self.style.SUCCESS(
+            f"Applied {journal.replayed} journaled event(s) from {directory}"
+        ))
@@ -0,0 +1,99 @@
+import json
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+from parking.billing import price_tickets
+from parking.lot_cache import lot_configs
+from parking.models import Ticket, TicketArchive
+from vehicle.models import Vehicle
+
+CENTS = Decimal('0.01')
+
+
+class Command(BaseCommand):
+    help = (
+        "End-of-day settlement per lot: revenue of the tickets closed during the "
+        "day, plus what the vehicles still parked at midnight owe so far, priced "
+        "in batches with the lot tariffs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Day to settle as YYYY-MM-DD (default: yesterday)")
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options['date']:
+            try:
+                day = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError("--date must be YYYY-MM-DD")
+        else:
+            day = timezone.localdate() - timedelta(days=1)
+        start = timezone.make_aware(datetime.combine(day, time.min))
+        end = start + timedelta(days=1)
+
+        report = defaultdict(lambda: {
+            'closed_tickets': 0, 'revenue': Decimal('0.00'),
+            'open_tickets': 0, 'accrued': Decimal('0.00'),
+        })
+        # Old days may already have been moved to the archive
+        closed_totals = [
+            Ticket.objects.filter(exit_time__gte=start, exit_time__lt=end).values(
+                'parking_slot__parking_lot_id'
+            ).annotate(tickets=Count('id'), revenue=Sum('total_charge')).values_list(
+                'parking_slot__parking_lot_id', 'tickets', 'revenue'
+            ),
+            TicketArchive.objects.filter(exit_time__gte=start, exit_time__lt=end).values(
+                'parking_lot_id'
+            ).annotate(tickets=Count('id'), revenue=Sum('total_charge')).values_list(
+                'parking_lot_id', 'tickets', 'revenue'
+            ),
+        ]
+        for totals in closed_totals:
+            for parking_lot_id, count, revenue in totals:
+                lot = report[parking_lot_id]
+                lot['closed_tickets'] += count
+                lot['revenue'] += revenue.quantize(CENTS)
+
+        still_parked = Ticket.objects.filter(
+            Q(exit_time__isnull=True) | Q(exit_time__gte=end), entry_time__lt=end
+        ).values_list(
+            'parking_slot__parking_lot_id', 'vehicle__type', 'entry_time'
+        ).union(TicketArchive.objects.filter(
+            exit_time__gte=end, entry_time__lt=end
+        ).annotate(
+            # Archived vehicles may since have been deleted; those pay the lot's base charge
+            vehicle_type=Subquery(Vehicle.objects.filter(id=OuterRef('vehicle_id')).values('type')),
+        ).values_list(
+            'parking_lot_id', 'vehicle_type', 'entry_time'
+        ), all=True).iterator(chunk_size=options['batch_size'])
+        unpriced = defaultdict(int)
+        while batch := list(islice(still_parked, options['batch_size'])):
+            configs = lot_configs.get_many({row[0] for row in batch})
+            for parking_lot_id, _, _ in batch:
+                report[parking_lot_id]['open_tickets'] += 1
+                if parking_lot_id not in configs:
+                    unpriced[parking_lot_id] += 1
+            batch = [row for row in batch if row[0] in configs]
+            for (parking_lot_id, _, _), charge in zip(batch, price_tickets(batch, end, configs)):
+                report[parking_lot_id]['accrued'] += charge
+
+        for parking_lot_id, count in sorted(unpriced.items()):
+            self.stderr.write(
+                f"Lot {parking_lot_id} no longer exists; {count} of its still-parked tickets were not priced"
+            )
+
+        self.stdout.write(json.dumps({
+            'date': day.isoformat(),
+            'lots': {
+                parking_lot_id: {key: str(value) if isinstance(value, Decimal) else value
+                                 for key, value in totals.items()}
+                for parking_lot_id, totals in sorted(report.items())
+            },
+        }, indent=2))
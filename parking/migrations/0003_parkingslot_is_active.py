@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 19:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0002_parkinglot_total_entry_gate_ticket_entry_gate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parkingslot',
+            name='is_active',
+            field=models.BooleanField(default=True),
+        ),
+    ]
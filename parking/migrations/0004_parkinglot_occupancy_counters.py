@@ -0,0 +1,43 @@
+# Generated by Django 5.2 on 2026-10-17 19:12
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    ParkingLot = apps.get_model('parking', 'ParkingLot')
+    ParkingSlot = apps.get_model('parking', 'ParkingSlot')
+
+    slot_counts = ParkingSlot.objects.filter(
+        parking_lot=OuterRef('pk'), is_active=True
+    ).order_by().values('parking_lot')
+    ParkingLot.objects.update(
+        occupied=Coalesce(Subquery(
+            slot_counts.annotate(n=Count('id', filter=Q(is_available=False))).values('n')
+        ), 0),
+        available=Coalesce(Subquery(
+            slot_counts.annotate(n=Count('id', filter=Q(is_available=True))).values('n')
+        ), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0003_parkingslot_is_active'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parkinglot',
+            name='available',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='parkinglot',
+            name='occupied',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
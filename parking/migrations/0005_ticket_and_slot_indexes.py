@@ -0,0 +1,50 @@
+# Generated by Django 5.2 on 2026-10-17 19:13
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_duplicate_open_tickets(apps, schema_editor):
+    Ticket = apps.get_model('parking', 'Ticket')
+    open_tickets = Ticket.objects.filter(exit_time__isnull=True)
+    for field, label in (('vehicle', 'vehicles'), ('parking_slot', 'parking slots')):
+        duplicates = list(open_tickets.values(field).annotate(
+            n=Count('id')
+        ).filter(n__gt=1).values_list(field, flat=True)[:10])
+        if duplicates:
+            raise RuntimeError(
+                f"Close all but one open ticket of each of these {label} before "
+                f"migrating: {', '.join(map(str, duplicates))}"
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0004_parkinglot_occupancy_counters'),
+        ('vehicle', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='parkingslot',
+            index=models.Index(fields=['parking_lot', 'is_available', 'slot_number'], name='slot_lot_free_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['vehicle', 'exit_time'], name='ticket_vehicle_exit_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('exit_time__isnull', True)), fields=['id'], name='ticket_open_idx'),
+        ),
+        migrations.RunPython(check_duplicate_open_tickets, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ticket',
+            constraint=models.UniqueConstraint(condition=models.Q(('exit_time__isnull', True)), fields=('vehicle',), name='one_open_ticket_per_vehicle'),
+        ),
+        migrations.AddConstraint(
+            model_name='ticket',
+            constraint=models.UniqueConstraint(condition=models.Q(('exit_time__isnull', True)), fields=('parking_slot',), name='one_open_ticket_per_slot'),
+        ),
+    ]
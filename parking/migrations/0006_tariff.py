@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-17 19:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0005_ticket_and_slot_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tariff',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vehicle_type', models.CharField(choices=[('car', 'Car'), ('bike', 'Bike')], max_length=20)),
+                ('charge_per_hour', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('grace_minutes', models.PositiveIntegerField(default=0)),
+                ('daily_cap', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('parking_lot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tariffs', to='parking.parkinglot')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('parking_lot', 'vehicle_type'), name='one_tariff_per_lot_vehicle_type')],
+            },
+        ),
+    ]
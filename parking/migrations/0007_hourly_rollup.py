@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-17 19:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0006_tariff'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HourlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_gate', models.IntegerField()),
+                ('hour', models.DateTimeField()),
+                ('entries', models.IntegerField(default=0)),
+                ('exits', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('peak_occupancy', models.IntegerField(default=0)),
+                ('parking_lot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='parking.parkinglot')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hour'], name='rollup_hour_idx')],
+                'constraints': [models.UniqueConstraint(fields=('parking_lot', 'hour', 'entry_gate'), name='one_rollup_per_lot_hour_gate')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-17 19:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0007_hourly_rollup'),
+        ('vehicle', '0002_vehicle_serial_number_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('slot_number', models.IntegerField()),
+                ('entry_gate', models.IntegerField()),
+                ('entry_time', models.DateTimeField()),
+                ('exit_time', models.DateTimeField()),
+                ('total_charge', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('parking_lot', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='parking.parkinglot')),
+                ('vehicle', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='vehicle.vehicle')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['vehicle', 'exit_time'], name='archive_vehicle_exit_idx'), models.Index(fields=['parking_lot', 'exit_time'], name='archive_lot_exit_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 19:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0008_ticket_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parkingslot',
+            name='gate_distances',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
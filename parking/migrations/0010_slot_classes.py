@@ -0,0 +1,65 @@
+# Generated by Django 5.2 on 2026-10-17 19:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_default_slot_classes(apps, schema_editor):
+    # Every existing slot is a car slot; give each lot its car class and counters
+    ParkingLot = apps.get_model('parking', 'ParkingLot')
+    SlotClass = apps.get_model('parking', 'SlotClass')
+    SlotClass.objects.bulk_create(
+        (
+            SlotClass(
+                parking_lot_id=lot_id, vehicle_type='car', capacity=capacity,
+                occupied=occupied, available=available,
+            )
+            for lot_id, capacity, occupied, available in ParkingLot.objects.values_list(
+                'id', 'capacity', 'occupied', 'available'
+            ).iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0009_slot_gate_distances'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotClass',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vehicle_type', models.CharField(choices=[('car', 'Car'), ('bike', 'Bike')], max_length=20)),
+                ('capacity', models.PositiveIntegerField()),
+                ('occupied', models.IntegerField(default=0, editable=False)),
+                ('available', models.IntegerField(default=0, editable=False)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='parkingslot',
+            name='slot_lot_free_idx',
+        ),
+        migrations.AddField(
+            model_name='parkingslot',
+            name='slot_class',
+            field=models.CharField(choices=[('car', 'Car'), ('bike', 'Bike')], default='car', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='parkingslot',
+            index=models.Index(fields=['parking_lot', 'slot_class', 'is_available', 'slot_number'], name='slot_lot_class_free_idx'),
+        ),
+        migrations.AddField(
+            model_name='slotclass',
+            name='parking_lot',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_classes', to='parking.parkinglot'),
+        ),
+        migrations.AddConstraint(
+            model_name='slotclass',
+            constraint=models.UniqueConstraint(fields=('parking_lot', 'vehicle_type'), name='one_slot_class_per_lot_vehicle_type'),
+        ),
+        migrations.RunPython(create_default_slot_classes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-17 19:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0010_slot_classes'),
+        ('vehicle', '0003_vehicle_type_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot_class', models.CharField(choices=[('car', 'Car'), ('bike', 'Bike')], max_length=20)),
+                ('start_time', models.DateTimeField()),
+                ('end_time', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('cancelled_at', models.DateTimeField(blank=True, null=True)),
+                ('parking_lot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='parking.parkinglot')),
+                ('ticket', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='parking.ticket')),
+                ('vehicle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='vehicle.vehicle')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('cancelled_at__isnull', True)), fields=['parking_lot', 'end_time'], name='reservation_lot_end_idx'), models.Index(fields=['vehicle', 'end_time'], name='reservation_vehicle_end_idx')],
+                'constraints': [models.CheckConstraint(condition=models.Q(('end_time__gt', models.F('start_time'))), name='reservation_ends_after_start')],
+            },
+        ),
+    ]
@@ -1,20 +1,107 @@
 from django.db import models
+from django.db.models import F, Q
 
+from vehicle.constants import VehicleType
 from vehicle.models import Vehicle
 from django.core.exceptions import ValidationError
 
 
-class ParkingLot(models.Model):
+class CounterModel(models.Model):
+    """A model whose COUNTER_FIELDS are only ever moved with F() updates."""
+    COUNTER_FIELDS = ()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        # A full save of a stale instance must not overwrite counters that
+        # other requests have moved in the meantime.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+
+class ParkingLot(CounterModel):
     name = models.CharField(max_length=255)
+    # Total over the lot's slot classes. Setting it directly resizes the
+    # default (car) class so that the classes still add up to it.
     capacity = models.IntegerField(default=10)
     charge_per_hour = models.DecimalField(max_digits=10, decimal_places=2)
     total_entry_gate = models.IntegerField(default=1)
+    # Denormalized slot counters, only ever moved with F() updates by the
+    # park/remove/provisioning paths. Rebuild with `reconcile_occupancy`.
+    occupied = models.IntegerField(default=0, editable=False)
+    available = models.IntegerField(default=0, editable=False)
+
+    COUNTER_FIELDS = ('occupied', 'available')
+
+
+class Tariff(models.Model):
+    """Pricing for one vehicle type in a lot; other types pay the lot's charge_per_hour."""
+    parking_lot = models.ForeignKey(ParkingLot, on_delete=models.CASCADE, related_name='tariffs')
+    vehicle_type = models.CharField(max_length=20, choices=VehicleType.choices)
+    charge_per_hour = models.DecimalField(max_digits=10, decimal_places=2)
+    # Stays up to this long are free
+    grace_minutes = models.PositiveIntegerField(default=0)
+    # Most a vehicle pays per 24 hours since entry
+    daily_cap = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['parking_lot', 'vehicle_type'], name='one_tariff_per_lot_vehicle_type',
+            ),
+        ]
+
+
+class SlotClass(CounterModel):
+    """The lot's slots for one vehicle type, with their own capacity and counters."""
+    parking_lot = models.ForeignKey(ParkingLot, on_delete=models.CASCADE, related_name='slot_classes')
+    vehicle_type = models.CharField(max_length=20, choices=VehicleType.choices)
+    capacity = models.PositiveIntegerField()
+    # Moved with F() updates alongside the lot counters
+    occupied = models.IntegerField(default=0, editable=False)
+    available = models.IntegerField(default=0, editable=False)
+
+    COUNTER_FIELDS = ('occupied', 'available')
+    DEFAULT = VehicleType.CAR
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['parking_lot', 'vehicle_type'], name='one_slot_class_per_lot_vehicle_type',
+            ),
+        ]
+
+    def has_parked_vehicles(self) -> bool:
+        return ParkingSlot.objects.filter(
+            parking_lot_id=self.parking_lot_id, slot_class=self.vehicle_type,
+            is_active=True, is_available=False,
+        ).exists()
 
 
 class ParkingSlot(models.Model):
     parking_lot = models.ForeignKey(ParkingLot, on_delete=models.CASCADE)
     slot_number = models.IntegerField()
+    # Only vehicles of this type are parked here
+    slot_class = models.CharField(max_length=20, choices=VehicleType.choices, default=SlotClass.DEFAULT)
     is_available = models.BooleanField(default=True)
+    # Retired slots are kept for their ticket history but never handed out.
+    is_active = models.BooleanField(default=True)
+    # Distance from each entry gate, gate 1 first. Left empty, the slots are
+    # taken to line one lane in slot_number order with the gates spread along it.
+    gate_distances = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['parking_lot', 'slot_class', 'is_available', 'slot_number'],
+                name='slot_lot_class_free_idx',
+            ),
+        ]
 
 
 class Ticket(models.Model):
@@ -25,4 +112,114 @@ class Ticket(models.Model):
     total_charge = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     entry_gate = models.IntegerField(default=0)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['vehicle', 'exit_time'], name='ticket_vehicle_exit_idx'),
+            models.Index(
+                fields=['id'], condition=Q(exit_time__isnull=True), name='ticket_open_idx'
+            ),
+        ]
+        constraints = [
+            # Partial unique indexes: they also serve the open-ticket lookups
+            # by vehicle and by slot.
+            models.UniqueConstraint(
+                fields=['vehicle'], condition=Q(exit_time__isnull=True),
+                name='one_open_ticket_per_vehicle',
+            ),
+            models.UniqueConstraint(
+                fields=['parking_slot'], condition=Q(exit_time__isnull=True),
+                name='one_open_ticket_per_slot',
+            ),
+        ]
+
+
+class HourlyRollup(models.Model):
+    """
+    Ticket activity of one lot gate in one UTC hour.
+
+    Exits are booked on the ticket's entry gate. peak_occupancy is the
+    highest lot occupancy seen at any entry or exit through that gate in the
+    hour; the lot's peak for the hour is the maximum over its gates.
+    """
+    parking_lot = models.ForeignKey(ParkingLot, on_delete=models.CASCADE)
+    entry_gate = models.IntegerField()
+    hour = models.DateTimeField()
+    entries = models.IntegerField(default=0)
+    exits = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    peak_occupancy = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Also serves per-lot hour-range reads
+            models.UniqueConstraint(
+                fields=['parking_lot', 'hour', 'entry_gate'], name='one_rollup_per_lot_hour_gate',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['hour'], name='rollup_hour_idx'),
+        ]
+
+
+class TicketArchive(models.Model):
+    """
+    A closed ticket moved out of the live Ticket table by ``archive_tickets``.
+
+    Keeps the original ticket id and only what history queries need; the
+    slot is flattened to its number and the references are not enforced so
+    history survives lot and vehicle deletions.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    parking_lot = models.ForeignKey(
+        ParkingLot, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+'
+    )
+    vehicle = models.ForeignKey(
+        Vehicle, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+'
+    )
+    slot_number = models.IntegerField()
+    entry_gate = models.IntegerField()
+    entry_time = models.DateTimeField()
+    exit_time = models.DateTimeField()
+    total_charge = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['vehicle', 'exit_time'], name='archive_vehicle_exit_idx'),
+            models.Index(fields=['parking_lot', 'exit_time'], name='archive_lot_exit_idx'),
+        ]
+
+
+class Reservation(models.Model):
+    """
+    A slot of one class held in a lot for a time window.
+
+    Reservations are not tied to a slot number; the lot only promises that
+    at most its class capacity of them overlap at any moment. The ticket is
+    set when the vehicle parks for it and, like the archive's references,
+    is not enforced so archiving tickets stays a plain delete.
+    """
+    parking_lot = models.ForeignKey(ParkingLot, on_delete=models.CASCADE, related_name='reservations')
+    vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE)
+    slot_class = models.CharField(max_length=20, choices=VehicleType.choices)
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    cancelled_at = models.DateTimeField(null=True, blank=True)
+    ticket = models.ForeignKey(
+        Ticket, null=True, blank=True, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+'
+    )
 
+    class Meta:
+        indexes = [
+            # Warming a lot's interval index reads the live reservations only
+            models.Index(
+                fields=['parking_lot', 'end_time'], condition=Q(cancelled_at__isnull=True),
+                name='reservation_lot_end_idx',
+            ),
+            models.Index(fields=['vehicle', 'end_time'], name='reservation_vehicle_end_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=Q(end_time__gt=F('start_time')), name='reservation_ends_after_start',
+            ),
+        ]
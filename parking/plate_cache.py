@@ -0,0 +1,121 @@
+import threading
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+
+from vehicle.models import Vehicle
+from .models import Ticket
+
+
+class PlateCache:
+    """
+    Process-local LRU of ``serial_number -> (vehicle_id, open_ticket_id, vehicle_type)``.
+
+    Gate cameras identify vehicles by plate, so this lets park and remove
+    resolve a plate without a database round trip. Entries are loaded from
+    the unique serial number index on a miss and the park and remove
+    services record ticket changes after commit; Vehicle save/delete signals
+    drop a vehicle's entry. Another process's park or remove is not seen, so
+    callers treat a missing or closed ticket id as a hint and confirm it
+    with ``get_many(..., refresh=True)``.
+    """
+
+    def __init__(self):
+        self._entries: OrderedDict[str, tuple[int, int | None, str]] = OrderedDict()
+        self._serials: dict[int, str] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def _max_size(self) -> int:
+        return getattr(settings, 'PARKING_PLATE_CACHE_SIZE', 100_000)
+
+    def get(self, serial_number: str, refresh: bool = False) -> tuple[int, int | None, str] | None:
+        return self.get_many([serial_number], refresh).get(serial_number)
+
+    async def aget(self, serial_number: str) -> tuple[int, int | None, str] | None:
+        """Async get: answered in the event loop on a hit, in a thread otherwise."""
+        with self._lock:
+            entry = self._entries.get(serial_number)
+            if entry is not None:
+                self._entries.move_to_end(serial_number)
+                self.hits += 1
+                return entry
+        return await sync_to_async(self.get)(serial_number)
+
+    def get_many(self, serial_numbers, refresh: bool = False) -> dict[str, tuple[int, int | None, str]]:
+        """``(vehicle_id, open_ticket_id, vehicle_type)`` for the plates that are registered."""
+        found, missing = {}, []
+        with self._lock:
+            for serial_number in set(serial_numbers):
+                entry = None if refresh else self._entries.get(serial_number)
+                if entry is None:
+                    missing.append(serial_number)
+                else:
+                    self._entries.move_to_end(serial_number)
+                    found[serial_number] = entry
+            self.hits += len(found)
+            self.misses += len(missing)
+
+        if missing:
+            open_ticket = Ticket.objects.filter(
+                vehicle=OuterRef('pk'), exit_time__isnull=True
+            ).values('id')[:1]
+            loaded = {
+                serial_number: (vehicle_id, ticket_id, vehicle_type)
+                for vehicle_id, serial_number, ticket_id, vehicle_type in Vehicle.objects.filter(
+                    serial_number__in=missing
+                ).annotate(open_ticket_id=Subquery(open_ticket)).values_list(
+                    'id', 'serial_number', 'open_ticket_id', 'type'
+                )
+            }
+            with self._lock:
+                for serial_number, entry in loaded.items():
+                    self._store(serial_number, entry)
+            found.update(loaded)
+        return found
+
+    def _store(self, serial_number: str, entry: tuple[int, int | None, str]) -> None:
+        previous = self._entries.get(serial_number)
+        if previous is not None and previous[0] != entry[0]:
+            self._serials.pop(previous[0], None)
+        self._entries[serial_number] = entry
+        self._entries.move_to_end(serial_number)
+        self._serials[entry[0]] = serial_number
+        while len(self._entries) > self._max_size:
+            _, evicted = self._entries.popitem(last=False)
+            self._serials.pop(evicted[0], None)
+
+    def ticket_opened(self, vehicle_id: int, ticket_id: int) -> None:
+        with self._lock:
+            serial_number = self._serials.get(vehicle_id)
+            if serial_number is not None:
+                self._entries[serial_number] = (vehicle_id, ticket_id, self._entries[serial_number][2])
+
+    def ticket_closed(self, vehicle_id: int, ticket_id: int) -> None:
+        with self._lock:
+            serial_number = self._serials.get(vehicle_id)
+            entry = self._entries.get(serial_number) if serial_number is not None else None
+            if entry is not None and entry[1] == ticket_id:
+                self._entries[serial_number] = (vehicle_id, None, entry[2])
+
+    def invalidate_vehicle(self, vehicle_id: int) -> None:
+        with self._lock:
+            serial_number = self._serials.pop(vehicle_id, None)
+            if serial_number is not None:
+                self._entries.pop(serial_number, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._serials.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+
+plates = PlateCache()
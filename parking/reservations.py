@@ -0,0 +1,396 @@
+"""
+Time-slot reservations.
+
+A reservation holds one slot of a class in a lot for a time window, without
+naming the slot. How many slots are free over a window is answered from a
+process-local interval index per lot, so an availability query never scans
+the reservation table. Each lot's index is built from its live reservations
+with one query, refreshed every ``PARKING_RESERVATION_INDEX_TTL`` seconds,
+and kept up to date in between by this process's bookings, cancellations
+and parks. A booking re-reads its lot inside the transaction, so the
+database still decides whether a window is full.
+
+Parking honours reservations: a vehicle without one is refused the slots
+held for reservations starting within ``PARKING_RESERVATION_LOOKAHEAD``
+seconds, and a vehicle that arrives for its reservation (at most that early)
+fulfils it.
+"""
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Reservation, SlotClass
+from vehicle.models import Vehicle
+
+
+class ReservationUnavailable(Exception):
+    """Raised when the lot has no slot of the class left for the whole window."""
+
+    def __init__(self, slot_class: str = SlotClass.DEFAULT):
+        super().__init__(slot_class)
+        self.slot_class = slot_class
+
+
+class VehicleAlreadyReserved(Exception):
+    """Raised when the vehicle already holds a reservation overlapping the window."""
+
+
+class ReservationNotFound(Exception):
+    """Raised when a reservation id does not exist."""
+
+
+class ReservationClosed(Exception):
+    """Raised when the reservation was already cancelled, used or has ended."""
+
+
+@dataclass(frozen=True)
+class Booking:
+    """What the index keeps of a reservation; times are POSIX timestamps."""
+    id: int
+    vehicle_id: int
+    slot_class: str
+    start: float
+    end: float
+
+    @classmethod
+    def of(cls, reservation: Reservation) -> 'Booking':
+        return cls(
+            reservation.id, reservation.vehicle_id, reservation.slot_class,
+            reservation.start_time.timestamp(), reservation.end_time.timestamp(),
+        )
+
+
+class Timeline:
+    """
+    How many reservations cover each moment, as a step function.
+
+    ``times`` are the sorted boundaries where the count changes and
+    ``levels[i]`` holds from ``times[i]`` up to the next one (zero before
+    the first). It is built with one sweep over the sorted boundaries;
+    adding or removing an interval splits at most two steps and shifts the
+    ones between, and the peak over a window is a bisect plus a max over
+    the steps inside it.
+    """
+    __slots__ = ('times', 'levels')
+
+    def __init__(self, intervals: Iterable[tuple[float, float]] = ()):
+        deltas = defaultdict(int)
+        for start, end in intervals:
+            deltas[start] += 1
+            deltas[end] -= 1
+        self.times, self.levels = [], []
+        level = 0
+        for moment in sorted(deltas):
+            level += deltas[moment]
+            self.times.append(moment)
+            self.levels.append(level)
+
+    def _boundary(self, moment: float) -> int:
+        index = bisect_left(self.times, moment)
+        if index == len(self.times) or self.times[index] != moment:
+            self.times.insert(index, moment)
+            self.levels.insert(index, self.levels[index - 1] if index else 0)
+        return index
+
+    def add(self, start: float, end: float, count: int = 1) -> None:
+        first, last = self._boundary(start), self._boundary(end)
+        for index in range(first, last):
+            self.levels[index] += count
+
+    def peak(self, start: float, end: float) -> int:
+        """Most reservations covering any moment of ``[start, end)``."""
+        first = max(bisect_right(self.times, start) - 1, 0)
+        last = bisect_left(self.times, end)
+        return max(self.levels[first:last], default=0)
+
+
+class LotReservations:
+    """
+    One lot's class capacities with, per class, a timeline of every live
+    reservation and one of those whose vehicle has not arrived yet.
+    """
+
+    def __init__(self, capacities: dict[str, int], bookings: list[tuple[Booking, bool]]):
+        self.capacities = capacities
+        self.loaded_at = time.monotonic()
+        # Not yet fulfilled, by vehicle
+        self.waiting_by_vehicle: dict[int, list[Booking]] = defaultdict(list)
+        booked, waiting = defaultdict(list), defaultdict(list)
+        for booking, fulfilled in bookings:
+            booked[booking.slot_class].append((booking.start, booking.end))
+            if not fulfilled:
+                waiting[booking.slot_class].append((booking.start, booking.end))
+                self.waiting_by_vehicle[booking.vehicle_id].append(booking)
+        self.booked = {slot_class: Timeline(intervals) for slot_class, intervals in booked.items()}
+        self.waiting = {slot_class: Timeline(intervals) for slot_class, intervals in waiting.items()}
+
+    def reserved(self, slot_class: str, start: float, end: float) -> int:
+        timeline = self.booked.get(slot_class)
+        return timeline.peak(start, end) if timeline is not None else 0
+
+    def held(self, slot_class: str, start: float, end: float) -> int:
+        timeline = self.waiting.get(slot_class)
+        return timeline.peak(start, end) if timeline is not None else 0
+
+    def add(self, booking: Booking) -> None:
+        for timelines in (self.booked, self.waiting):
+            timelines.setdefault(booking.slot_class, Timeline()).add(booking.start, booking.end)
+        self.waiting_by_vehicle[booking.vehicle_id].append(booking)
+
+    def remove(self, booking: Booking) -> None:
+        self.booked.setdefault(booking.slot_class, Timeline()).add(booking.start, booking.end, -1)
+        self.fulfil(booking)
+
+    def fulfil(self, booking: Booking) -> None:
+        waiting = self.waiting_by_vehicle.get(booking.vehicle_id, [])
+        if booking in waiting:
+            waiting.remove(booking)
+            self.waiting[booking.slot_class].add(booking.start, booking.end, -1)
+
+    def match(self, vehicle_id: int, slot_class: str, now: float, lookahead: float) -> Booking | None:
+        """The reservation a vehicle arriving ``now`` parks for, if any."""
+        for booking in self.waiting_by_vehicle.get(vehicle_id, ()):
+            if booking.slot_class == slot_class and booking.start - lookahead <= now < booking.end:
+                return booking
+        return None
+
+
+class ReservationIndex:
+    """
+    Process-local LotReservations per lot id, warmed from the database on
+    first use and again once older than ``PARKING_RESERVATION_INDEX_TTL``.
+    Reservation and SlotClass signals invalidate a lot.
+    """
+
+    def __init__(self):
+        self._lots: dict[int, LotReservations] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def _ttl(self) -> float:
+        return getattr(settings, 'PARKING_RESERVATION_INDEX_TTL', 60)
+
+    @property
+    def lookahead(self) -> float:
+        return getattr(settings, 'PARKING_RESERVATION_LOOKAHEAD', 30 * 60)
+
+    def _load(self, parking_lot_ids: list[int]) -> dict[int, LotReservations]:
+        capacities = defaultdict(dict)
+        for parking_lot_id, vehicle_type, capacity in SlotClass.objects.filter(
+            parking_lot_id__in=parking_lot_ids
+        ).values_list('parking_lot_id', 'vehicle_type', 'capacity'):
+            capacities[parking_lot_id][vehicle_type] = capacity
+
+        bookings = defaultdict(list)
+        for reservation_id, parking_lot_id, vehicle_id, slot_class, start_time, end_time, ticket_id in (
+            Reservation.objects.filter(
+                parking_lot_id__in=parking_lot_ids, cancelled_at__isnull=True, end_time__gt=timezone.now()
+            ).values_list(
+                'id', 'parking_lot_id', 'vehicle_id', 'slot_class', 'start_time', 'end_time', 'ticket_id'
+            )
+        ):
+            bookings[parking_lot_id].append((
+                Booking(reservation_id, vehicle_id, slot_class, start_time.timestamp(), end_time.timestamp()),
+                ticket_id is not None,
+            ))
+        return {
+            parking_lot_id: LotReservations(classes, bookings[parking_lot_id])
+            for parking_lot_id, classes in capacities.items()
+        }
+
+    def get_many(self, parking_lot_ids: Iterable[int]) -> dict[int, LotReservations]:
+        """Indexes for the lots that exist, warming the missing and expired ones together."""
+        expired_before = time.monotonic() - self._ttl
+        found, missing = {}, []
+        with self._lock:
+            for parking_lot_id in set(parking_lot_ids):
+                lot = self._lots.get(parking_lot_id)
+                if lot is not None and lot.loaded_at > expired_before:
+                    found[parking_lot_id] = lot
+                else:
+                    missing.append(parking_lot_id)
+
+        if missing:
+            loaded = self._load(missing)
+            with self._lock:
+                self._lots.update(loaded)
+            found.update(loaded)
+        return found
+
+    def availability(
+        self, parking_lot_ids: Iterable[int], start_time: datetime, end_time: datetime,
+        slot_class: str | None = None,
+    ) -> dict[int, list[dict]]:
+        """
+        Per lot and class: the capacity, the most reservations overlapping
+        at any moment of the window and how many slots are left to book,
+        capped as ``bookable`` caps a window starting within the lookahead.
+        """
+        start, end = start_time.timestamp(), end_time.timestamp()
+        lots = self.get_many(parking_lot_ids)
+        now = time.time()
+        near_term = start < now + self.lookahead
+        free = {}
+        if near_term and lots:
+            free = {
+                (parking_lot_id, vehicle_type): available
+                for parking_lot_id, vehicle_type, available in SlotClass.objects.filter(
+                    parking_lot_id__in=list(lots)
+                ).values_list('parking_lot_id', 'vehicle_type', 'available')
+            }
+        availability = {}
+        with self._lock:
+            for parking_lot_id, lot in lots.items():
+                classes = availability[parking_lot_id] = []
+                for vehicle_type, capacity in sorted(lot.capacities.items()):
+                    if slot_class is not None and vehicle_type != slot_class:
+                        continue
+                    reserved = lot.reserved(vehicle_type, start, end)
+                    available = capacity - reserved
+                    if near_term:
+                        available = min(available, free.get((parking_lot_id, vehicle_type), 0)
+                                        - lot.held(vehicle_type, now, now + self.lookahead))
+                    classes.append({
+                        'vehicle_type': vehicle_type,
+                        'capacity': capacity,
+                        'reserved': reserved,
+                        'available': max(available, 0),
+                    })
+        return availability
+
+    def bookable(
+        self, parking_lot_id: int, slot_class: str, start_time: datetime, end_time: datetime, free: int
+    ) -> bool:
+        """
+        Whether one more reservation fits the window: under the class
+        capacity throughout, and for a window starting within the lookahead
+        also one of the ``free`` slots not held for other reservations.
+        """
+        lot = self.get_many([parking_lot_id]).get(parking_lot_id)
+        if lot is None:
+            return False
+        start, end = start_time.timestamp(), end_time.timestamp()
+        now = time.time()
+        with self._lock:
+            if lot.reserved(slot_class, start, end) >= lot.capacities.get(slot_class, 0):
+                return False
+            if start < now + self.lookahead:
+                return free - lot.held(slot_class, now, now + self.lookahead) >= 1
+        return True
+
+    def admit(
+        self, parking_lot_id: int, slot_class: str, vehicle_ids: list[int], free: int
+    ) -> list[Booking | None | bool]:
+        """
+        Decide, in order, which vehicles parking in the class may take one
+        of the ``free`` slots (counted before any of them took one): the
+        reservation a vehicle arrives for, None for a vehicle without one
+        that still leaves the held slots free, False for a refused one.
+        """
+        lot = self.get_many([parking_lot_id]).get(parking_lot_id)
+        if lot is None or slot_class not in lot.waiting:
+            return [None] * len(vehicle_ids)
+
+        now = time.time()
+        outcomes = []
+        with self._lock:
+            held = lot.held(slot_class, now, now + self.lookahead)
+            for vehicle_id in vehicle_ids:
+                booking = lot.match(vehicle_id, slot_class, now, self.lookahead)
+                if booking is not None and booking not in outcomes:
+                    held = max(held - 1, 0)
+                elif free - 1 >= held:
+                    booking = None
+                else:
+                    outcomes.append(False)
+                    continue
+                outcomes.append(booking)
+                free -= 1
+        return outcomes
+
+    def _update(self, parking_lot_id: int, method: str, booking: Booking) -> None:
+        with self._lock:
+            lot = self._lots.get(parking_lot_id)
+            if lot is not None:
+                getattr(lot, method)(booking)
+
+    def add(self, reservation: Reservation) -> None:
+        self._update(reservation.parking_lot_id, 'add', Booking.of(reservation))
+
+    def remove(self, reservation: Reservation) -> None:
+        self._update(reservation.parking_lot_id, 'remove', Booking.of(reservation))
+
+    def fulfil(self, parking_lot_id: int, booking: Booking) -> None:
+        self._update(parking_lot_id, 'fulfil', booking)
+
+    def invalidate(self, parking_lot_id: int | None = None) -> None:
+        """Forget one lot (or every lot) so it is re-warmed on next use."""
+        with self._lock:
+            if parking_lot_id is None:
+                self._lots.clear()
+            else:
+                self._lots.pop(parking_lot_id, None)
+
+
+reservation_index = ReservationIndex()
+
+
+def reserve_slot(
+    vehicle_id: int, parking_lot_id: int, slot_class: str, start_time: datetime, end_time: datetime
+) -> Reservation:
+    """
+    Book a slot of ``slot_class`` in the lot for ``[start_time, end_time)``.
+
+    The class row is locked and the lot's index is re-read inside the
+    transaction, so bookings from any process cannot overbook a window. The
+    vehicle row is locked first, so that bookings of one vehicle in other
+    lots or classes cannot overlap either.
+    """
+    with transaction.atomic():
+        Vehicle.objects.select_for_update().filter(id=vehicle_id).values_list('id', flat=True).first()
+        available = SlotClass.objects.select_for_update().filter(
+            parking_lot_id=parking_lot_id, vehicle_type=slot_class
+        ).values_list('available', flat=True).first()
+        if available is None:
+            raise ReservationUnavailable(slot_class)
+        if Reservation.objects.filter(
+            vehicle_id=vehicle_id, cancelled_at__isnull=True,
+            start_time__lt=end_time, end_time__gt=start_time,
+        ).exists():
+            raise VehicleAlreadyReserved
+
+        reservation_index.invalidate(parking_lot_id)
+        if not reservation_index.bookable(parking_lot_id, slot_class, start_time, end_time, available):
+            raise ReservationUnavailable(slot_class)
+        reservation = Reservation.objects.create(
+            parking_lot_id=parking_lot_id, vehicle_id=vehicle_id, slot_class=slot_class,
+            start_time=start_time, end_time=end_time,
+        )
+        transaction.on_commit(lambda: reservation_index.add(reservation))
+    return reservation
+
+
+def cancel_reservation(reservation_id: int) -> Reservation:
+    """Cancel a reservation whose vehicle has not parked for it and that has not ended."""
+    reservation = Reservation.objects.filter(id=reservation_id).first()
+    if reservation is None:
+        raise ReservationNotFound
+
+    cancelled_at = timezone.now()
+    cancelled = Reservation.objects.filter(
+        id=reservation_id, cancelled_at__isnull=True, ticket__isnull=True, end_time__gt=cancelled_at
+    ).update(cancelled_at=cancelled_at)
+    if not cancelled:
+        raise ReservationClosed
+
+    reservation.cancelled_at = cancelled_at
+    reservation_index.remove(reservation)
+    return reservation
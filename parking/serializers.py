@@ -1,130 +1,261 @@
+from datetime import timedelta
+from itertools import islice
+
+from asgiref.sync import sync_to_async
 from rest_framework import serializers
+from rest_framework.settings import api_settings
+from django.conf import settings
 from django.utils import timezone
 from decimal import Decimal
-from .models import ParkingLot, ParkingSlot, Ticket
+from .billing import price_tickets
+from .journal import gate_writer
+from .lot_cache import lot_configs
+from .models import Ticket
+from .plate_cache import plates
+from .reservations import ReservationUnavailable, VehicleAlreadyReserved, reserve_slot
+from .services import (
+    SlotUnavailable,
+    TicketAlreadyClosed,
+    TicketNotFound,
+    VehicleAlreadyParked,
+    VehicleNotFound,
+    VehicleNotParked,
+)
+from vehicle.constants import VehicleType
 from vehicle.models import Vehicle
 
 
-class ParkVehicleSerializer(serializers.Serializer):
-    vehicle_id = serializers.IntegerField()
+# Upper bound on events per batch request; gate controllers replay at most a few hundred
+MAX_BATCH_SIZE = 1000
+# Longest window a reservation or availability query may span
+MAX_RESERVATION_WINDOW = timedelta(days=7)
+
+
+def slot_unavailable_message(exc: SlotUnavailable) -> str:
+    return f"No available {exc.slot_class} parking slots"
+
+
+def require_one_of(attrs, *fields):
+    """Exactly one of the fields identifying the vehicle or ticket must be given"""
+    if sum(field in attrs for field in fields) != 1:
+        raise serializers.ValidationError(f"Provide exactly one of {' or '.join(fields)}")
+
+
+class ParkEventSerializer(serializers.Serializer):
+    """Shape of a single park request, without database checks"""
+    vehicle_id = serializers.IntegerField(required=False)
+    # Plate as read by the gate camera, instead of vehicle_id
+    serial_number = serializers.CharField(max_length=255, required=False)
     parking_lot_id = serializers.IntegerField()
     entry_gate = serializers.IntegerField(default=1)
 
+    def validate(self, attrs):
+        require_one_of(attrs, 'vehicle_id', 'serial_number')
+        return attrs
+
+
+class ParkVehicleSerializer(ParkEventSerializer):
     def validate_vehicle_id(self, value):
-        """Validate that vehicle exists"""
-        try:
-            vehicle = Vehicle.objects.get(id=value)
-        except Vehicle.DoesNotExist:
+        """Validate that vehicle exists, reading its type for slot allocation"""
+        self._vehicle_type = Vehicle.objects.filter(id=value).values_list('type', flat=True).first()
+        if self._vehicle_type is None:
             raise serializers.ValidationError("Vehicle not found")
 
-        # Check if vehicle is already parked
-        existing_ticket = Ticket.objects.filter(vehicle=vehicle, exit_time__isnull=True).first()
-        if existing_ticket:
-            raise serializers.ValidationError("Vehicle is already parked")
+        # Already parked vehicles are rejected by the open-ticket constraint in create()
+        return value
 
+    def validate_serial_number(self, value):
+        """Validate that a vehicle is registered under the plate"""
+        self._plate = plates.get(value)
+        if self._plate is None:
+            raise serializers.ValidationError("Vehicle not found")
         return value
 
     def validate_parking_lot_id(self, value):
         """Validate that parking lot exists"""
-        try:
-            parking_lot = ParkingLot.objects.get(id=value)
-        except ParkingLot.DoesNotExist:
+        self._lot_config = lot_configs.get(value)
+        if self._lot_config is None:
             raise serializers.ValidationError("Parking lot not found")
         return value
 
     def validate(self, attrs):
         """Cross-field validation"""
-        parking_lot_id = attrs.get('parking_lot_id')
-        entry_gate = attrs.get('entry_gate')
-
-        try:
-            parking_lot = ParkingLot.objects.get(id=parking_lot_id)
+        attrs = super().validate(attrs)
+        if 'serial_number' in attrs:
+            attrs['vehicle_id'], _, self._vehicle_type = self._plate
+        attrs['vehicle_type'] = self._vehicle_type
 
-            # Validate entry gate
-            if not (1 <= entry_gate <= parking_lot.total_entry_gate):
-                raise serializers.ValidationError({
-                    'entry_gate': f'Entry gate must be between 1 and {parking_lot.total_entry_gate}'
-                })
-
-            # Check for available slots
-            available_slot = ParkingSlot.objects.filter(
-                parking_lot=parking_lot,
-                is_available=True
-            ).first()
-
-            if not available_slot:
-                raise serializers.ValidationError("No available parking slots")
+        entry_gate = attrs.get('entry_gate')
+        lot_config = self._lot_config
 
-        except ParkingLot.DoesNotExist:
-            # This should be caught by validate_parking_lot_id, but just in case
-            raise serializers.ValidationError("Parking lot not found")
+        # Validate entry gate
+        if not (1 <= entry_gate <= lot_config.total_entry_gate):
+            raise serializers.ValidationError({
+                'entry_gate': f'Entry gate must be between 1 and {lot_config.total_entry_gate}'
+            })
 
+        attrs['parking_lot'] = lot_config.to_model()
         return attrs
 
     def create(self, validated_data):
         """Create a parking ticket"""
-        vehicle = Vehicle.objects.get(id=validated_data['vehicle_id'])
-        parking_lot = ParkingLot.objects.get(id=validated_data['parking_lot_id'])
-        entry_gate = validated_data['entry_gate']
-
-        # Find available parking slot
-        available_slot = ParkingSlot.objects.filter(
-            parking_lot=parking_lot,
-            is_available=True
-        ).first()
-
-        # Mark slot as occupied
-        available_slot.is_available = False
-        available_slot.save()
-
-        # Create ticket
-        ticket = Ticket.objects.create(
-            parking_slot=available_slot,
-            vehicle=vehicle,
-            entry_gate=entry_gate
-        )
-
-        return ticket
-
-
-class RemoveVehicleSerializer(serializers.Serializer):
-    ticket_id = serializers.IntegerField()
-
-    def validate_ticket_id(self, value):
-        """Validate that ticket exists and vehicle hasn't been removed"""
         try:
-            ticket = Ticket.objects.get(id=value)
-        except Ticket.DoesNotExist:
-            raise serializers.ValidationError("Ticket not found")
+            return gate_writer().park_vehicle(
+                vehicle_id=validated_data['vehicle_id'],
+                parking_lot=validated_data['parking_lot'],
+                entry_gate=validated_data['entry_gate'],
+                vehicle_type=validated_data['vehicle_type'],
+            )
+        except SlotUnavailable as exc:
+            raise serializers.ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [slot_unavailable_message(exc)]
+            })
+        except VehicleAlreadyParked:
+            field = 'serial_number' if 'serial_number' in validated_data else 'vehicle_id'
+            raise serializers.ValidationError({field: ["Vehicle is already parked"]})
+
+
+class RemoveEventSerializer(serializers.Serializer):
+    """Shape of a single remove request, without database checks"""
+    ticket_id = serializers.IntegerField(required=False)
+    # Plate as read by the gate camera, instead of ticket_id
+    serial_number = serializers.CharField(max_length=255, required=False)
 
-        if ticket.exit_time:
-            raise serializers.ValidationError("Vehicle has already been removed")
+    def validate(self, attrs):
+        require_one_of(attrs, 'ticket_id', 'serial_number')
+        return attrs
 
-        return value
 
+class RemoveVehicleSerializer(RemoveEventSerializer):
     def update(self, instance, validated_data):
         """Remove vehicle and calculate charges"""
-        ticket = Ticket.objects.get(id=validated_data['ticket_id'])
-
-        # Calculate charges
-        exit_time = timezone.now()
-        duration = exit_time - ticket.entry_time
-        hours = duration.total_seconds() / 3600
-        # Round up to next hour for partial hours
-        hours_to_charge = int(hours) + (1 if hours % 1 > 0 else 0)
-
-        total_charge = ticket.parking_slot.parking_lot.charge_per_hour * hours_to_charge
-
-        # Update ticket
-        ticket.exit_time = exit_time
-        ticket.total_charge = total_charge
-        ticket.save()
+        # The ticket is checked by the service's single locked fetch
+        try:
+            writer = gate_writer()
+            if 'serial_number' in validated_data:
+                return writer.remove_vehicle_by_serial(validated_data['serial_number'])
+            return writer.remove_vehicle(validated_data['ticket_id'])
+        except TicketNotFound:
+            raise serializers.ValidationError({'ticket_id': ["Ticket not found"]})
+        except VehicleNotFound:
+            raise serializers.ValidationError({'serial_number': ["Vehicle not found"]})
+        except VehicleNotParked:
+            raise serializers.ValidationError({'serial_number': ["Vehicle is not parked"]})
+        except TicketAlreadyClosed:
+            field = 'serial_number' if 'serial_number' in validated_data else 'ticket_id'
+            raise serializers.ValidationError({field: ["Vehicle has already been removed"]})
+
+
+class ParkVehicleBatchSerializer(serializers.Serializer):
+    events = serializers.ListField(
+        child=serializers.DictField(), allow_empty=False, max_length=MAX_BATCH_SIZE
+    )
 
-        # Mark slot as available
-        ticket.parking_slot.is_available = True
-        ticket.parking_slot.save()
+    def create(self, validated_data):
+        """Park every valid event; returns a Ticket or an errors dict per event"""
+        events = validated_data['events']
+        results = [None] * len(events)
+
+        valid = []
+        for index, event in enumerate(events):
+            event_serializer = ParkEventSerializer(data=event)
+            if event_serializer.is_valid():
+                valid.append((index, event_serializer.validated_data))
+            else:
+                results[index] = event_serializer.errors
+
+        # Set-based lookups instead of per-event validators
+        vehicle_types = dict(Vehicle.objects.filter(
+            id__in={data['vehicle_id'] for _, data in valid if 'vehicle_id' in data}
+        ).values_list('id', 'type'))
+        plates_by_serial = plates.get_many(
+            {data['serial_number'] for _, data in valid if 'serial_number' in data}
+        )
+        lot_configs_by_id = lot_configs.get_many({data['parking_lot_id'] for _, data in valid})
+
+        requests, parking_lots = [], {}
+        for index, data in valid:
+            errors = {}
+            if 'serial_number' in data:
+                plate = plates_by_serial.get(data['serial_number'])
+                if plate is None:
+                    errors['serial_number'] = ["Vehicle not found"]
+                else:
+                    data['vehicle_id'], _, data['vehicle_type'] = plate
+            elif data['vehicle_id'] not in vehicle_types:
+                errors['vehicle_id'] = ["Vehicle not found"]
+            else:
+                data['vehicle_type'] = vehicle_types[data['vehicle_id']]
+            lot_config = lot_configs_by_id.get(data['parking_lot_id'])
+            if lot_config is None:
+                errors['parking_lot_id'] = ["Parking lot not found"]
+            elif not (1 <= data['entry_gate'] <= lot_config.total_entry_gate):
+                errors['entry_gate'] = [
+                    f'Entry gate must be between 1 and {lot_config.total_entry_gate}'
+                ]
+
+            if errors:
+                results[index] = errors
+            else:
+                parking_lot = parking_lots.setdefault(lot_config.id, lot_config.to_model())
+                requests.append((
+                    index, (data['vehicle_id'], parking_lot, data['entry_gate'], data['vehicle_type'])
+                ))
+
+        outcomes = gate_writer().park_vehicles([request for _, request in requests]) if requests else []
+        for (index, _), outcome in zip(requests, outcomes):
+            if isinstance(outcome, SlotUnavailable):
+                outcome = {api_settings.NON_FIELD_ERRORS_KEY: [slot_unavailable_message(outcome)]}
+            elif isinstance(outcome, VehicleAlreadyParked):
+                field = 'serial_number' if 'serial_number' in events[index] else 'vehicle_id'
+                outcome = {field: ["Vehicle is already parked"]}
+            results[index] = outcome
+
+        return results
+
+
+class RemoveVehicleBatchSerializer(serializers.Serializer):
+    events = serializers.ListField(
+        child=serializers.DictField(), allow_empty=False, max_length=MAX_BATCH_SIZE
+    )
 
-        return ticket
+    def create(self, validated_data):
+        """Remove every valid event; returns a Ticket or an errors dict per event"""
+        events = validated_data['events']
+        results = [None] * len(events)
+
+        valid, by_serial = [], []
+        for index, event in enumerate(events):
+            event_serializer = RemoveEventSerializer(data=event)
+            if not event_serializer.is_valid():
+                results[index] = event_serializer.errors
+            elif 'serial_number' in event_serializer.validated_data:
+                by_serial.append((index, event_serializer.validated_data['serial_number']))
+            else:
+                valid.append((index, event_serializer.validated_data['ticket_id']))
+
+        writer = gate_writer()
+        if by_serial:
+            plates_by_serial = writer.open_tickets_by_serial({serial_number for _, serial_number in by_serial})
+            for index, serial_number in by_serial:
+                plate = plates_by_serial.get(serial_number)
+                if plate is None:
+                    results[index] = {'serial_number': ["Vehicle not found"]}
+                elif plate[1] is None:
+                    results[index] = {'serial_number': ["Vehicle is not parked"]}
+                else:
+                    valid.append((index, plate[1]))
+
+        outcomes = writer.remove_vehicles([ticket_id for _, ticket_id in valid]) if valid else []
+        for (index, _), outcome in zip(valid, outcomes):
+            field = 'serial_number' if 'serial_number' in events[index] else 'ticket_id'
+            if isinstance(outcome, TicketNotFound):
+                outcome = {field: ["Ticket not found"]}
+            elif isinstance(outcome, TicketAlreadyClosed):
+                outcome = {field: ["Vehicle has already been removed"]}
+            results[index] = outcome
+
+        return results
 
 
 class TicketResponseSerializer(serializers.ModelSerializer):
@@ -180,15 +311,316 @@ class CurrentParkingSerializer(serializers.ModelSerializer):
         ]
 
 
-class CurrentParkingsQuerySerializer(serializers.Serializer):
-    """Serializer for query parameters"""
+# Fast read-only serialization. These build the same dicts (and therefore the
+# same JSON) as TicketResponseSerializer and CurrentParkingSerializer, but read
+# flat values_list() rows or already-loaded instances directly instead of going
+# through DRF's per-field source lookups.
+
+CURRENT_PARKING_VALUES = (
+    'id', 'vehicle_id', 'vehicle__serial_number', 'vehicle__type',
+    'parking_slot__parking_lot__name', 'parking_slot__parking_lot_id',
+    'parking_slot__slot_number', 'entry_gate', 'entry_time',
+    'parking_slot__parking_lot__charge_per_hour',
+)
+
+
+def datetime_formatter():
+    """Match serializers.DateTimeField's ISO 8601 output in the current timezone"""
+    tz = timezone.get_current_timezone() if settings.USE_TZ else None
+
+    def to_representation(value):
+        if not value:
+            return None
+        if tz is not None and timezone.is_aware(value):
+            value = value.astimezone(tz)
+        value = value.isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+
+    return to_representation
+
+
+CENTS = Decimal('0.01')
+
+
+def _decimal(value):
+    """Match serializers.DecimalField(decimal_places=2)"""
+    if value is None:
+        return None
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value).strip())
+    return '{:f}'.format(value.quantize(CENTS))
+
+
+# Rows priced per price_tickets() call for charge previews
+PREVIEW_BATCH_SIZE = 2000
+
+
+def current_parking_rows(queryset, chunk_size=None, charge_at=None):
+    """
+    Yield CurrentParkingSerializer-equivalent dicts for a Ticket queryset
+
+    With charge_at, each row also gets the charge the vehicle would pay if
+    it left at that time, priced in batches.
+    """
+    to_datetime = datetime_formatter()
+    rows = queryset.values_list(*CURRENT_PARKING_VALUES)
+    if chunk_size:
+        rows = rows.iterator(chunk_size=chunk_size)
+
+    rows = iter(rows)
+    while batch := list(islice(rows, PREVIEW_BATCH_SIZE)):
+        charges = preview_charges(batch, charge_at) if charge_at else None
+        for index, row in enumerate(batch):
+            yield current_parking_data(row, to_datetime, charges[index] if charges else None)
+
+
+async def acurrent_parking_rows(queryset, limit=None, chunk_size=2000, charge_at=None):
+    """
+    Async variant of current_parking_rows for a queryset ordered by id.
+
+    The async ORM cannot stream values_list() rows from a server-side cursor,
+    so rows are fetched in keyset-paginated chunks to keep memory flat.
+    """
+    to_datetime = datetime_formatter()
+    rows = queryset.values_list(*CURRENT_PARKING_VALUES)
+    last_id = None
+    while limit is None or limit > 0:
+        size = chunk_size if limit is None else min(chunk_size, limit)
+        chunk = rows if last_id is None else rows.filter(id__gt=last_id)
+        fetched = [row async for row in chunk[:size]]
+        charges = await sync_to_async(preview_charges)(fetched, charge_at) if charge_at else None
+        for index, row in enumerate(fetched):
+            yield current_parking_data(row, to_datetime, charges[index] if charges else None)
+
+        if len(fetched) < size:
+            return
+        last_id = fetched[-1][0]
+        if limit is not None:
+            limit -= size
+
+
+def preview_charges(rows, charge_at):
+    """What each current_parking row's vehicle would owe at charge_at"""
+    configs = lot_configs.get_many({row[5] for row in rows})
+    return price_tickets([(row[5], row[3], row[8]) for row in rows], charge_at, configs)
+
+
+def current_parking_data(row, to_datetime, charge=None):
+    (ticket_id, vehicle_id, serial_number, vehicle_type, lot_name, lot_id,
+     slot_number, entry_gate, entry_time, charge_per_hour) = row
+    data = {
+        'id': ticket_id,
+        'vehicle_id': vehicle_id,
+        'vehicle_serial_number': serial_number,
+        'vehicle_type': vehicle_type,
+        'parking_lot_name': lot_name,
+        'parking_lot_id': lot_id,
+        'slot_number': slot_number,
+        'entry_gate': entry_gate,
+        'entry_time': to_datetime(entry_time),
+        'charge_per_hour': _decimal(charge_per_hour),
+    }
+    if charge is not None:
+        data['charge_if_exited_now'] = _decimal(charge)
+    return data
+
+
+def ticket_response_data(ticket, to_datetime=None):
+    """TicketResponseSerializer-equivalent dict for a ticket with its slot and lot loaded"""
+    to_datetime = to_datetime or datetime_formatter()
+    parking_slot = ticket.parking_slot
+    parking_lot = parking_slot.parking_lot
+
+    duration_hours = None
+    if ticket.exit_time and ticket.entry_time:
+        duration_hours = round((ticket.exit_time - ticket.entry_time).total_seconds() / 3600, 2)
+
+    return {
+        'id': ticket.id,
+        'entry_time': to_datetime(ticket.entry_time),
+        'exit_time': to_datetime(ticket.exit_time),
+        'total_charge': _decimal(ticket.total_charge),
+        'entry_gate': ticket.entry_gate,
+        'parking_slot_number': parking_slot.slot_number,
+        'parking_lot_name': parking_lot.name,
+        'parking_lot_id': parking_lot.id,
+        'charge_per_hour': _decimal(parking_lot.charge_per_hour),
+        'duration_hours': duration_hours,
+    }
+
+
+def rollup_data(bucket, to_datetime):
+    """Response dict for one aggregated HourlyRollup values() row"""
+    data = {'parking_lot_id': bucket['parking_lot_id']}
+    if 'entry_gate' in bucket:
+        data['entry_gate'] = bucket['entry_gate']
+    data.update({
+        'hour': to_datetime(bucket['hour']),
+        'entries': bucket['total_entries'],
+        'exits': bucket['total_exits'],
+        'revenue': _decimal(bucket['total_revenue']),
+        'peak_occupancy': bucket['max_occupancy'],
+    })
+    return data
+
+
+class CurrentParkingsParamsSerializer(serializers.Serializer):
+    """Shape of the current-parkings query parameters, without database checks"""
     parking_lot_id = serializers.IntegerField(required=False)
+    # Keyset pagination: return tickets with an id greater than the cursor
+    cursor = serializers.IntegerField(required=False, min_value=0)
+    limit = serializers.IntegerField(default=100, min_value=1, max_value=1000)
+    # Stream every matching ticket as NDJSON instead of returning one page
+    stream = serializers.BooleanField(default=False)
+    # Add what each vehicle would be charged if it left now
+    preview_charge = serializers.BooleanField(default=False)
 
+
+class CurrentParkingsQuerySerializer(CurrentParkingsParamsSerializer):
+    """Serializer for query parameters"""
     def validate_parking_lot_id(self, value):
         """Validate that parking lot exists if provided"""
-        if value is not None:
-            try:
-                ParkingLot.objects.get(id=value)
-            except ParkingLot.DoesNotExist:
-                raise serializers.ValidationError("Parking lot not found")
+        if value is not None and lot_configs.get(value) is None:
+            raise serializers.ValidationError("Parking lot not found")
         return value
+
+
+class OccupancyQuerySerializer(serializers.Serializer):
+    """Serializer for occupancy query parameters"""
+    parking_lot_id = serializers.IntegerField(required=False)
+
+
+class RollupQuerySerializer(serializers.Serializer):
+    """Serializer for rollup query parameters"""
+    parking_lot_id = serializers.IntegerField(required=False)
+    days = serializers.IntegerField(default=30, min_value=1, max_value=366)
+    # Keep one series per entry gate instead of summing the lot's gates
+    by_gate = serializers.BooleanField(default=False)
+
+
+class TicketHistoryQuerySerializer(serializers.Serializer):
+    """Serializer for ticket history query parameters"""
+    vehicle_id = serializers.IntegerField(required=False)
+    serial_number = serializers.CharField(max_length=255, required=False)
+    parking_lot_id = serializers.IntegerField(required=False)
+    limit = serializers.IntegerField(default=100, min_value=1, max_value=1000)
+
+    def validate(self, attrs):
+        if 'vehicle_id' in attrs and 'serial_number' in attrs:
+            raise serializers.ValidationError("Provide at most one of vehicle_id or serial_number")
+        if 'serial_number' in attrs:
+            plate = plates.get(attrs['serial_number'])
+            if plate is None:
+                raise serializers.ValidationError({'serial_number': ["Vehicle not found"]})
+            attrs['vehicle_id'] = plate[0]
+        return attrs
+
+
+def ticket_history_data(row, to_datetime):
+    """Response dict for one parking.archive.ticket_history row"""
+    return {
+        **row,
+        'entry_time': to_datetime(row['entry_time']),
+        'exit_time': to_datetime(row['exit_time']),
+        'total_charge': _decimal(row['total_charge']),
+    }
+
+
+def validate_window(attrs):
+    """start_time and end_time must form a non-empty window of at most MAX_RESERVATION_WINDOW"""
+    if attrs['end_time'] <= attrs['start_time']:
+        raise serializers.ValidationError({'end_time': ["Must be after start_time"]})
+    if attrs['end_time'] - attrs['start_time'] > MAX_RESERVATION_WINDOW:
+        raise serializers.ValidationError({
+            'end_time': [f"Window may span at most {MAX_RESERVATION_WINDOW.days} days"]
+        })
+
+
+class ReservationSerializer(serializers.Serializer):
+    """Serializer for booking a slot of the vehicle's class over a time window"""
+    vehicle_id = serializers.IntegerField(required=False)
+    serial_number = serializers.CharField(max_length=255, required=False)
+    parking_lot_id = serializers.IntegerField()
+    start_time = serializers.DateTimeField()
+    end_time = serializers.DateTimeField()
+
+    def validate_vehicle_id(self, value):
+        """Validate that vehicle exists, reading its type for the slot class"""
+        self._vehicle_type = Vehicle.objects.filter(id=value).values_list('type', flat=True).first()
+        if self._vehicle_type is None:
+            raise serializers.ValidationError("Vehicle not found")
+        return value
+
+    def validate_serial_number(self, value):
+        """Validate that a vehicle is registered under the plate"""
+        self._plate = plates.get(value)
+        if self._plate is None:
+            raise serializers.ValidationError("Vehicle not found")
+        return value
+
+    def validate_parking_lot_id(self, value):
+        """Validate that parking lot exists"""
+        if lot_configs.get(value) is None:
+            raise serializers.ValidationError("Parking lot not found")
+        return value
+
+    def validate(self, attrs):
+        require_one_of(attrs, 'vehicle_id', 'serial_number')
+        if 'serial_number' in attrs:
+            attrs['vehicle_id'], _, self._vehicle_type = self._plate
+        attrs['slot_class'] = self._vehicle_type
+        validate_window(attrs)
+        if attrs['end_time'] <= timezone.now():
+            raise serializers.ValidationError({'end_time': ["Must be in the future"]})
+        return attrs
+
+    def create(self, validated_data):
+        """Book the slot"""
+        try:
+            return reserve_slot(
+                vehicle_id=validated_data['vehicle_id'],
+                parking_lot_id=validated_data['parking_lot_id'],
+                slot_class=validated_data['slot_class'],
+                start_time=validated_data['start_time'],
+                end_time=validated_data['end_time'],
+            )
+        except ReservationUnavailable as exc:
+            raise serializers.ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [
+                    f"No {exc.slot_class} parking slot left to reserve for this window"
+                ]
+            })
+        except VehicleAlreadyReserved:
+            field = 'serial_number' if 'serial_number' in validated_data else 'vehicle_id'
+            raise serializers.ValidationError({
+                field: ["Vehicle already has a reservation overlapping this window"]
+            })
+
+
+def reservation_data(reservation, to_datetime=None):
+    """Response dict for a Reservation"""
+    to_datetime = to_datetime or datetime_formatter()
+    return {
+        'id': reservation.id,
+        'parking_lot_id': reservation.parking_lot_id,
+        'vehicle_id': reservation.vehicle_id,
+        'vehicle_type': reservation.slot_class,
+        'start_time': to_datetime(reservation.start_time),
+        'end_time': to_datetime(reservation.end_time),
+        'cancelled_at': to_datetime(reservation.cancelled_at),
+        'ticket_id': reservation.ticket_id,
+    }
+
+
+class AvailabilityQuerySerializer(serializers.Serializer):
+    """Serializer for availability query parameters"""
+    parking_lot_id = serializers.IntegerField(required=False)
+    start_time = serializers.DateTimeField()
+    end_time = serializers.DateTimeField()
+    vehicle_type = serializers.ChoiceField(choices=VehicleType.choices, required=False)
+
+    def validate(self, attrs):
+        validate_window(attrs)
+        return attrs
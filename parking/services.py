@@ -1,11 +1,730 @@
+import logging
+from collections import defaultdict
+from datetime import datetime
 from decimal import Decimal
+from typing import Iterable, Mapping
 
-from .models import ParkingLot
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, Count, F, Max, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .billing import TariffRule, price_tickets
+from .feed import publish_tickets
+from .lot_cache import lot_configs
+from .models import ParkingLot, ParkingSlot, Reservation, SlotClass, Ticket
+from .plate_cache import plates
+from .reservations import reservation_index
+from .rollups import bucket_hour, record_activity, rollups_enabled
+from .slot_pool import slot_pool
+from vehicle.models import Vehicle
+
+logger = logging.getLogger(__name__)
+
+SLOT_BATCH_SIZE = 1000
+
+# How often a batch is recomputed when a concurrent request changes the rows
+# it read before the batch could commit.
+BATCH_ATTEMPTS = 5
+
+
+def write_behind_enabled() -> bool:
+    return getattr(settings, 'PARKING_WRITE_BEHIND', False)
+
+
+def _check_synchronous_mode() -> None:
+    # The journal hands out ticket ids in memory, so it must be the only gate writer
+    if write_behind_enabled():
+        raise ImproperlyConfigured(
+            "Park and remove go through parking.journal.gate_writer() while PARKING_WRITE_BEHIND is on"
+        )
+
+
+class SlotUnavailable(Exception):
+    """Raised when a parking lot has no free slot of the vehicle's class left to claim."""
+
+    def __init__(self, slot_class: str = SlotClass.DEFAULT):
+        super().__init__(slot_class)
+        self.slot_class = slot_class
+
+
+class VehicleAlreadyParked(Exception):
+    """Raised when the vehicle already holds an open ticket."""
+
+
+class TicketNotFound(Exception):
+    """Raised when a ticket id does not exist."""
+
+
+class TicketAlreadyClosed(Exception):
+    """Raised when the ticket's vehicle has already been removed."""
+
+
+class VehicleNotFound(Exception):
+    """Raised when no vehicle is registered under a serial number."""
+
+
+class VehicleNotParked(Exception):
+    """Raised when a vehicle holds no open ticket."""
+
+
+class _BatchConflict(Exception):
+    """Another request claimed or closed rows this batch was about to write."""
 
 
 def create_parking_lot(
-    name: str, capacity: int, charge_per_hour: Decimal
+    name: str, capacity: int, charge_per_hour: Decimal, slot_classes: Mapping[str, int] | None = None
 ) -> ParkingLot:
-    return ParkingLot.objects.create(
-        name=name, capacity=capacity, charge_per_hour=charge_per_hour
+    """
+    Create a lot of ``capacity`` slots.
+
+    ``slot_classes`` reserves part of the capacity for other vehicle types,
+    e.g. ``{'bike': 20}``; the rest are car slots.
+    """
+    slot_classes = {
+        vehicle_type: count for vehicle_type, count in (slot_classes or {}).items()
+        if vehicle_type != SlotClass.DEFAULT
+    }
+    with transaction.atomic():
+        parking_lot = ParkingLot.objects.create(
+            name=name, capacity=capacity - sum(slot_classes.values()), charge_per_hour=charge_per_hour
+        )
+        # Each new class grows the lot's capacity back through the SlotClass signal
+        for vehicle_type, count in slot_classes.items():
+            SlotClass.objects.create(parking_lot=parking_lot, vehicle_type=vehicle_type, capacity=count)
+        parking_lot.refresh_from_db(fields=['capacity', 'available'])
+    return parking_lot
+
+
+def create_parking_lots(
+    lots: Iterable[tuple[str, int, Decimal]], batch_size: int = SLOT_BATCH_SIZE
+) -> list[ParkingLot]:
+    """
+    Bulk-seed ``(name, capacity, charge_per_hour)`` lots and all their slots.
+
+    ``bulk_create`` skips the post_save signal, so slots are provisioned here
+    in a single batched insert across every lot. Every slot is a car slot.
+    """
+    with transaction.atomic():
+        parking_lots = ParkingLot.objects.bulk_create(
+            [
+                ParkingLot(
+                    name=name, capacity=capacity, charge_per_hour=charge_per_hour,
+                    available=capacity,
+                )
+                for name, capacity, charge_per_hour in lots
+            ],
+            batch_size=batch_size,
+        )
+        SlotClass.objects.bulk_create(
+            [
+                SlotClass(
+                    parking_lot=parking_lot, vehicle_type=SlotClass.DEFAULT,
+                    capacity=parking_lot.capacity, available=parking_lot.capacity,
+                )
+                for parking_lot in parking_lots
+            ],
+            batch_size=batch_size,
+        )
+        ParkingSlot.objects.bulk_create(
+            (
+                ParkingSlot(parking_lot=parking_lot, slot_number=slot_number)
+                for parking_lot in parking_lots
+                for slot_number in range(parking_lot.capacity)
+            ),
+            batch_size=batch_size,
+        )
+    return parking_lots
+
+
+def provision_parking_slots(parking_lot: ParkingLot, created: bool) -> None:
+    """
+    Bring the lot's active slots in line with the capacity of each slot class.
+
+    The default (car) class gets whatever part of ``parking_lot.capacity``
+    the other classes leave. A new lot gets all of its slots in one batched
+    insert. For an existing lot only the difference is applied per class:
+    growing reactivates retired slots before adding new ones, and shrinking
+    retires the highest-numbered free slots. Occupied slots are never retired.
+    """
+    with transaction.atomic():
+        capacities = {} if created else dict(SlotClass.objects.filter(
+            parking_lot=parking_lot
+        ).values_list('vehicle_type', 'capacity'))
+        others = sum(count for slot_class, count in capacities.items() if slot_class != SlotClass.DEFAULT)
+        if parking_lot.capacity < others:
+            logger.warning(
+                "Lot %s: capacity %d is below its %d non-car slots; raising it",
+                parking_lot.id, parking_lot.capacity, others,
+            )
+            parking_lot.capacity = others
+            ParkingLot.objects.filter(id=parking_lot.id).update(capacity=others)
+
+        default = parking_lot.capacity - others
+        if SlotClass.DEFAULT not in capacities:
+            SlotClass.objects.bulk_create([
+                SlotClass(parking_lot=parking_lot, vehicle_type=SlotClass.DEFAULT, capacity=default)
+            ])
+        elif capacities[SlotClass.DEFAULT] != default:
+            SlotClass.objects.filter(
+                parking_lot=parking_lot, vehicle_type=SlotClass.DEFAULT
+            ).update(capacity=default)
+        capacities[SlotClass.DEFAULT] = default
+
+        active = {} if created else dict(ParkingSlot.objects.filter(
+            parking_lot=parking_lot, is_active=True
+        ).values('slot_class').annotate(n=Count('id')).values_list('slot_class', 'n'))
+
+        # Slots of a class that was removed are retired as well
+        deltas = {}
+        for slot_class in sorted(capacities.keys() | active.keys()):
+            target, current = capacities.get(slot_class, 0), active.get(slot_class, 0)
+            if target > current:
+                deltas[slot_class] = _add_parking_slots(parking_lot, slot_class, target - current, created)
+            elif target < current:
+                deltas[slot_class] = -_retire_parking_slots(parking_lot, slot_class, current - target)
+        deltas = {slot_class: delta for slot_class, delta in deltas.items() if delta}
+        if not deltas:
+            return
+
+        for slot_class, delta in deltas.items():
+            SlotClass.objects.filter(
+                parking_lot=parking_lot, vehicle_type=slot_class
+            ).update(available=F('available') + delta)
+        delta = sum(deltas.values())
+        ParkingLot.objects.filter(id=parking_lot.id).update(available=F('available') + delta)
+        parking_lot.available += delta
+        transaction.on_commit(lambda: slot_pool.invalidate(parking_lot.id))
+
+
+def resize_parking_lot(parking_lot_id: int) -> None:
+    """Set the lot's capacity to the total of its slot classes and provision them."""
+    with transaction.atomic():
+        capacity = SlotClass.objects.filter(
+            parking_lot_id=parking_lot_id
+        ).aggregate(total=Sum('capacity'))['total'] or 0
+        if not ParkingLot.objects.filter(id=parking_lot_id).update(capacity=capacity):
+            return
+        provision_parking_slots(ParkingLot.objects.get(id=parking_lot_id), created=False)
+
+
+def _add_parking_slots(parking_lot: ParkingLot, slot_class: str, count: int, created: bool) -> int:
+    next_slot_number = 0
+    retired_ids = []
+    if not created:
+        retired_ids = list(ParkingSlot.objects.filter(
+            parking_lot=parking_lot, slot_class=slot_class, is_active=False
+        ).order_by('slot_number').values_list('id', flat=True)[:count])
+        ParkingSlot.objects.filter(id__in=retired_ids).update(
+            is_active=True, is_available=True
+        )
+        count -= len(retired_ids)
+        last_slot_number = ParkingSlot.objects.filter(
+            parking_lot=parking_lot
+        ).aggregate(last=Max('slot_number'))['last']
+        if last_slot_number is not None:
+            next_slot_number = last_slot_number + 1
+
+    ParkingSlot.objects.bulk_create(
+        (
+            ParkingSlot(parking_lot=parking_lot, slot_number=slot_number, slot_class=slot_class)
+            for slot_number in range(next_slot_number, next_slot_number + count)
+        ),
+        batch_size=SLOT_BATCH_SIZE,
+    )
+    return len(retired_ids) + count
+
+
+def _retire_parking_slots(parking_lot: ParkingLot, slot_class: str, count: int) -> int:
+    free_ids = list(ParkingSlot.objects.filter(
+        parking_lot=parking_lot, slot_class=slot_class, is_active=True, is_available=True
+    ).order_by('-slot_number').values_list('id', flat=True)[:count])
+    ParkingSlot.objects.filter(id__in=free_ids).update(
+        is_active=False, is_available=False
+    )
+    if len(free_ids) < count:
+        logger.warning(
+            "Lot %s: only %d of %d surplus %s slots were free to retire",
+            parking_lot.id, len(free_ids), count, slot_class,
+        )
+    return len(free_ids)
+
+
+def _candidate_slot(parking_lot: ParkingLot, slot_class: str, entry_gate: int) -> ParkingSlot | None:
+    candidate = slot_pool.claim(parking_lot.id, slot_class, entry_gate)
+    if candidate is not None:
+        slot_id, slot_number = candidate
+        return ParkingSlot(
+            id=slot_id, parking_lot=parking_lot, slot_number=slot_number, slot_class=slot_class
+        )
+
+    # The pool thinks the class is full; confirm with an index lookup, and if
+    # a free slot shows up the pool has drifted and is rebuilt on next use.
+    slot = ParkingSlot.objects.filter(
+        parking_lot=parking_lot, slot_class=slot_class, is_available=True
+    ).order_by('slot_number').only('id', 'slot_number', 'slot_class').first()
+    if slot is not None:
+        slot_pool.invalidate(parking_lot.id)
+        slot.parking_lot = parking_lot
+    return slot
+
+
+def park_vehicle(
+    vehicle_id: int, parking_lot: ParkingLot, entry_gate: int, vehicle_type: str | None = None
+) -> Ticket:
+    """
+    Claim a free slot of the vehicle's class in the lot and issue a ticket
+    for it atomically. ``vehicle_type`` is looked up when not given.
+
+    Candidates come from the in-memory free-slot pool and are read outside
+    the transaction, so the conditional UPDATE is the transaction's first
+    statement and takes the write lock directly. That UPDATE is what
+    guarantees a slot is never handed out twice; losing a claim means some
+    other gate made progress, so the retry loop ends once the lot is full.
+    A vehicle that is already parked is caught by the one-open-ticket unique
+    constraint on insert rather than by a read beforehand; only when there
+    is no slot to insert against is its open ticket looked up. The last slots
+    held for upcoming reservations only go to the vehicles that booked them.
+    """
+    _check_synchronous_mode()
+    if vehicle_type is None:
+        vehicle_type = Vehicle.objects.filter(id=vehicle_id).values_list('type', flat=True).first()
+
+    while True:
+        slot = _candidate_slot(parking_lot, vehicle_type, entry_gate)
+        if slot is not None:
+            [booking] = reservation_index.admit(
+                parking_lot.id, vehicle_type, [vehicle_id],
+                slot_pool.free_count(parking_lot.id, vehicle_type) + 1,
+            )
+            if booking is False:
+                slot_pool.release(parking_lot.id, vehicle_type, slot.id, slot.slot_number)
+                slot = None
+        if slot is None:
+            # Without a slot there is no insert to trip the open-ticket constraint
+            if Ticket.objects.filter(vehicle_id=vehicle_id, exit_time__isnull=True).exists():
+                raise VehicleAlreadyParked
+            raise SlotUnavailable(vehicle_type)
+
+        try:
+            with transaction.atomic():
+                claimed = ParkingSlot.objects.filter(
+                    id=slot.id, is_available=True
+                ).update(is_available=False)
+                if not claimed:
+                    continue
+
+                slot.is_available = False
+                ParkingLot.objects.filter(id=parking_lot.id).update(
+                    occupied=F('occupied') + 1, available=F('available') - 1
+                )
+                SlotClass.objects.filter(parking_lot=parking_lot, vehicle_type=vehicle_type).update(
+                    occupied=F('occupied') + 1, available=F('available') - 1
+                )
+                ticket = Ticket.objects.create(
+                    parking_slot=slot, vehicle_id=vehicle_id, entry_gate=entry_gate
+                )
+                if rollups_enabled():
+                    record_activity(parking_lot.id, entry_gate, ticket.entry_time, entries=1)
+                if booking is not None:
+                    Reservation.objects.filter(id=booking.id, ticket__isnull=True).update(ticket=ticket)
+
+                def opened():
+                    plates.ticket_opened(vehicle_id, ticket.id)
+                    publish_tickets('park', [ticket])
+                    if booking is not None:
+                        reservation_index.fulfil(parking_lot.id, booking)
+                transaction.on_commit(opened)
+                return ticket
+        except Exception as exc:
+            slot_pool.release(parking_lot.id, vehicle_type, slot.id, slot.slot_number)
+            if isinstance(exc, IntegrityError) and Ticket.objects.filter(
+                vehicle_id=vehicle_id, exit_time__isnull=True
+            ).exists():
+                raise VehicleAlreadyParked from exc
+            raise
+
+
+def calculate_charge(
+    entry_time: datetime, exit_time: datetime, charge_per_hour: Decimal
+) -> Decimal:
+    """Charge per started hour between entry and exit, without tariff rules."""
+    return TariffRule.from_amounts(charge_per_hour).charge(entry_time, exit_time)
+
+
+def remove_vehicle(ticket_id: int) -> Ticket:
+    """
+    Close the ticket, bill it and free its slot in one transaction.
+
+    The ticket and slot come back from one select_related query, locked FOR
+    UPDATE where the backend supports it; elsewhere the row is read just
+    before the transaction so its first statement takes the write lock. The
+    lot's tariffs come from the lot config cache.
+    Closing is a conditional UPDATE on ``exit_time IS NULL``, so a double tap
+    at the exit gate can never bill twice.
+    """
+    _check_synchronous_mode()
+    tickets = Ticket.objects.select_related('parking_slot').annotate(vehicle_type=F('vehicle__type'))
+    lock_rows = connection.features.has_select_for_update
+    if lock_rows:
+        tickets = tickets.select_for_update(
+            of=('self',) if connection.features.has_select_for_update_of else ()
+        )
+
+    ticket = None if lock_rows else _fetch_open_ticket(tickets, ticket_id)
+    with transaction.atomic():
+        if lock_rows:
+            ticket = _fetch_open_ticket(tickets, ticket_id)
+
+        slot = ticket.parking_slot
+        lot_config = lot_configs.get(slot.parking_lot_id)
+        slot.parking_lot = lot_config.to_model()
+        ticket.exit_time = timezone.now()
+        ticket.total_charge = lot_config.tariff(ticket.vehicle_type).charge(
+            ticket.entry_time, ticket.exit_time
+        )
+        closed = Ticket.objects.filter(id=ticket.id, exit_time__isnull=True).update(
+            exit_time=ticket.exit_time, total_charge=ticket.total_charge
+        )
+        if not closed:
+            raise TicketAlreadyClosed
+
+        ParkingSlot.objects.filter(id=slot.id).update(is_available=True)
+        slot.is_available = True
+        ParkingLot.objects.filter(id=slot.parking_lot_id).update(
+            occupied=F('occupied') - 1, available=F('available') + 1
+        )
+        SlotClass.objects.filter(parking_lot_id=slot.parking_lot_id, vehicle_type=slot.slot_class).update(
+            occupied=F('occupied') - 1, available=F('available') + 1
+        )
+        if rollups_enabled():
+            record_activity(
+                slot.parking_lot_id, ticket.entry_gate, ticket.exit_time,
+                exits=1, revenue=ticket.total_charge, occupancy_offset=1,
+            )
+
+        def release():
+            slot_pool.release(slot.parking_lot_id, slot.slot_class, slot.id, slot.slot_number)
+            plates.ticket_closed(ticket.vehicle_id, ticket.id)
+            publish_tickets('remove', [ticket])
+        transaction.on_commit(release)
+    return ticket
+
+
+def remove_vehicle_by_serial(serial_number: str) -> Ticket:
+    """
+    Close the open ticket of the vehicle with this serial number.
+
+    The plate is resolved through the plate cache, so a hot exit gate goes
+    straight to ``remove_vehicle``. The cache only sees this process's
+    changes, so a missing or already closed ticket is confirmed against the
+    database before it is reported.
+    """
+    entry = plates.get(serial_number)
+    if entry is None:
+        raise VehicleNotFound
+    if entry[1] is not None:
+        try:
+            return remove_vehicle(entry[1])
+        except (TicketNotFound, TicketAlreadyClosed):
+            pass
+
+    entry = plates.get(serial_number, refresh=True)
+    if entry is None:
+        raise VehicleNotFound
+    if entry[1] is None:
+        raise VehicleNotParked
+    return remove_vehicle(entry[1])
+
+
+def open_tickets_by_serial(serial_numbers) -> dict[str, tuple[int, int | None, str]]:
+    """
+    Plate cache entries for the registered plates, with the "not parked"
+    ones confirmed against the database since the cache only sees this
+    process's parks.
+    """
+    entries = plates.get_many(serial_numbers)
+    entries.update(plates.get_many(
+        {serial_number for serial_number, entry in entries.items() if entry[1] is None}, refresh=True,
+    ))
+    return entries
+
+
+def _fetch_open_ticket(tickets, ticket_id: int) -> Ticket:
+    try:
+        ticket = tickets.get(id=ticket_id)
+    except Ticket.DoesNotExist:
+        raise TicketNotFound
+    if ticket.exit_time:
+        raise TicketAlreadyClosed
+    return ticket
+
+
+def _shift_occupancy(deltas: dict[tuple[int, str], int]) -> None:
+    """
+    Move lot and slot class counters by ``deltas[lot_id, slot_class]``
+    vehicles, with one UPDATE per table.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    lot_deltas = defaultdict(int)
+    for (lot_id, _), n in deltas.items():
+        lot_deltas[lot_id] += n
+    delta = Case(*(When(id=lot_id, then=Value(n)) for lot_id, n in lot_deltas.items()))
+    ParkingLot.objects.filter(id__in=lot_deltas).update(
+        occupied=F('occupied') + delta, available=F('available') - delta
+    )
+    matches = [Q(parking_lot_id=lot_id, vehicle_type=slot_class) for lot_id, slot_class in deltas]
+    delta = Case(
+        *(When(match, then=Value(n)) for match, n in zip(matches, deltas.values())), default=Value(0)
     )
+    SlotClass.objects.filter(
+        parking_lot_id__in=lot_deltas, vehicle_type__in={slot_class for _, slot_class in deltas}
+    ).update(occupied=F('occupied') + delta, available=F('available') - delta)
+
+
+def _candidate_slots(parking_lot: ParkingLot, slot_class: str, entry_gates: list[int]) -> list[ParkingSlot]:
+    """Candidates of ``slot_class`` for requests at ``entry_gates``, in order, until the class runs out."""
+    count = len(entry_gates)
+    slots = []
+    while len(slots) < count and (
+        candidate := slot_pool.claim(parking_lot.id, slot_class, entry_gates[len(slots)])
+    ):
+        slot_id, slot_number = candidate
+        slots.append(ParkingSlot(
+            id=slot_id, parking_lot=parking_lot, slot_number=slot_number, slot_class=slot_class
+        ))
+
+    if len(slots) < count:
+        extra = list(ParkingSlot.objects.filter(
+            parking_lot=parking_lot, slot_class=slot_class, is_available=True
+        ).exclude(
+            id__in=[slot.id for slot in slots]
+        ).order_by('slot_number').only('id', 'slot_number', 'slot_class')[:count - len(slots)])
+        if extra:
+            slot_pool.invalidate(parking_lot.id)
+        for slot in extra:
+            slot.parking_lot = parking_lot
+        slots.extend(extra)
+    return slots
+
+
+def park_vehicles(
+    requests: list[tuple[int, ParkingLot, int, str]]
+) -> list[Ticket | SlotUnavailable | VehicleAlreadyParked]:
+    """
+    Park a batch of ``(vehicle_id, parking_lot, entry_gate, vehicle_type)`` requests.
+
+    Returns one outcome per request, in order: the issued Ticket, or the
+    exception explaining why that vehicle was not parked. Open tickets are
+    read with one query, slots are claimed with one conditional UPDATE and
+    tickets are written with ``bulk_create``; if a concurrent request takes
+    a slot or parks a vehicle first the whole batch is recomputed.
+    """
+    _check_synchronous_mode()
+    for attempt in range(BATCH_ATTEMPTS):
+        try:
+            return _park_batch(requests)
+        except (_BatchConflict, IntegrityError):
+            if attempt == BATCH_ATTEMPTS - 1:
+                raise
+
+
+def _park_batch(requests):
+    outcomes = [None] * len(requests)
+    parked = set(Ticket.objects.filter(
+        vehicle_id__in={vehicle_id for vehicle_id, _, _, _ in requests},
+        exit_time__isnull=True,
+    ).values_list('vehicle_id', flat=True))
+
+    by_class = defaultdict(list)
+    for index, (vehicle_id, parking_lot, _, vehicle_type) in enumerate(requests):
+        if vehicle_id in parked:
+            outcomes[index] = VehicleAlreadyParked()
+        else:
+            parked.add(vehicle_id)
+            by_class[parking_lot.id, vehicle_type].append(index)
+
+    tickets, claimed, deltas, fulfilled = [], [], {}, []
+    for (lot_id, slot_class), indexes in by_class.items():
+        slots = _candidate_slots(
+            requests[indexes[0]][1], slot_class, [requests[index][2] for index in indexes]
+        )
+        bookings = reservation_index.admit(
+            lot_id, slot_class, [requests[index][0] for index in indexes[:len(slots)]],
+            slot_pool.free_count(lot_id, slot_class) + len(slots),
+        )
+        admitted = []
+        for index, slot, booking in zip(indexes, slots, bookings):
+            if booking is False:
+                outcomes[index] = SlotUnavailable(slot_class)
+                slot_pool.release(lot_id, slot_class, slot.id, slot.slot_number)
+                continue
+            vehicle_id, _, entry_gate, _ = requests[index]
+            slot.is_available = False
+            outcomes[index] = Ticket(parking_slot=slot, vehicle_id=vehicle_id, entry_gate=entry_gate)
+            tickets.append(outcomes[index])
+            admitted.append(slot)
+            if booking is not None:
+                fulfilled.append((outcomes[index], booking))
+        for index in indexes[len(slots):]:
+            outcomes[index] = SlotUnavailable(slot_class)
+        claimed.extend(admitted)
+        deltas[lot_id, slot_class] = len(admitted)
+
+    try:
+        with transaction.atomic():
+            updated = ParkingSlot.objects.filter(
+                id__in=[slot.id for slot in claimed], is_available=True
+            ).update(is_available=False)
+            if updated != len(claimed):
+                raise _BatchConflict
+            _shift_occupancy(deltas)
+            Ticket.objects.bulk_create(tickets)
+            if rollups_enabled():
+                entries = defaultdict(int)
+                for ticket in tickets:
+                    lot_id = ticket.parking_slot.parking_lot_id
+                    entries[lot_id, ticket.entry_gate, bucket_hour(ticket.entry_time)] += 1
+                for (lot_id, entry_gate, hour), count in entries.items():
+                    record_activity(lot_id, entry_gate, hour, entries=count)
+            for ticket, booking in fulfilled:
+                Reservation.objects.filter(id=booking.id, ticket__isnull=True).update(ticket=ticket)
+
+            def opened():
+                for ticket in tickets:
+                    plates.ticket_opened(ticket.vehicle_id, ticket.id)
+                publish_tickets('park', tickets)
+                for ticket, booking in fulfilled:
+                    reservation_index.fulfil(ticket.parking_slot.parking_lot_id, booking)
+            transaction.on_commit(opened)
+    except Exception:
+        for lot_id, _ in by_class:
+            slot_pool.invalidate(lot_id)
+        raise
+    return outcomes
+
+
+def remove_vehicles(ticket_ids: list[int]) -> list[Ticket | TicketNotFound | TicketAlreadyClosed]:
+    """
+    Close a batch of tickets and free their slots.
+
+    Returns one outcome per ticket id, in order: the closed Ticket with its
+    charge, or the exception explaining why it was not closed. Tickets are
+    read with one query and closed, billed and released with a handful of
+    set-based statements; if a concurrent request closes one of them first
+    the whole batch is recomputed.
+    """
+    _check_synchronous_mode()
+    for attempt in range(BATCH_ATTEMPTS):
+        try:
+            return _remove_batch(ticket_ids)
+        except _BatchConflict:
+            if attempt == BATCH_ATTEMPTS - 1:
+                raise
+
+
+def _remove_batch(ticket_ids):
+    outcomes = [None] * len(ticket_ids)
+    tickets = Ticket.objects.select_related('parking_slot').annotate(
+        vehicle_type=F('vehicle__type')
+    ).in_bulk(set(ticket_ids))
+    configs = lot_configs.get_many({ticket.parking_slot.parking_lot_id for ticket in tickets.values()})
+    parking_lots = {lot_id: config.to_model() for lot_id, config in configs.items()}
+    exit_time = timezone.now()
+
+    closing, deltas = {}, defaultdict(int)
+    for index, ticket_id in enumerate(ticket_ids):
+        ticket = tickets.get(ticket_id)
+        if ticket is None:
+            outcomes[index] = TicketNotFound()
+        elif ticket.exit_time or ticket_id in closing:
+            outcomes[index] = TicketAlreadyClosed()
+        else:
+            ticket.parking_slot.parking_lot = parking_lots[ticket.parking_slot.parking_lot_id]
+            ticket.exit_time = exit_time
+            ticket.parking_slot.is_available = True
+            closing[ticket_id] = ticket
+            deltas[ticket.parking_slot.parking_lot_id, ticket.parking_slot.slot_class] -= 1
+            outcomes[index] = ticket
+
+    charges = price_tickets([
+        (ticket.parking_slot.parking_lot_id, ticket.vehicle_type, ticket.entry_time)
+        for ticket in closing.values()
+    ], exit_time, configs)
+    for ticket, charge in zip(closing.values(), charges):
+        ticket.total_charge = charge
+
+    with transaction.atomic():
+        updated = Ticket.objects.filter(
+            id__in=closing, exit_time__isnull=True
+        ).update(exit_time=exit_time)
+        if updated != len(closing):
+            raise _BatchConflict
+        Ticket.objects.bulk_update(closing.values(), ['total_charge'], batch_size=SLOT_BATCH_SIZE)
+        ParkingSlot.objects.filter(
+            id__in=[ticket.parking_slot_id for ticket in closing.values()]
+        ).update(is_available=True)
+        _shift_occupancy(deltas)
+        if rollups_enabled():
+            exits = defaultdict(lambda: [0, Decimal('0.00')])
+            closed_per_lot = defaultdict(int)
+            for ticket in closing.values():
+                bucket = exits[ticket.parking_slot.parking_lot_id, ticket.entry_gate]
+                bucket[0] += 1
+                bucket[1] += ticket.total_charge
+                closed_per_lot[ticket.parking_slot.parking_lot_id] += 1
+            for (lot_id, entry_gate), (count, revenue) in exits.items():
+                record_activity(
+                    lot_id, entry_gate, exit_time,
+                    exits=count, revenue=revenue, occupancy_offset=closed_per_lot[lot_id],
+                )
+
+        def release():
+            for ticket in closing.values():
+                slot = ticket.parking_slot
+                slot_pool.release(slot.parking_lot_id, slot.slot_class, slot.id, slot.slot_number)
+                plates.ticket_closed(ticket.vehicle_id, ticket.id)
+            publish_tickets('remove', closing.values())
+        transaction.on_commit(release)
+    return outcomes
+
+
+def reconcile_occupancy(parking_lot_id: int | None = None) -> list[int]:
+    """
+    Rebuild the lot and slot class occupancy counters from the slot table.
+
+    Returns the ids of the lots whose counters had drifted.
+    """
+    drifted = set()
+    with transaction.atomic():
+        for model, slot_filters in (
+            (ParkingLot, {'parking_lot': OuterRef('pk')}),
+            (SlotClass, {'parking_lot': OuterRef('parking_lot'), 'slot_class': OuterRef('vehicle_type')}),
+        ):
+            slot_counts = ParkingSlot.objects.filter(
+                is_active=True, **slot_filters
+            ).order_by().values('parking_lot')
+            true_occupied = Coalesce(Subquery(
+                slot_counts.annotate(n=Count('id', filter=Q(is_available=False))).values('n')
+            ), 0)
+            true_available = Coalesce(Subquery(
+                slot_counts.annotate(n=Count('id', filter=Q(is_available=True))).values('n')
+            ), 0)
+
+            rows = model.objects.all()
+            if parking_lot_id is not None:
+                rows = rows.filter(**{'id' if model is ParkingLot else 'parking_lot_id': parking_lot_id})
+            stale = dict(rows.annotate(
+                true_occupied=true_occupied, true_available=true_available
+            ).exclude(
+                occupied=F('true_occupied'), available=F('true_available')
+            ).values_list('id', 'id' if model is ParkingLot else 'parking_lot_id'))
+            model.objects.filter(id__in=stale).update(
+                occupied=true_occupied, available=true_available
+            )
+            drifted.update(stale.values())
+    return sorted(drifted)
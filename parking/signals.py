@@ -1,16 +1,91 @@
 import logging
 
-from django.db.models.signals import post_save
+from django.db.models import ProtectedError
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 
-from .models import ParkingLot, ParkingSlot
+from vehicle.models import Vehicle
+from .lot_cache import lot_configs
+from .models import ParkingLot, ParkingSlot, Reservation, SlotClass, Tariff
+from .plate_cache import plates
+from .reservations import reservation_index
+from .services import provision_parking_slots, resize_parking_lot
+from .slot_pool import slot_pool
 
 logger = logging.getLogger(__name__)
 
 
 @receiver(post_save, sender=ParkingLot)
-def post_parking_lot_create(sender, created, instance, **kwargs):
-    for i in range(instance.capacity):
-        ParkingSlot.objects.create(parking_lot=instance, slot_number=i)
+def post_parking_lot_save(sender, created, instance, raw=False, update_fields=None, **kwargs):
+    lot_configs.invalidate(instance.id)
+    # Gate count or layout may have changed
+    slot_pool.invalidate(instance.id)
+    if raw or (update_fields is not None and 'capacity' not in update_fields):
+        return
 
-    print(f"Created {instance.capacity} parking slots for lot: {instance.name}")
+    provision_parking_slots(instance, created)
+    logger.info("Provisioned %d parking slots for lot: %s", instance.capacity, instance.name)
+
+
+@receiver(post_delete, sender=ParkingLot)
+def post_parking_lot_delete(sender, instance, **kwargs):
+    lot_configs.invalidate(instance.id)
+    slot_pool.invalidate(instance.id)
+    reservation_index.invalidate(instance.id)
+
+
+@receiver(post_save, sender=ParkingSlot)
+def post_parking_slot_save(sender, instance, raw=False, **kwargs):
+    # Bulk paths use update()/bulk_create(); this catches edits such as new gate distances
+    if not raw:
+        slot_pool.invalidate(instance.parking_lot_id)
+
+
+@receiver(pre_delete, sender=SlotClass)
+def pre_slot_class_delete(sender, instance, origin=None, **kwargs):
+    # Occupied slots cannot be retired, so they would outlive their class
+    if not isinstance(origin, ParkingLot) and instance.has_parked_vehicles():
+        raise ProtectedError(
+            f"Slot class {instance.vehicle_type} of lot {instance.parking_lot_id} has parked vehicles",
+            [instance],
+        )
+
+
+@receiver(post_save, sender=SlotClass)
+@receiver(post_delete, sender=SlotClass)
+def post_slot_class_change(sender, instance, raw=False, origin=None, **kwargs):
+    # A deleted lot takes its classes along; nothing left to provision
+    if raw or isinstance(origin, ParkingLot):
+        return
+    resize_parking_lot(instance.parking_lot_id)
+    lot_configs.invalidate(instance.parking_lot_id)
+    reservation_index.invalidate(instance.parking_lot_id)
+
+
+@receiver(post_save, sender=Reservation)
+def post_reservation_save(sender, created, instance, raw=False, **kwargs):
+    # The booking service adds new reservations itself; this catches edits such as admin changes
+    if not created and not raw:
+        reservation_index.invalidate(instance.parking_lot_id)
+
+
+@receiver(post_delete, sender=Reservation)
+def post_reservation_delete(sender, instance, **kwargs):
+    reservation_index.invalidate(instance.parking_lot_id)
+
+
+@receiver(post_save, sender=Tariff)
+@receiver(post_delete, sender=Tariff)
+def post_tariff_change(sender, instance, **kwargs):
+    lot_configs.invalidate(instance.parking_lot_id)
+
+
+@receiver(post_save, sender=Vehicle)
+def post_vehicle_save(sender, created, instance, **kwargs):
+    if not created:
+        plates.invalidate_vehicle(instance.id)
+
+
+@receiver(post_delete, sender=Vehicle)
+def post_vehicle_delete(sender, instance, **kwargs):
+    plates.invalidate_vehicle(instance.id)
@@ -0,0 +1,169 @@
+import heapq
+import threading
+from collections import defaultdict
+from typing import Iterable
+
+from .lot_cache import lot_configs
+from .models import ParkingSlot
+
+
+def default_gate_distances(slot_number: int, total_entry_gate: int, span: int) -> tuple[int, ...]:
+    """
+    Distances for a slot without ``gate_distances``: slots are taken to line
+    one lane in ``slot_number`` order with the gates spread evenly along it.
+    """
+    return tuple(
+        abs(2 * total_entry_gate * slot_number - (2 * gate - 1) * span)
+        for gate in range(1, total_entry_gate + 1)
+    )
+
+
+class LotSlots:
+    """
+    Free slots of a single parking lot, nearest to each entry gate first.
+
+    Every gate has a heap of ``(distance, slot_number, slot_id)``. A slot
+    taken through one gate's heap is left behind in the others and skipped
+    when it surfaces there; heaps are rebuilt once stale entries outnumber
+    free slots, so pop and push stay O(log n) amortized.
+    """
+
+    def __init__(self, slots: Iterable[tuple[int, int, tuple[int, ...], bool]], total_entry_gate: int):
+        self.total_entry_gate = max(total_entry_gate, 1)
+        self.slot_numbers: dict[int, int] = {}
+        self.distances: dict[int, tuple[int, ...]] = {}
+        self.members: set[int] = set()
+        for slot_id, slot_number, distances, is_available in slots:
+            self.slot_numbers[slot_id] = slot_number
+            self.distances[slot_id] = distances
+            if is_available:
+                self.members.add(slot_id)
+        self.span = max(self.slot_numbers.values(), default=0) + 1
+        self._rebuild()
+
+    def _rebuild(self) -> None:
+        self.heaps = [
+            [(self.distances[slot_id][gate], self.slot_numbers[slot_id], slot_id) for slot_id in self.members]
+            for gate in range(self.total_entry_gate)
+        ]
+        for heap in self.heaps:
+            heapq.heapify(heap)
+
+    def pop(self, entry_gate: int = 1) -> tuple[int, int] | None:
+        heap = self.heaps[min(max(entry_gate, 1), self.total_entry_gate) - 1]
+        while heap:
+            _, slot_number, slot_id = heapq.heappop(heap)
+            if slot_id in self.members:
+                self.members.discard(slot_id)
+                return slot_id, slot_number
+        return None
+
+    def push(self, slot_id: int, slot_number: int) -> None:
+        if slot_id in self.members:
+            return
+        distances = self.distances.get(slot_id)
+        if distances is None:
+            distances = self.distances[slot_id] = default_gate_distances(
+                slot_number, self.total_entry_gate, self.span
+            )
+            self.slot_numbers[slot_id] = slot_number
+        self.members.add(slot_id)
+        if any(len(heap) > 2 * len(self.members) + 64 for heap in self.heaps):
+            self._rebuild()
+            return
+        for heap, distance in zip(self.heaps, distances):
+            heapq.heappush(heap, (distance, slot_number, slot_id))
+
+
+class FreeSlotPool:
+    """
+    Process-local pool of free ``(slot_id, slot_number)`` pairs per lot and
+    slot class.
+
+    A lot is warmed from ``ParkingSlot`` the first time it is used and is then
+    kept in sync by the park and remove paths, so claiming and releasing a
+    slot never scans the table. Claims hand out the free slot of the
+    vehicle's class nearest to the entry gate, using
+    ``ParkingSlot.gate_distances``. The pool only proposes
+    candidates and the database stays the source of truth, so a candidate
+    that turns out to be taken is simply dropped, and a lot whose pool runs
+    dry while the table still has free rows is re-warmed through
+    ``invalidate``.
+    """
+
+    def __init__(self):
+        self._lots: dict[int, dict[str, LotSlots]] = {}
+        self._lock = threading.Lock()
+
+    def _load(self, parking_lot_id: int) -> dict[str, LotSlots]:
+        lot_config = lot_configs.get(parking_lot_id)
+        total_entry_gate = lot_config.total_entry_gate if lot_config is not None else 1
+        rows = list(ParkingSlot.objects.filter(
+            parking_lot_id=parking_lot_id, is_active=True
+        ).values_list('id', 'slot_number', 'slot_class', 'gate_distances', 'is_available'))
+        # Slot classes share the lot's lane, so default distances use every slot
+        span = max((row[1] for row in rows), default=0) + 1
+        by_class = defaultdict(list)
+        for slot_id, slot_number, slot_class, distances, is_available in rows:
+            by_class[slot_class].append((
+                slot_id, slot_number,
+                tuple(distances) if len(distances or ()) >= total_entry_gate
+                else default_gate_distances(slot_number, total_entry_gate, span),
+                is_available,
+            ))
+        return {
+            slot_class: LotSlots(slots, total_entry_gate) for slot_class, slots in by_class.items()
+        }
+
+    def warm(self, parking_lot_id: int) -> None:
+        lot_slots = self._load(parking_lot_id)
+        with self._lock:
+            self._lots[parking_lot_id] = lot_slots
+
+    def warm_missing(self, parking_lot_ids: Iterable[int]) -> None:
+        """Warm the lots not in the pool yet, so that claiming from them does not query."""
+        with self._lock:
+            missing = [lot_id for lot_id in set(parking_lot_ids) if lot_id not in self._lots]
+        for parking_lot_id in missing:
+            lot_slots = self._load(parking_lot_id)
+            with self._lock:
+                self._lots.setdefault(parking_lot_id, lot_slots)
+
+    def claim(self, parking_lot_id: int, slot_class: str, entry_gate: int = 1) -> tuple[int, int] | None:
+        """Pop the free ``slot_class`` slot nearest to ``entry_gate``, warming the lot on first use."""
+        with self._lock:
+            classes = self._lots.get(parking_lot_id)
+            if classes is not None:
+                return self._pop(classes, slot_class, entry_gate)
+
+        classes = self._load(parking_lot_id)
+        with self._lock:
+            return self._pop(self._lots.setdefault(parking_lot_id, classes), slot_class, entry_gate)
+
+    @staticmethod
+    def _pop(classes: dict[str, LotSlots], slot_class: str, entry_gate: int) -> tuple[int, int] | None:
+        lot_slots = classes.get(slot_class)
+        return lot_slots.pop(entry_gate) if lot_slots is not None else None
+
+    def release(self, parking_lot_id: int, slot_class: str, slot_id: int, slot_number: int) -> None:
+        with self._lock:
+            lot_slots = self._lots.get(parking_lot_id, {}).get(slot_class)
+            if lot_slots is not None:
+                lot_slots.push(slot_id, slot_number)
+
+    def free_count(self, parking_lot_id: int, slot_class: str) -> int:
+        """Free ``slot_class`` slots the pool holds for a warmed lot, 0 otherwise."""
+        with self._lock:
+            lot_slots = self._lots.get(parking_lot_id, {}).get(slot_class)
+            return len(lot_slots.members) if lot_slots is not None else 0
+
+    def invalidate(self, parking_lot_id: int | None = None) -> None:
+        """Forget one lot (or every lot) so it is re-warmed on next use."""
+        with self._lock:
+            if parking_lot_id is None:
+                self._lots.clear()
+            else:
+                self._lots.pop(parking_lot_id, None)
+
+
+slot_pool = FreeSlotPool()
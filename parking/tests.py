@@ -0,0 +1,518 @@
+import io
+import json
+import os
+import stat
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.db.models import Count, ProtectedError, QuerySet
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from vehicle.constants import VehicleType
+from vehicle.models import Vehicle
+from vehicle.services import register_vehicle
+from .benchmarks import percentile, summarize
+from .idempotency import responses
+from .journal import GateJournal
+from .management.commands.bench_parking import Command as BenchParkingCommand
+from .lot_cache import lot_configs
+from .models import ParkingLot, ParkingSlot, SlotClass, Ticket, TicketArchive
+from .plate_cache import plates
+from .reservations import ReservationUnavailable, VehicleAlreadyReserved, reservation_index, reserve_slot
+from .services import (
+    SlotUnavailable, VehicleAlreadyParked, create_parking_lot, park_vehicle, remove_vehicle,
+)
+from .slot_pool import slot_pool
+
+
+def clear_process_caches():
+    """Forget the process-local state left behind by earlier tests"""
+    lot_configs.clear()
+    slot_pool.invalidate()
+    plates.clear()
+    reservation_index.invalidate()
+    responses.clear()
+    caches['default'].clear()
+
+
+class ConcurrentParkingTests(TransactionTestCase):
+    """Gates parking at once from their own threads and connections"""
+    SLOTS = 20
+    VEHICLES = 80
+    WORKERS = 8
+
+    def setUp(self):
+        clear_process_caches()
+
+    def test_no_slot_is_double_booked(self):
+        parking_lot = create_parking_lot('stress-lot', self.SLOTS, Decimal(20))
+        vehicle_ids = [
+            register_vehicle(f'STRESS-{i}', VehicleType.CAR).id for i in range(self.VEHICLES)
+        ]
+        start = threading.Barrier(self.WORKERS)
+        outcomes = []
+
+        def park(worker):
+            start.wait()
+            try:
+                for vehicle_id in vehicle_ids[worker::self.WORKERS]:
+                    try:
+                        park_vehicle(vehicle_id, parking_lot, entry_gate=1)
+                        outcomes.append('parked')
+                    except SlotUnavailable:
+                        outcomes.append('full')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=park, args=(worker,)) for worker in range(self.WORKERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(outcomes), self.VEHICLES)
+        self.assertEqual(outcomes.count('parked'), self.SLOTS)
+        self.assertFalse(Ticket.objects.filter(exit_time__isnull=True).values(
+            'parking_slot'
+        ).annotate(tickets=Count('id')).filter(tickets__gt=1).exists())
+        self.assertEqual(
+            ParkingSlot.objects.filter(parking_lot=parking_lot, is_available=False).count(), self.SLOTS
+        )
+        self.assertEqual(
+            ParkingLot.objects.values_list('occupied', 'available').get(id=parking_lot.id), (self.SLOTS, 0)
+        )
+
+
+class ParkVehicleTests(TestCase):
+    def setUp(self):
+        clear_process_caches()
+        self.parking_lot = create_parking_lot('lot', 1, Decimal(20))
+        self.vehicle = register_vehicle('PARKED', VehicleType.CAR)
+        park_vehicle(self.vehicle.id, self.parking_lot, entry_gate=1)
+
+    def test_parked_vehicle_in_full_lot_is_reported_as_parked(self):
+        with self.assertRaises(VehicleAlreadyParked):
+            park_vehicle(self.vehicle.id, self.parking_lot, entry_gate=1)
+
+        response = self.client.post('/parking/park/', {
+            'vehicle_id': self.vehicle.id, 'parking_lot_id': self.parking_lot.id,
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'vehicle_id': ['Vehicle is already parked']})
+
+    def test_full_lot(self):
+        other = register_vehicle('OTHER', VehicleType.CAR)
+        with self.assertRaises(SlotUnavailable):
+            park_vehicle(other.id, self.parking_lot, entry_gate=1)
+
+    def test_parked_vehicle_in_lot_with_room(self):
+        parking_lot = create_parking_lot('roomy', 3, Decimal(20))
+        with self.assertRaises(VehicleAlreadyParked):
+            park_vehicle(self.vehicle.id, parking_lot, entry_gate=1)
+        self.assertEqual(
+            ParkingLot.objects.values_list('occupied', 'available').get(id=parking_lot.id), (0, 3)
+        )
+
+
+class GateQueryCountTests(TransactionTestCase):
+    """
+    Statements per park and remove once the lot's caches are warm, BEGIN and
+    COMMIT included.
+
+    Park reads the vehicle's type, then claims the slot, moves the lot and
+    slot-class counters, inserts the ticket and bumps the hourly rollup.
+    Remove reads the ticket with its slot, then closes the ticket, frees the
+    slot, moves both counters and books the exit on the rollup. Without
+    incremental rollups each takes one statement less. Occupancy reads the
+    lot and slot-class counters.
+    """
+
+    def setUp(self):
+        clear_process_caches()
+        self.parking_lot = create_parking_lot('lot', 5, Decimal(20))
+        self.vehicle = register_vehicle('GATE', VehicleType.CAR)
+        # Warms the lot config, free-slot pool and reservation index
+        self.remove(self.park())
+
+    def park(self):
+        response = self.client.post('/parking/park/', {
+            'vehicle_id': self.vehicle.id, 'parking_lot_id': self.parking_lot.id,
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    def remove(self, ticket_id):
+        response = self.client.post(
+            '/parking/remove/', {'ticket_id': ticket_id}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_park_and_remove(self):
+        with self.assertNumQueries(8):
+            ticket_id = self.park()
+        with self.assertNumQueries(8):
+            self.remove(ticket_id)
+
+    @override_settings(PARKING_ROLLUPS_INCREMENTAL=False)
+    def test_park_and_remove_without_rollups(self):
+        with self.assertNumQueries(7):
+            ticket_id = self.park()
+        with self.assertNumQueries(7):
+            self.remove(ticket_id)
+
+    def test_occupancy(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/parking/occupancy/', {'parking_lot_id': self.parking_lot.id})
+        self.assertEqual(response.json()['occupancy'][0]['slot_classes'][0]['available'], 5)
+
+
+class BenchmarkSummaryTests(SimpleTestCase):
+    def test_percentile_is_nearest_rank(self):
+        values = [0.1, 0.2, 0.3, 0.4]
+        self.assertEqual(percentile(values, 0.5), 0.2)
+        self.assertEqual(percentile(values, 0.99), 0.4)
+        self.assertEqual(percentile(values, 0.0), 0.1)
+        self.assertEqual(percentile([], 0.5), 0.0)
+
+    def test_summarize_in_milliseconds(self):
+        self.assertEqual(summarize([0.003, 0.001, 0.002]), {
+            'count': 3, 'mean_ms': 2.0, 'p50_ms': 2.0, 'p90_ms': 3.0, 'p99_ms': 3.0, 'max_ms': 3.0,
+        })
+        self.assertEqual(summarize([])['count'], 0)
+
+
+class BenchParkingTests(TransactionTestCase):
+    """bench_parking's traffic run, on the test database instead of its own"""
+    OPTIONS = {
+        'lots': 2, 'capacity': 10, 'vehicles': 12, 'rounds': 2, 'current_ratio': 0.5,
+        'concurrency': 3, 'seed': 0,
+    }
+
+    def setUp(self):
+        clear_process_caches()
+
+    def run_bench(self, mode):
+        with tempfile.TemporaryDirectory() as tmp:
+            return BenchParkingCommand().run({**self.OPTIONS, 'mode': mode}, Path(tmp))
+
+    def assert_report(self, report, mode):
+        endpoints = report['endpoints']
+        parks = sum(endpoints['park']['statuses'].values())
+        self.assertEqual(report['mode'], mode)
+        self.assertEqual(parks, self.OPTIONS['vehicles'] * self.OPTIONS['rounds'])
+        # 12 vehicles fit in two 10-slot lots whichever lots they pick, so every park succeeds
+        self.assertEqual(endpoints['park']['statuses'], {201: parks})
+        self.assertEqual(endpoints['remove']['statuses'], {200: parks})
+        self.assertEqual(report['requests'], sum(
+            endpoint['latency']['count'] for endpoint in endpoints.values()
+        ))
+        for endpoint in endpoints.values():
+            self.assertGreater(endpoint['queries_per_request']['max'], 0)
+            self.assertLessEqual(endpoint['latency']['p50_ms'], endpoint['latency']['max_ms'])
+
+    def test_sync_report(self):
+        report = self.run_bench('sync')
+        self.assert_report(report, 'sync')
+        self.assertEqual(Ticket.objects.filter(exit_time__isnull=True).count(), 0)
+
+    def test_compares_sync_and_write_behind(self):
+        report = self.run_bench('both')
+        self.assert_report(report['sync'], 'sync')
+        self.assert_report(report['write_behind'], 'write-behind')
+        self.assertIn('drain_s', report['write_behind'])
+        self.assertGreater(report['requests_per_second_ratio'], 0)
+        # Everything acknowledged in write-behind mode reached the database
+        self.assertEqual(Ticket.objects.count(), 2 * self.OPTIONS['vehicles'] * self.OPTIONS['rounds'])
+        self.assertEqual(Ticket.objects.filter(exit_time__isnull=True).count(), 0)
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        clear_process_caches()
+        self.parking_lot = create_parking_lot('lot', 2, Decimal(20))
+        self.vehicle = register_vehicle('RETRY', VehicleType.CAR)
+
+    def post(self, path, data, key):
+        return self.client.post(path, data, content_type='application/json', headers={'Idempotency-Key': key})
+
+    def test_park_is_replayed(self):
+        data = {'vehicle_id': self.vehicle.id, 'parking_lot_id': self.parking_lot.id}
+        first = self.post('/parking/park/', data, 'park-1')
+        self.assertEqual(first.status_code, 201)
+        with self.assertNumQueries(0):
+            retry = self.post('/parking/park/', data, 'park-1')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(Ticket.objects.count(), 1)
+
+    def test_rejected_park_is_replayed(self):
+        park_vehicle(self.vehicle.id, self.parking_lot, entry_gate=1)
+        data = {'vehicle_id': self.vehicle.id, 'parking_lot_id': self.parking_lot.id}
+        first = self.post('/parking/park/', data, 'park-2')
+        self.assertEqual(first.status_code, 400)
+        self.assertNotIn('Idempotent-Replayed', first)
+        with self.assertNumQueries(0):
+            retry = self.post('/parking/park/', data, 'park-2')
+        self.assertEqual(retry.status_code, 400)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), {'vehicle_id': ['Vehicle is already parked']})
+
+    def test_rejected_remove_is_replayed(self):
+        ticket = park_vehicle(self.vehicle.id, self.parking_lot, entry_gate=1)
+        data = {'ticket_id': ticket.id}
+        self.assertEqual(self.post('/parking/remove/', data, 'remove-1').status_code, 200)
+        first = self.post('/parking/remove/', data, 'remove-2')
+        self.assertEqual(first.status_code, 400)
+        with self.assertNumQueries(0):
+            retry = self.post('/parking/remove/', data, 'remove-2')
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+
+    def test_key_reused_with_another_body(self):
+        self.post('/parking/park/', {'vehicle_id': self.vehicle.id, 'parking_lot_id': self.parking_lot.id}, 'park-3')
+        retry = self.post('/parking/park/', {'vehicle_id': self.vehicle.id, 'parking_lot_id': 0}, 'park-3')
+        self.assertEqual(retry.status_code, 422)
+
+
+class RecordingLock:
+    """A lock that records the queries run on this thread while it is held"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queries = []
+
+    def acquire(self):
+        self._lock.acquire()
+        self._start = len(connection.queries)
+
+    def release(self):
+        self.queries.extend(connection.queries[self._start:])
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class GateJournalTests(TestCase):
+    def setUp(self):
+        clear_process_caches()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.parking_lot = create_parking_lot('lot', 2, Decimal(20))
+        self.vehicle = register_vehicle('JOURNAL', VehicleType.CAR)
+
+    def test_gates_do_not_query_while_holding_the_lock(self):
+        journal = GateJournal(self.directory.name)
+        self.addCleanup(journal.close)
+        journal._lock = RecordingLock()
+        clear_process_caches()
+
+        with CaptureQueriesContext(connection):
+            ticket = journal.park_vehicle(self.vehicle.id, self.parking_lot, 1, VehicleType.CAR)
+            lot_configs.clear()
+            journal.remove_vehicle(ticket.id)
+        self.assertEqual(journal._lock.queries, [])
+
+        journal.flush()
+        self.assertEqual(Ticket.objects.get(id=ticket.id).total_charge, ticket.total_charge)
+
+    def test_new_segment_directory_is_synced(self):
+        synced = []
+
+        def fsync(fd):
+            synced.append(stat.S_ISDIR(os.fstat(fd).st_mode))
+
+        journal = GateJournal(self.directory.name)
+        self.addCleanup(journal.close)
+        with mock.patch('parking.journal.os.fsync', side_effect=fsync):
+            ticket = journal.park_vehicle(self.vehicle.id, self.parking_lot, 1, VehicleType.CAR)
+            self.assertEqual(synced, [False, True])
+            # The flush rotates to a new segment, whose entry is synced on its first write
+            journal.flush()
+            journal.remove_vehicle(ticket.id)
+        self.assertEqual(synced.count(True), 2)
+        self.assertEqual(synced[-2:], [False, True])
+
+    def test_close_releases_the_journal_when_the_last_flush_fails(self):
+        journal = GateJournal(self.directory.name)
+        journal.park_vehicle(self.vehicle.id, self.parking_lot, 1, VehicleType.CAR)
+        with mock.patch('parking.journal.apply_events', side_effect=OperationalError), \
+                self.assertRaises(OperationalError):
+            journal.close()
+
+        # The unapplied event is replayed by the next journal to open the directory
+        reopened = GateJournal(self.directory.name)
+        self.addCleanup(reopened.close)
+        self.assertEqual(reopened.replayed, 1)
+
+    def test_synchronous_services_are_refused_in_write_behind_mode(self):
+        with override_settings(PARKING_WRITE_BEHIND=True):
+            with self.assertRaises(ImproperlyConfigured):
+                park_vehicle(self.vehicle.id, self.parking_lot, entry_gate=1)
+            with self.assertRaises(ImproperlyConfigured):
+                remove_vehicle(1)
+
+
+class AvailabilityTests(TestCase):
+    def setUp(self):
+        clear_process_caches()
+        self.parking_lot = create_parking_lot('lot', 2, Decimal(20))
+        self.vehicles = [register_vehicle(f'RESERVE-{i}', VehicleType.CAR) for i in range(3)]
+        self.now = timezone.now()
+
+    def available(self, start_time, end_time):
+        response = self.client.get('/parking/availability/', {
+            'parking_lot_id': self.parking_lot.id,
+            'start_time': start_time.isoformat(), 'end_time': end_time.isoformat(),
+        })
+        self.assertEqual(response.status_code, 200)
+        [slot_class] = response.json()['availability'][0]['slot_classes']
+        return slot_class['available']
+
+    def reserve(self, vehicle, start_time, end_time):
+        with self.captureOnCommitCallbacks(execute=True):
+            return reserve_slot(vehicle.id, self.parking_lot.id, VehicleType.CAR, start_time, end_time)
+
+    def test_near_term_window_counts_occupied_and_held_slots(self):
+        start_time, end_time = self.now, self.now + timedelta(hours=1)
+        self.assertEqual(self.available(start_time, end_time), 2)
+
+        park_vehicle(self.vehicles[0].id, self.parking_lot, entry_gate=1)
+        self.assertEqual(self.available(start_time, end_time), 1)
+        self.reserve(self.vehicles[1], start_time, end_time)
+
+        # The one free slot is held for that reservation
+        self.assertEqual(self.available(start_time, end_time), 0)
+        with self.assertRaises(ReservationUnavailable):
+            self.reserve(self.vehicles[2], start_time, end_time)
+
+    def test_later_window_is_bounded_by_reservations_only(self):
+        park_vehicle(self.vehicles[0].id, self.parking_lot, entry_gate=1)
+        park_vehicle(self.vehicles[1].id, self.parking_lot, entry_gate=1)
+        start_time, end_time = self.now + timedelta(days=1), self.now + timedelta(days=1, hours=1)
+        self.assertEqual(self.available(start_time, end_time), 2)
+        self.reserve(self.vehicles[2], start_time, end_time)
+        self.assertEqual(self.available(start_time, end_time), 1)
+
+
+class ReserveSlotTests(TestCase):
+    def setUp(self):
+        clear_process_caches()
+        self.parking_lots = [create_parking_lot(f'lot-{i}', 2, Decimal(20)) for i in range(2)]
+        self.vehicle = register_vehicle('BOOKER', VehicleType.CAR)
+        self.start_time = timezone.now() + timedelta(days=1)
+        self.end_time = self.start_time + timedelta(hours=1)
+
+    def reserve(self, parking_lot):
+        return reserve_slot(self.vehicle.id, parking_lot.id, VehicleType.CAR, self.start_time, self.end_time)
+
+    def test_vehicle_is_locked_before_its_overlapping_bookings_are_checked(self):
+        locked = []
+        select_for_update = QuerySet.select_for_update
+
+        def record(queryset, *args, **kwargs):
+            locked.append(queryset.model)
+            return select_for_update(queryset, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, 'select_for_update', autospec=True, side_effect=record):
+            self.reserve(self.parking_lots[0])
+        self.assertEqual(locked[0], Vehicle)
+
+        # Overlapping bookings of one vehicle are refused across lots too
+        with self.assertRaises(VehicleAlreadyReserved):
+            self.reserve(self.parking_lots[1])
+
+
+class SlotClassTests(TestCase):
+    def setUp(self):
+        clear_process_caches()
+        self.parking_lot = create_parking_lot('lot', 4, Decimal(20), {VehicleType.BIKE: 2})
+        self.bike = register_vehicle('BIKE', VehicleType.BIKE)
+
+    def bike_class(self):
+        return SlotClass.objects.get(parking_lot=self.parking_lot, vehicle_type=VehicleType.BIKE)
+
+    def test_stale_save_keeps_counters(self):
+        stale = self.bike_class()
+        park_vehicle(self.bike.id, self.parking_lot, entry_gate=1)
+        stale.save()
+        bike_class = self.bike_class()
+        self.assertEqual((bike_class.occupied, bike_class.available), (1, 1))
+
+    def test_class_with_parked_vehicles_is_not_deleted(self):
+        ticket = park_vehicle(self.bike.id, self.parking_lot, entry_gate=1)
+        with self.assertRaises(ProtectedError), transaction.atomic():
+            self.bike_class().delete()
+        with self.assertRaises(ProtectedError), transaction.atomic():
+            SlotClass.objects.filter(vehicle_type=VehicleType.BIKE).delete()
+
+        remove_vehicle(ticket.id)
+        self.bike_class().delete()
+        active = ParkingSlot.objects.filter(parking_lot=self.parking_lot, is_active=True).count()
+        self.assertEqual(ParkingLot.objects.get(id=self.parking_lot.id).capacity, active)
+        self.assertEqual(active, 2)
+
+
+@override_settings(PARKING_LOT_CACHE_ALIAS=None)
+class LotConfigCacheTests(TestCase):
+    def setUp(self):
+        clear_process_caches()
+        self.parking_lot = create_parking_lot('lot', 1, Decimal(20))
+
+    def test_local_entries_expire_without_a_shared_tier(self):
+        lot_configs.get(self.parking_lot.id)
+        # An edit made by another process, whose signals do not reach this one
+        ParkingLot.objects.filter(id=self.parking_lot.id).update(name='renamed')
+        started = time.monotonic()
+        with mock.patch('parking.lot_cache.time.monotonic', return_value=started + 30):
+            self.assertEqual(lot_configs.get(self.parking_lot.id).name, 'lot')
+        # Hits do not extend the entry's life
+        with mock.patch('parking.lot_cache.time.monotonic', return_value=started + 61):
+            self.assertEqual(lot_configs.get(self.parking_lot.id).name, 'renamed')
+
+    def test_stats_are_exported(self):
+        lot_configs.get(self.parking_lot.id)
+        response = self.client.get('/metrics')
+        self.assertIn('# TYPE parking_lot_config_cache gauge', response.content.decode())
+        self.assertIn('parking_lot_config_cache{stat="size"} 1', response.content.decode())
+
+
+class SettleParkingTests(TestCase):
+    def setUp(self):
+        clear_process_caches()
+        self.parking_lot = create_parking_lot('lot', 1, Decimal(20))
+
+    def archive(self, ticket_id, parking_lot_id, vehicle_id):
+        TicketArchive.objects.create(
+            id=ticket_id, parking_lot_id=parking_lot_id, vehicle_id=vehicle_id, slot_number=0, entry_gate=1,
+            entry_time=datetime(2026, 1, 1, 22, tzinfo=dt_timezone.utc),
+            exit_time=datetime(2026, 1, 2, 3, tzinfo=dt_timezone.utc), total_charge=Decimal(100),
+        )
+
+    def test_archived_tickets_of_deleted_vehicles_and_lots(self):
+        self.archive(1, self.parking_lot.id, vehicle_id=1000)
+        self.archive(2, 1000, vehicle_id=1000)
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('settle_parking', date='2026-01-01', stdout=stdout, stderr=stderr)
+
+        lots = json.loads(stdout.getvalue())['lots']
+        self.assertEqual(lots[str(self.parking_lot.id)]['open_tickets'], 1)
+        self.assertEqual(lots[str(self.parking_lot.id)]['accrued'], '40.00')
+        self.assertEqual(lots['1000']['open_tickets'], 1)
+        self.assertEqual(lots['1000']['accrued'], '0.00')
+        self.assertIn('Lot 1000 no longer exists', stderr.getvalue())
@@ -1,8 +1,37 @@
 from django.urls import path
-from .views import ParkVehicleAPI, RemoveVehicleAPI, CurrentParkingsAPI
+from . import async_views
+from .views import (
+    ParkVehicleAPI,
+    ParkVehicleBatchAPI,
+    RemoveVehicleAPI,
+    RemoveVehicleBatchAPI,
+    CurrentParkingsAPI,
+    OccupancyAPI,
+    RollupsAPI,
+    TicketHistoryAPI,
+    ReservationAPI,
+    CancelReservationAPI,
+    AvailabilityAPI,
+)
 
 urlpatterns = [
     path('park/', ParkVehicleAPI.as_view(), name='park-vehicle'),
+    path('park/batch/', ParkVehicleBatchAPI.as_view(), name='park-vehicle-batch'),
     path('remove/', RemoveVehicleAPI.as_view(), name='remove-vehicle'),
+    path('remove/batch/', RemoveVehicleBatchAPI.as_view(), name='remove-vehicle-batch'),
     path('current/', CurrentParkingsAPI.as_view(), name='current-parkings'),
+    path('occupancy/', OccupancyAPI.as_view(), name='occupancy'),
+    path('rollups/', RollupsAPI.as_view(), name='rollups'),
+    path('history/', TicketHistoryAPI.as_view(), name='ticket-history'),
+    path('reservations/', ReservationAPI.as_view(), name='reserve-slot'),
+    path(
+        'reservations/<int:reservation_id>/cancel/', CancelReservationAPI.as_view(),
+        name='cancel-reservation',
+    ),
+    path('availability/', AvailabilityAPI.as_view(), name='availability'),
+    # Async variants for ASGI deployments
+    path('async/park/', async_views.park_vehicle_view, name='park-vehicle-async'),
+    path('async/remove/', async_views.remove_vehicle_view, name='remove-vehicle-async'),
+    path('async/current/', async_views.current_parkings_view, name='current-parkings-async'),
+    path('feed/<int:parking_lot_id>/', async_views.occupancy_feed_view, name='occupancy-feed'),
 ]
\ No newline at end of file
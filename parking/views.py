@@ -1,28 +1,50 @@
+from collections import defaultdict
+from datetime import timedelta
+
 from rest_framework.views import APIView
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework import status
-from django.shortcuts import get_object_or_404
+from django.db.models import Max, Sum
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.decorators import method_decorator
 
-from .models import ParkingLot, Ticket
+from .archive import ticket_history
+from .idempotency import idempotent
+from .models import HourlyRollup, ParkingLot, SlotClass, Ticket
+from .reservations import ReservationClosed, ReservationNotFound, cancel_reservation, reservation_index
+from .rollups import bucket_hour
 from .serializers import (
     ParkVehicleSerializer,
+    ParkVehicleBatchSerializer,
     RemoveVehicleSerializer,
-    TicketResponseSerializer,
-    CurrentParkingSerializer,
-    CurrentParkingsQuerySerializer
+    RemoveVehicleBatchSerializer,
+    CurrentParkingsQuerySerializer,
+    OccupancyQuerySerializer,
+    RollupQuerySerializer,
+    TicketHistoryQuerySerializer,
+    ReservationSerializer,
+    AvailabilityQuerySerializer,
+    datetime_formatter,
+    current_parking_rows,
+    reservation_data,
+    rollup_data,
+    ticket_history_data,
+    ticket_response_data
 )
 
 
 class ParkVehicleAPI(APIView):
+    @method_decorator(idempotent)
     def post(self, request):
         serializer = ParkVehicleSerializer(data=request.data)
 
         if serializer.is_valid():
             ticket = serializer.save()
-            response_serializer = TicketResponseSerializer(ticket)
 
             return Response({
-                **response_serializer.data,
+                **ticket_response_data(ticket),
                 'message': 'Vehicle parked successfully'
             }, status=status.HTTP_201_CREATED)
 
@@ -30,23 +52,63 @@ class ParkVehicleAPI(APIView):
 
 
 class RemoveVehicleAPI(APIView):
+    @method_decorator(idempotent)
     def post(self, request):
         serializer = RemoveVehicleSerializer(data=request.data)
 
         if serializer.is_valid():
             # We use update method with a dummy instance since we're updating an existing ticket
             ticket = serializer.update(None, serializer.validated_data)
-            response_serializer = TicketResponseSerializer(ticket)
 
             return Response({
-                **response_serializer.data,
+                **ticket_response_data(ticket),
                 'message': 'Vehicle removed successfully'
             }, status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+def batch_results(results, success_status):
+    """Per-event results: the ticket on success, the validation errors otherwise"""
+    to_datetime = datetime_formatter()
+    return [
+        {'index': index, 'status': status.HTTP_400_BAD_REQUEST, 'errors': result}
+        if isinstance(result, dict) else
+        {'index': index, 'status': success_status, 'ticket': ticket_response_data(result, to_datetime)}
+        for index, result in enumerate(results)
+    ]
+
+
+class ParkVehicleBatchAPI(APIView):
+    def post(self, request):
+        serializer = ParkVehicleBatchSerializer(data=request.data)
+
+        if serializer.is_valid():
+            results = serializer.save()
+            return Response({
+                'results': batch_results(results, status.HTTP_201_CREATED)
+            }, status=status.HTTP_200_OK)
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class RemoveVehicleBatchAPI(APIView):
+    def post(self, request):
+        serializer = RemoveVehicleBatchSerializer(data=request.data)
+
+        if serializer.is_valid():
+            results = serializer.save()
+            return Response({
+                'results': batch_results(results, status.HTTP_200_OK)
+            }, status=status.HTTP_200_OK)
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
 class CurrentParkingsAPI(APIView):
+    # Rows fetched per round trip when streaming
+    STREAM_CHUNK_SIZE = 2000
+
     def get(self, request):
         # Validate query parameters
         query_serializer = CurrentParkingsQuerySerializer(data=request.query_params)
@@ -54,25 +116,192 @@ class CurrentParkingsAPI(APIView):
         if not query_serializer.is_valid():
             return Response(query_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        parking_lot_id = query_serializer.validated_data.get('parking_lot_id')
+        params = query_serializer.validated_data
+        parking_lot_id = params.get('parking_lot_id')
+
+        current_tickets = Ticket.objects.filter(exit_time__isnull=True).order_by('id')
 
         # Filter by parking lot if specified
         if parking_lot_id:
-            parking_lot = get_object_or_404(ParkingLot, id=parking_lot_id)
-            current_tickets = Ticket.objects.filter(
-                exit_time__isnull=True,
-                parking_slot__parking_lot=parking_lot
-            ).select_related('vehicle', 'parking_slot', 'parking_slot__parking_lot')
+            current_tickets = current_tickets.filter(parking_slot__parking_lot_id=parking_lot_id)
+        if 'cursor' in params:
+            current_tickets = current_tickets.filter(id__gt=params['cursor'])
+        charge_at = timezone.now() if params['preview_charge'] else None
+
+        if params['stream']:
+            return StreamingHttpResponse(
+                self.stream_ndjson(current_tickets, charge_at), content_type='application/x-ndjson'
+            )
+
+        # Fetch one extra row to know whether there is a next page
+        page = list(current_parking_rows(current_tickets[:params['limit'] + 1], charge_at=charge_at))
+        next_cursor = page[params['limit'] - 1]['id'] if len(page) > params['limit'] else None
+
+        # The occupancy counters stand in for a COUNT over open tickets
+        parking_lots = ParkingLot.objects.all()
+        if parking_lot_id:
+            parking_lots = parking_lots.filter(id=parking_lot_id)
+        total_count = parking_lots.aggregate(total=Sum('occupied'))['total'] or 0
+
+        return Response({
+            'current_parkings': page[:params['limit']],
+            'total_count': total_count,
+            'next_cursor': next_cursor
+        }, status=status.HTTP_200_OK)
+
+    def stream_ndjson(self, current_tickets, charge_at=None):
+        renderer = JSONRenderer()
+        rows = current_parking_rows(
+            current_tickets, chunk_size=self.STREAM_CHUNK_SIZE, charge_at=charge_at
+        )
+        for row in rows:
+            yield renderer.render(row) + b'\n'
+
+
+class OccupancyAPI(APIView):
+    def get(self, request):
+        query_serializer = OccupancyQuerySerializer(data=request.query_params)
+
+        if not query_serializer.is_valid():
+            return Response(query_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        parking_lot_id = query_serializer.validated_data.get('parking_lot_id')
+
+        # Counters live on the lot and slot-class rows, so this is one read of
+        # each and never touches the slots
+        parking_lots = ParkingLot.objects.order_by('id')
+        if parking_lot_id:
+            parking_lots = parking_lots.filter(id=parking_lot_id)
+
+        occupancy = list(parking_lots.values(
+            'id', 'name', 'capacity', 'occupied', 'available'
+        ))
+        if parking_lot_id and not occupancy:
+            return Response({'detail': 'Parking lot not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        # Per-class counters, so "no bike slot" is answered as well
+        slot_classes = defaultdict(list)
+        for slot_class in SlotClass.objects.filter(
+            parking_lot_id__in=[lot['id'] for lot in occupancy]
+        ).order_by('vehicle_type').values(
+            'parking_lot_id', 'vehicle_type', 'capacity', 'occupied', 'available'
+        ):
+            slot_classes[slot_class.pop('parking_lot_id')].append(slot_class)
+        for lot in occupancy:
+            lot['slot_classes'] = slot_classes[lot['id']]
+
+        return Response({'occupancy': occupancy}, status=status.HTTP_200_OK)
+
+
+class RollupsAPI(APIView):
+    def get(self, request):
+        query_serializer = RollupQuerySerializer(data=request.query_params)
+
+        if not query_serializer.is_valid():
+            return Response(query_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        params = query_serializer.validated_data
+        since = bucket_hour(timezone.now()) - timedelta(days=params['days'])
+
+        # Reads only the pre-aggregated buckets, never the ticket table
+        rollups = HourlyRollup.objects.filter(hour__gte=since)
+        if 'parking_lot_id' in params:
+            rollups = rollups.filter(parking_lot_id=params['parking_lot_id'])
+        group_by = ['parking_lot_id', 'hour'] + (['entry_gate'] if params['by_gate'] else [])
+        buckets = rollups.values(*group_by).annotate(
+            total_entries=Sum('entries'),
+            total_exits=Sum('exits'),
+            total_revenue=Sum('revenue'),
+            max_occupancy=Max('peak_occupancy'),
+        ).order_by(*group_by)
+
+        to_datetime = datetime_formatter()
+        return Response({
+            'buckets': [rollup_data(bucket, to_datetime) for bucket in buckets]
+        }, status=status.HTTP_200_OK)
+
+
+class TicketHistoryAPI(APIView):
+    def get(self, request):
+        query_serializer = TicketHistoryQuerySerializer(data=request.query_params)
+
+        if not query_serializer.is_valid():
+            return Response(query_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        params = query_serializer.validated_data
+        filters = {key: params[key] for key in ('vehicle_id', 'parking_lot_id') if key in params}
+
+        # Closed tickets from the live table and the archive, newest exit first
+        to_datetime = datetime_formatter()
+        return Response({
+            'tickets': [
+                ticket_history_data(row, to_datetime)
+                for row in ticket_history(limit=params['limit'], **filters)
+            ]
+        }, status=status.HTTP_200_OK)
+
+
+class ReservationAPI(APIView):
+    @method_decorator(idempotent)
+    def post(self, request):
+        serializer = ReservationSerializer(data=request.data)
+
+        if serializer.is_valid():
+            reservation = serializer.save()
+
+            return Response({
+                **reservation_data(reservation),
+                'message': 'Parking slot reserved successfully'
+            }, status=status.HTTP_201_CREATED)
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class CancelReservationAPI(APIView):
+    @method_decorator(idempotent)
+    def post(self, request, reservation_id):
+        try:
+            reservation = cancel_reservation(reservation_id)
+        except ReservationNotFound:
+            return Response({'detail': 'Reservation not found'}, status=status.HTTP_404_NOT_FOUND)
+        except ReservationClosed:
+            return Response(
+                {'detail': 'Reservation is already cancelled, used or over'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        return Response({
+            **reservation_data(reservation),
+            'message': 'Reservation cancelled successfully'
+        }, status=status.HTTP_200_OK)
+
+
+class AvailabilityAPI(APIView):
+    def get(self, request):
+        query_serializer = AvailabilityQuerySerializer(data=request.query_params)
+
+        if not query_serializer.is_valid():
+            return Response(query_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        params = query_serializer.validated_data
+        if 'parking_lot_id' in params:
+            parking_lot_ids = [params['parking_lot_id']]
         else:
-            # Get all current parkings across all lots
-            current_tickets = Ticket.objects.filter(
-                exit_time__isnull=True
-            ).select_related('vehicle', 'parking_slot', 'parking_slot__parking_lot')
+            parking_lot_ids = list(ParkingLot.objects.order_by('id').values_list('id', flat=True))
 
-        # Serialize the data
-        serializer = CurrentParkingSerializer(current_tickets, many=True)
+        # Answered from the in-memory reservation index, never the reservation table
+        availability = reservation_index.availability(
+            parking_lot_ids, params['start_time'], params['end_time'], params.get('vehicle_type')
+        )
+        if 'parking_lot_id' in params and not availability:
+            return Response({'detail': 'Parking lot not found'}, status=status.HTTP_404_NOT_FOUND)
 
+        to_datetime = datetime_formatter()
         return Response({
-            'current_parkings': serializer.data,
-            'total_count': len(serializer.data)
+            'start_time': to_datetime(params['start_time']),
+            'end_time': to_datetime(params['end_time']),
+            'availability': [
+                {'parking_lot_id': parking_lot_id, 'slot_classes': availability[parking_lot_id]}
+                for parking_lot_id in parking_lot_ids if parking_lot_id in availability
+            ],
         }, status=status.HTTP_200_OK)
@@ -14,3 +14,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'parkinglot.settings')
 
 application = get_asgi_application()
+
+# Imported once the app registry is ready
+from parking.journal import get_journal, write_behind_enabled  # noqa: E402
+
+if write_behind_enabled():
+    # Replay whatever a crash left in the journal before serving a gate
+    get_journal()
@@ -0,0 +1,233 @@
+"""
+Per-request timing and SQL instrumentation.
+
+``RequestMetricsMiddleware`` samples requests under
+``REQUEST_METRICS_PATH_PREFIXES`` and records wall time, number of SQL
+queries, total SQL time and the slowest statement. Results go out as a
+``Server-Timing`` header and are aggregated into per-view histograms served
+in Prometheus text format by ``metrics_view``.
+
+Queries are observed through a database execute wrapper rather than
+``connection.queries``, so this works with ``DEBUG`` off. The wrapper is
+installed on every connection once and reports to the collector held in a
+context variable; asgiref copies the context into ``sync_to_async`` threads,
+so queries run by async views are attributed to their request as well.
+Unsampled requests only pay for a ``random()`` call and one context
+variable lookup per query.
+"""
+import bisect
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+_collector: ContextVar['QueryCollector | None'] = ContextVar('request_query_collector', default=None)
+
+
+class QueryCollector:
+    """SQL statistics of a single request."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest_duration = 0.0
+        self.slowest_sql = None
+        self._lock = threading.Lock()
+
+    def record(self, sql, duration):
+        with self._lock:
+            self.count += 1
+            self.duration += duration
+            if duration > self.slowest_duration:
+                self.slowest_duration = duration
+                self.slowest_sql = sql
+
+
+def query_wrapper(execute, sql, params, many, context):
+    collector = _collector.get()
+    if collector is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        collector.record(sql, time.perf_counter() - start)
+
+
+@receiver(connection_created)
+def install_query_wrapper(sender, connection, **kwargs):
+    if query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_wrapper)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Per-view request histograms, rendered in Prometheus text format."""
+
+    METRICS = {
+        'parking_request_duration_seconds': ('Request wall time', DURATION_BUCKETS),
+        'parking_request_sql_queries': ('SQL queries per request', QUERY_COUNT_BUCKETS),
+        'parking_request_sql_duration_seconds': ('Total SQL time per request', DURATION_BUCKETS),
+    }
+
+    def __init__(self):
+        self._histograms: dict[tuple[str, str], Histogram] = {}
+        self._slowest: dict[str, float] = {}
+        self._gauges: dict[str, tuple[str, Callable[[], dict]]] = {}
+        self._lock = threading.Lock()
+
+    def register_gauges(self, metric: str, help_text: str, read: Callable[[], dict]) -> None:
+        """Export the values of ``read()`` as a gauge labelled by their ``stat`` key."""
+        with self._lock:
+            self._gauges[metric] = (help_text, read)
+
+    def observe(self, view, duration, collector):
+        values = {
+            'parking_request_duration_seconds': duration,
+            'parking_request_sql_queries': collector.count,
+            'parking_request_sql_duration_seconds': collector.duration,
+        }
+        with self._lock:
+            for metric, value in values.items():
+                histogram = self._histograms.get((metric, view))
+                if histogram is None:
+                    histogram = self._histograms[metric, view] = Histogram(self.METRICS[metric][1])
+                histogram.observe(value)
+            if collector.slowest_duration > self._slowest.get(view, 0.0):
+                self._slowest[view] = collector.slowest_duration
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._slowest.clear()
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for metric, (help_text, buckets) in self.METRICS.items():
+                lines.append(f'# HELP {metric} {help_text}')
+                lines.append(f'# TYPE {metric} histogram')
+                for (name, view), histogram in sorted(self._histograms.items()):
+                    if name != metric:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip((*buckets, '+Inf'), histogram.counts):
+                        cumulative += count
+                        lines.append(f'{metric}_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{metric}_sum{{view="{view}"}} {histogram.sum}')
+                    lines.append(f'{metric}_count{{view="{view}"}} {histogram.count}')
+
+            lines.append('# HELP parking_request_slowest_query_seconds Slowest single SQL statement seen')
+            lines.append('# TYPE parking_request_slowest_query_seconds gauge')
+            for view, duration in sorted(self._slowest.items()):
+                lines.append(f'parking_request_slowest_query_seconds{{view="{view}"}} {duration}')
+            gauges = sorted(self._gauges.items())
+
+        for metric, (help_text, read) in gauges:
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} gauge')
+            for stat, value in sorted(read().items()):
+                lines.append(f'{metric}{{stat="{stat}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+request_metrics = MetricsRegistry()
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefixes = tuple(getattr(settings, 'REQUEST_METRICS_PATH_PREFIXES', ('/parking/', '/vehicle/')))
+        self.sample_rate = getattr(settings, 'REQUEST_METRICS_SAMPLE_RATE', 1.0)
+        slow_query_ms = getattr(settings, 'REQUEST_METRICS_SLOW_QUERY_MS', None)
+        self.slow_query = slow_query_ms / 1000 if slow_query_ms is not None else None
+        # Connections opened before this module was imported missed the signal
+        for connection in connections.all(initialized_only=True):
+            install_query_wrapper(None, connection)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def sampled(self, request) -> bool:
+        return (
+            self.sample_rate > 0
+            and request.path.startswith(self.prefixes)
+            and (self.sample_rate >= 1 or random.random() < self.sample_rate)
+        )
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled(request):
+            return self.get_response(request)
+
+        collector = QueryCollector()
+        token = _collector.set(collector)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _collector.reset(token)
+        return self.finish(request, response, time.perf_counter() - start, collector)
+
+    async def __acall__(self, request):
+        if not self.sampled(request):
+            return await self.get_response(request)
+
+        collector = QueryCollector()
+        token = _collector.set(collector)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _collector.reset(token)
+        return self.finish(request, response, time.perf_counter() - start, collector)
+
+    def finish(self, request, response, duration, collector):
+        match = request.resolver_match
+        view = match.view_name if match is not None else 'unmatched'
+        request_metrics.observe(view, duration, collector)
+
+        response['Server-Timing'] = (
+            f'app;dur={duration * 1000:.2f}, '
+            f'db;dur={collector.duration * 1000:.2f};desc="{collector.count} queries", '
+            f'db-slowest;dur={collector.slowest_duration * 1000:.2f}'
+        )
+        if self.slow_query is not None and collector.slowest_duration >= self.slow_query:
+            logger.warning(
+                "Slow query on %s (%.1f ms): %s",
+                view, collector.slowest_duration * 1000, collector.slowest_sql
+            )
+        return response
+
+
+def metrics_view(request):
+    return HttpResponse(request_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -57,6 +58,7 @@ REST_FRAMEWORK = {
 }
 
 MIDDLEWARE = [
+    'parkinglot.instrumentation.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -89,13 +91,114 @@ WSGI_APPLICATION = 'parkinglot.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# Pick a profile with PARKING_DB_PROFILE. 'production' tunes SQLite for
+# concurrent gate writes: WAL so readers never block the writer, NORMAL
+# syncs (durable up to the last checkpoint under WAL), a busy timeout instead
+# of immediate "database is locked" errors, BEGIN IMMEDIATE so a transaction
+# takes the write lock up front, and persistent per-thread connections.
+# Tests use a file rather than an in-memory database so that the threads of
+# the concurrency tests each get a real connection to it.
+TEST_DATABASE = {'NAME': BASE_DIR / 'test_db.sqlite3'}
+
+DATABASE_PROFILES = {
+    'development': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        'TEST': TEST_DATABASE,
+    },
+    'production': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'TEST': TEST_DATABASE,
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA mmap_size=268435456;'
+                'PRAGMA cache_size=-65536;'
+                'PRAGMA temp_store=MEMORY;'
+            ),
+        },
+    },
+}
+
+DATABASES = {
+    'default': DATABASE_PROFILES[os.environ.get('PARKING_DB_PROFILE', 'development')],
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+# Parking lot configuration cache (parking.lot_cache). Local entries expire
+# after the TTL in seconds, so edits made in other processes show up within
+# that time. Set the alias to a shared cache such as 'default' backed by
+# Redis/Memcached to share entries across processes.
+PARKING_LOT_CACHE_ALIAS = None
+PARKING_LOT_CACHE_TTL = 60
+
+# Entries kept by the process-local plate cache (parking.plate_cache), which
+# maps vehicle serial numbers to their id and open ticket.
+PARKING_PLATE_CACHE_SIZE = 100_000
+
+# Keep the hourly rollups (parking.rollups) current from the park and remove
+# transactions. Turn off to maintain them with `compact_rollups` instead.
+PARKING_ROLLUPS_INCREMENTAL = True
+
+# Idempotency-Key support on park/remove (parking.idempotency). Completed
+# responses are replayed for TTL seconds; the local tier keeps LOCAL_SIZE of
+# them over the cache alias, which should be shared (Redis, Memcached or a
+# database cache) when several processes serve the gates.
+PARKING_IDEMPOTENCY_CACHE_ALIAS = 'default'
+PARKING_IDEMPOTENCY_TTL = 24 * 3600
+PARKING_IDEMPOTENCY_LOCAL_SIZE = 10_000
+
+# Live occupancy feed (parking.feed). The backend fans park/remove events
+# out to subscribers; each subscriber buffers up to QUEUE_SIZE events before
+# it is resynced with a snapshot, and idle streams get a keepalive every
+# KEEPALIVE seconds.
+PARKING_FEED_BACKEND = 'parking.feed.InProcessBackend'
+PARKING_FEED_QUEUE_SIZE = 1000
+PARKING_FEED_KEEPALIVE = 15
+
+# Write-behind mode for park/remove (parking.journal). Requests are served
+# from in-memory lot state and an fsynced journal in JOURNAL_DIR, and a
+# flusher applies the journal to the database every FLUSH_INTERVAL seconds,
+# FLUSH_BATCH events per transaction. Only one process may serve park and
+# remove while it is on. FSYNC off survives a process crash but not a
+# power loss.
+PARKING_WRITE_BEHIND = os.environ.get('PARKING_WRITE_BEHIND') == '1'
+PARKING_JOURNAL_DIR = BASE_DIR / 'journal'
+PARKING_JOURNAL_FSYNC = True
+PARKING_JOURNAL_FLUSH_INTERVAL = 0.2
+PARKING_JOURNAL_FLUSH_BATCH = 2000
+
+# Time-slot reservations (parking.reservations). Availability is answered
+# from a per-lot interval index re-read from the database every INDEX_TTL
+# seconds, so bookings made by other processes show up within that time.
+# Vehicles without a reservation are refused a slot that is held for
+# reservations starting within LOOKAHEAD seconds, and a reserved vehicle
+# may arrive that early.
+PARKING_RESERVATION_INDEX_TTL = 60
+PARKING_RESERVATION_LOOKAHEAD = 30 * 60
+
+# Request instrumentation (parkinglot.instrumentation). Requests under the
+# prefixes are sampled at the given rate (0 disables it) and exported on
+# /metrics; statements slower than the threshold in ms are logged.
+REQUEST_METRICS_PATH_PREFIXES = ('/parking/', '/vehicle/')
+REQUEST_METRICS_SAMPLE_RATE = 1.0
+REQUEST_METRICS_SLOW_QUERY_MS = 200
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
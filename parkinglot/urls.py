@@ -17,9 +17,12 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import include, path
 
+from parkinglot.instrumentation import metrics_view
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('vehicle/', include('vehicle.urls')),
     path('parking/', include('parking.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
\ No newline at end of file
@@ -0,0 +1,90 @@
+import csv
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from vehicle.constants import VehicleType
+from vehicle.services import VEHICLE_BATCH_SIZE, register_vehicles
+
+FORMATS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+# Invalid rows reported individually before only counting them
+MAX_REPORTED_ERRORS = 20
+
+
+class Command(BaseCommand):
+    help = (
+        "Register vehicles from a CSV file with serial_number and type columns, "
+        "or from NDJSON with one {\"serial_number\", \"type\"} object per line. "
+        "The file is streamed and inserted in batches; serial numbers that are "
+        "already registered are skipped. Use - to read standard input."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help="Default: from the file extension")
+        parser.add_argument('--batch-size', type=int, default=VEHICLE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or next(
+            (name for extension, name in FORMATS.items() if path.lower().endswith(extension)), None
+        )
+        if file_format is None:
+            raise CommandError("Cannot tell the format from the file name; pass --format")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be >= 1")
+
+        self.invalid = 0
+        start = time.perf_counter()
+        try:
+            file = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        except OSError as exc:
+            raise CommandError(exc)
+        with file:
+            rows = self.read_csv(file) if file_format == 'csv' else self.read_ndjson(file)
+            created, skipped = register_vehicles(self.valid(rows), batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Registered {created} vehicle(s), skipped {skipped} already registered "
+            f"and {self.invalid} invalid, in {time.perf_counter() - start:.1f}s"
+        ))
+
+    def read_csv(self, file):
+        reader = csv.DictReader(file)
+        missing = {'serial_number', 'type'} - set(reader.fieldnames or ())
+        if missing:
+            raise CommandError(f"CSV header is missing {', '.join(sorted(missing))}")
+        for row in reader:
+            yield reader.line_num, row
+
+    def read_ndjson(self, file):
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else None
+
+    def valid(self, rows):
+        """``(serial_number, type)`` for the valid rows, reporting the others"""
+        for line_number, row in rows:
+            if row is None:
+                error = "not a JSON object"
+            else:
+                serial_number = str(row.get('serial_number') or '').strip()
+                vehicle_type = str(row.get('type') or '').strip().lower()
+                if not serial_number or len(serial_number) > 255:
+                    error = "serial_number must be 1 to 255 characters"
+                elif vehicle_type not in VehicleType.values:
+                    error = f"type must be one of {', '.join(VehicleType.values)}"
+                else:
+                    yield serial_number, vehicle_type
+                    continue
+
+            self.invalid += 1
+            if self.invalid <= MAX_REPORTED_ERRORS:
+                self.stderr.write(f"Line {line_number}: {error}")
@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-17 19:26
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_duplicate_serial_numbers(apps, schema_editor):
+    Vehicle = apps.get_model('vehicle', 'Vehicle')
+    duplicates = list(Vehicle.objects.values('serial_number').annotate(
+        n=Count('id')
+    ).filter(n__gt=1).values_list('serial_number', flat=True)[:10])
+    if duplicates:
+        raise RuntimeError(
+            "Merge or rename vehicles with duplicate serial numbers before "
+            f"migrating: {', '.join(duplicates)}"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicle', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_serial_numbers, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='vehicle',
+            name='serial_number',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+    ]
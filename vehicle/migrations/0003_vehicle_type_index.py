@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-17 19:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicle', '0002_vehicle_serial_number_unique'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['type', 'id'], name='vehicle_type_id_idx'),
+        ),
+    ]
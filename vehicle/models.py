@@ -4,6 +4,12 @@ from vehicle.constants import VehicleType
 
 
 class Vehicle(models.Model):
-    serial_number = models.CharField(max_length=255)
+    serial_number = models.CharField(max_length=255, unique=True)
     type = models.CharField(max_length=20, choices=VehicleType.choices)
     registered_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Serves the vehicle list filtered by type in cursor (id) order
+            models.Index(fields=['type', 'id'], name='vehicle_type_id_idx'),
+        ]
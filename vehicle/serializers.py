@@ -1,9 +1,48 @@
 from rest_framework import serializers
 
+from vehicle.constants import VehicleType
 from vehicle.models import Vehicle
+from vehicle.services import register_vehicles
+
+# Upper bound on vehicles per bulk request; larger fleets go through import_vehicles
+MAX_BULK_SIZE = 5000
 
 
 class VehicleSerializer(serializers.ModelSerializer):
     class Meta:
         model = Vehicle
         fields = '__all__'
+
+
+class VehicleRegistrationSerializer(serializers.Serializer):
+    """Shape of a single registration, without the uniqueness check"""
+    serial_number = serializers.CharField(max_length=255)
+    type = serializers.ChoiceField(choices=VehicleType.choices)
+
+
+class VehicleBulkSerializer(serializers.Serializer):
+    vehicles = serializers.ListField(
+        child=serializers.DictField(), allow_empty=False, max_length=MAX_BULK_SIZE
+    )
+
+    def create(self, validated_data):
+        """Register every valid vehicle; returns the counts and the errors of the invalid ones"""
+        valid, errors = [], []
+        for index, vehicle in enumerate(validated_data['vehicles']):
+            vehicle_serializer = VehicleRegistrationSerializer(data=vehicle)
+            if vehicle_serializer.is_valid():
+                valid.append((vehicle_serializer.validated_data['serial_number'],
+                              vehicle_serializer.validated_data['type']))
+            else:
+                errors.append({'index': index, 'errors': vehicle_serializer.errors})
+
+        created, skipped = register_vehicles(valid)
+        return {'created': created, 'skipped': skipped, 'errors': errors}
+
+
+class VehicleQuerySerializer(serializers.Serializer):
+    """Serializer for vehicle list filters"""
+    type = serializers.ChoiceField(choices=VehicleType.choices, required=False)
+    serial_number = serializers.CharField(max_length=255, required=False)
+    # Plates starting with this, e.g. a fleet's prefix
+    serial_number_prefix = serializers.CharField(max_length=255, required=False)
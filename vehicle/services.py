@@ -1,7 +1,51 @@
+from itertools import islice
+from typing import Iterable
+
+from django.db import transaction
+
 from .models import Vehicle
 
+# Vehicles per transaction when registering in bulk; also bounds the memory
+# an import holds at once
+VEHICLE_BATCH_SIZE = 2000
+
 
 def register_vehicle(serial_number: str, vehicle_type: str) -> Vehicle:
     return Vehicle.objects.create(
         serial_number=serial_number, type=vehicle_type
     )
+
+
+def register_vehicles(
+    vehicles: Iterable[tuple[str, str]], batch_size: int = VEHICLE_BATCH_SIZE
+) -> tuple[int, int]:
+    """
+    Register ``(serial_number, vehicle_type)`` pairs, skipping serial numbers
+    that are already registered. Returns ``(created, skipped)``.
+
+    The iterable is consumed one batch at a time, each inserted by a single
+    ``bulk_create`` in its own transaction, so it can be a generator over a
+    file of any size. A serial number repeated within the input keeps its
+    first type. A plate registered concurrently by another request is
+    skipped by the insert but counted as created.
+    """
+    created = skipped = 0
+    vehicles = iter(vehicles)
+    while batch := list(islice(vehicles, batch_size)):
+        types = {}
+        for serial_number, vehicle_type in batch:
+            types.setdefault(serial_number, vehicle_type)
+        with transaction.atomic():
+            existing = set(Vehicle.objects.filter(
+                serial_number__in=types
+            ).values_list('serial_number', flat=True))
+            new = [
+                Vehicle(serial_number=serial_number, type=vehicle_type)
+                for serial_number, vehicle_type in types.items()
+                if serial_number not in existing
+            ]
+            # ignore_conflicts keeps a concurrent registration from failing the batch
+            Vehicle.objects.bulk_create(new, ignore_conflicts=True)
+        created += len(new)
+        skipped += len(batch) - len(new)
+    return created, skipped
@@ -1,9 +1,50 @@
-from rest_framework import viewsets
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
 
 from vehicle.models import Vehicle
-from vehicle.serializers import VehicleSerializer
+from vehicle.serializers import VehicleBulkSerializer, VehicleQuerySerializer, VehicleSerializer
+
+
+class VehiclePagination(CursorPagination):
+    """Keyset pages over the primary key: every page is an index range scan, however deep"""
+    ordering = 'id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
 
 
 class VehicleViewSet(viewsets.ModelViewSet):
     queryset = Vehicle.objects.all()
     serializer_class = VehicleSerializer
+    pagination_class = VehiclePagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action != 'list':
+            return queryset
+
+        params = VehicleQuerySerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        filters = params.validated_data
+        if 'type' in filters:
+            queryset = queryset.filter(type=filters['type'])
+        if 'serial_number' in filters:
+            queryset = queryset.filter(serial_number=filters['serial_number'])
+        if 'serial_number_prefix' in filters:
+            # A range rather than startswith, whose LIKE cannot use the unique index on SQLite
+            prefix = filters['serial_number_prefix']
+            queryset = queryset.filter(
+                serial_number__gte=prefix, serial_number__lt=prefix + chr(0x10FFFF)
+            )
+        return queryset
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        serializer = VehicleBulkSerializer(data=request.data)
+
+        if serializer.is_valid():
+            return Response(serializer.save(), status=status.HTTP_200_OK)
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)